@@ -1,15 +1,18 @@
 import logging
-from typing import List, Dict, Optional
-import json
+from typing import List, Dict, Optional, Tuple
 import asyncio
 import aiohttp
-import requests
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-import re
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from collections import Counter
 import os
-from cache import redis_cache
+from cache import redis_cache, cache_result
+from http_cache import http_cache
+from trend_store import trend_store
+from trend_extraction import get_extractor
+from trend_dedup import trend_deduplicator
+from trend_index import TrendIndex
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +37,44 @@ class TrendIntelAgent:
             ]
         }
         
+        # Source fetching: one shared session, a bounded connection pool per host,
+        # and an overall deadline after which slow sources are dropped
+        self.fetch_deadline = float(os.getenv('TREND_FETCH_DEADLINE_SECONDS', 8))
+        self.fetch_timeout = aiohttp.ClientTimeout(
+            total=float(os.getenv('TREND_FETCH_TIMEOUT_SECONDS', 6)),
+            connect=float(os.getenv('TREND_FETCH_CONNECT_TIMEOUT_SECONDS', 3))
+        )
+        self.max_connections = int(os.getenv('TREND_FETCH_MAX_CONNECTIONS', 20))
+        self.max_connections_per_host = int(os.getenv('TREND_FETCH_MAX_CONNECTIONS_PER_HOST', 2))
+        self.user_agent = os.getenv('TREND_FETCH_USER_AGENT', 'ArtDecorAI-TrendBot/1.0')
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # HTML parsing is CPU-bound, so it runs off the event loop
+        self._parse_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('TREND_PARSE_WORKERS', 4)),
+            thread_name_prefix="trend-parse"
+        )
+        
+        # Extracted items are query-independent and kept in the HTTP cache next
+        # to the page; bump extractor_version when selectors change to
+        # re-extract cached pages.
+        self.extractor = get_extractor()
+        self.extractor_version = 1
+        
+        # Minimum query relevance for a stored trend to be returned, per source
+        self.min_relevance = {
+            "design_blog": 0.3,
+            "art_source": 0.4,  # Higher threshold for art trends
+            "social_media": 0.3,
+        }
+        
+        # Relevance boosts for terms every trend search and local search care about
+        self.design_keywords = ["design", "interior", "decor", "style", "trend", "art", "furniture"]
+        self.regional_terms = ["regional", "local", "traditional", "cultural", "heritage"]
+        
+        # Search index over the stored documents, rebuilt when a new crawl is loaded
+        self._ranking: Optional[Dict] = None
+        
         # Style evolution patterns
         self.style_evolution_patterns = {
             "modern": {
@@ -53,178 +94,174 @@ class TrendIntelAgent:
             }
         }
         
-        # Cache for trend data
-        self.trend_cache = {}
-        self.cache_duration = timedelta(hours=6)  # Cache trends for 6 hours
+        # Stale analyses are served while this recomputes them in the background
+        self.style_evolution_soft_ttl = 14400
+        redis_cache.register_refresher("style_evolution_analysis", self._compute_style_evolution)
     
     async def search_trending_styles(self, query: str, max_results: int = 10) -> List[Dict]:
-        """Real-time search for trending interior design styles with Redis caching"""
+        """Trending interior design styles for a query, answered from the crawled trend store"""
         try:
             logger.info(f"Searching trending styles: {query}")
             
-            # Check Redis cache first
-            cache_key = f"trends_{query}_{max_results}"
-            cached_trends = await redis_cache.get_cached_trend_data(cache_key)
-            if cached_trends:
-                logger.info("Returning cached trend data from Redis")
-                return cached_trends.get("data", [])
-            
-            # Check local cache as fallback
-            if self._is_cache_valid(cache_key):
-                logger.info("Returning cached trend data from local cache")
-                return self.trend_cache[cache_key]["data"]
-            
-            # Fetch trends from multiple sources
-            trends = await self._fetch_trends_from_sources(query)
-            
-            # Process and rank trends
-            processed_trends = self._process_and_rank_trends(trends, query)
-            
-            # Cache results in both Redis and local cache
-            trend_data = {
-                "data": processed_trends[:max_results],
-                "timestamp": datetime.now().isoformat(),
-                "query": query,
-                "max_results": max_results
-            }
-            
-            # Cache in Redis (6 hours TTL)
-            await redis_cache.cache_trend_data(cache_key, trend_data, ttl=21600)
-            
-            # Cache locally as backup
-            self.trend_cache[cache_key] = {
-                "data": processed_trends[:max_results],
-                "timestamp": datetime.now()
-            }
-            
-            logger.info(f"Found {len(processed_trends)} trending styles and cached in Redis")
-            return processed_trends[:max_results]
+            # Sources are only ever fetched by the trend crawler
+            documents = await trend_store.get_documents()
+            if not documents:
+                logger.warning("Trend store is empty, returning fallback trends")
+                return self._get_fallback_trends()
             
+            trends = self._rank_trends(documents, query, max_results)
+            logger.info(f"Returning {len(trends)} trending styles")
+            return trends
+        
         except Exception as e:
             logger.error(f"Error searching trending styles: {e}")
             return self._get_fallback_trends()
     
-    async def _fetch_trends_from_sources(self, query: str) -> List[Dict]:
-        """Fetch trends from multiple online sources"""
+    async def crawl_trends(self) -> Tuple[List[Dict], Dict]:
+        """Fetch every source and build the query-independent trend documents for the store"""
+        trends, stats = await self._fetch_trends_from_sources()
+        documents = trend_deduplicator.deduplicate(trends)
+        for document in documents:
+            document["momentum"] = self._calculate_trend_momentum(document)
+        stats["duplicates_removed"] = len(trends) - len(documents)
+        return documents, stats
+    
+    async def _fetch_trends_from_sources(self) -> Tuple[List[Dict], Dict]:
+        """Fetch trends from all online sources concurrently, keeping what arrives before the deadline"""
         trends = []
+        stats = {"sources": 0, "sources_missed": 0, "sources_failed": 0}
         
         try:
-            # Fetch from design blogs
-            blog_trends = await self._scrape_design_blogs(query)
-            trends.extend(blog_trends)
-            
-            # Fetch from art sources
-            art_trends = await self._scrape_art_sources(query)
-            trends.extend(art_trends)
+            sources = [(url, "design_blog") for url in self.trend_sources["design_blogs"]]
+            sources += [(url, "art_source") for url in self.trend_sources["art_sources"]]
+            tasks = [asyncio.create_task(self._scrape_source(url, source_type)) for url, source_type in sources]
+            stats["sources"] = len(tasks)
+            
+            done, pending = await asyncio.wait(tasks, timeout=self.fetch_deadline)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"{len(pending)} trend sources missed the {self.fetch_deadline}s deadline")
+            stats["sources_missed"] = len(pending)
+            
+            # Keep source order so ranking ties break the same way on every run
+            for task in tasks:
+                if task not in done:
+                    continue
+                if task.result() is None:
+                    stats["sources_failed"] += 1
+                else:
+                    trends.extend(task.result())
             
             # Fetch from social media APIs (simulated)
-            social_trends = await self._fetch_social_trends(query)
+            social_trends = await self._fetch_social_trends()
             trends.extend(social_trends)
-            
+        
         except Exception as e:
             logger.error(f"Error fetching trends from sources: {e}")
         
-        return trends
+        return trends, stats
     
-    async def _scrape_design_blogs(self, query: str) -> List[Dict]:
-        """Scrape design blogs for trending styles"""
-        trends = []
-        
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session, created on first use inside the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.fetch_timeout,
+                headers={"User-Agent": self.user_agent}
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session and the parsing threads"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._parse_pool.shutdown(wait=False)
+    
+    async def _fetch_page(self, url: str, headers: Dict[str, str]) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """Fetch a source page as (status, headers, body); None unless it answered 200 or 304"""
         try:
-            for blog_url in self.trend_sources["design_blogs"]:
-                try:
-                    response = requests.get(blog_url, timeout=10)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Extract trend information
-                        articles = soup.find_all(['article', 'div'], class_=re.compile(r'(article|post|trend)', re.I))
-                        
-                        for article in articles[:5]:  # Limit to 5 articles per blog
-                            title_elem = article.find(['h1', 'h2', 'h3', 'h4'])
-                            content_elem = article.find(['p', 'div'], class_=re.compile(r'(content|excerpt|summary)', re.I))
-                            
-                            if title_elem and content_elem:
-                                title = title_elem.get_text(strip=True)
-                                content = content_elem.get_text(strip=True)[:200] + "..."
-                                
-                                # Calculate relevance score
-                                relevance_score = self._calculate_relevance_score(title + " " + content, query)
-                                
-                                if relevance_score > 0.3:  # Only include relevant trends
-                                    trends.append({
-                                        "title": title,
-                                        "content": content,
-                                        "relevance_score": relevance_score,
-                                        "trend_type": self._classify_trend_type(title + " " + content),
-                                        "source": "design_blog",
-                                        "url": blog_url
-                                    })
-                
-                except Exception as e:
-                    logger.warning(f"Error scraping blog {blog_url}: {e}")
-                    continue
-        
+            async with self._get_session().get(url, headers=headers) as response:
+                if response.status == 304:
+                    return 304, dict(response.headers), b""
+                if response.status != 200:
+                    logger.warning(f"Trend source {url} returned {response.status}")
+                    return None
+                return 200, dict(response.headers), await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Error fetching trend source {url}: {e}")
+            return None
+    
+    async def _scrape_source(self, url: str, source_type: str) -> Optional[List[Dict]]:
+        """Trend documents from one source, None when it could not be read"""
+        try:
+            items = await self._fetch_extracted(url, source_type)
         except Exception as e:
-            logger.error(f"Error scraping design blogs: {e}")
+            logger.warning(f"Error scraping trend source {url}: {e}")
+            return None
+        if items is None:
+            return None
         
-        return trends
+        return [
+            {
+                "title": item["title"],
+                "content": item["content"],
+                "trend_type": "art" if source_type == "art_source" else self._classify_trend_type(item["title"] + " " + item["content"]),
+                "source": source_type,
+                "url": url
+            }
+            for item in items
+        ]
     
-    async def _scrape_art_sources(self, query: str) -> List[Dict]:
-        """Scrape art sources for trending styles"""
-        trends = []
+    async def _fetch_extracted(self, url: str, source_type: str) -> Optional[List[Dict]]:
+        """Items extracted from a source page, going through the HTTP cache.
         
-        try:
-            for art_url in self.trend_sources["art_sources"]:
-                try:
-                    response = requests.get(art_url, timeout=10)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Look for art trend information
-                        trend_elements = soup.find_all(['div', 'article'], class_=re.compile(r'(trend|style|artwork)', re.I))
-                        
-                        for element in trend_elements[:3]:  # Limit to 3 per source
-                            title_elem = element.find(['h1', 'h2', 'h3', 'h4'])
-                            content_elem = element.find(['p', 'span'])
-                            
-                            if title_elem:
-                                title = title_elem.get_text(strip=True)
-                                content = content_elem.get_text(strip=True) if content_elem else ""
-                                
-                                relevance_score = self._calculate_relevance_score(title + " " + content, query)
-                                
-                                if relevance_score > 0.4:  # Higher threshold for art trends
-                                    trends.append({
-                                        "title": title,
-                                        "content": content,
-                                        "relevance_score": relevance_score,
-                                        "trend_type": "art",
-                                        "source": "art_source",
-                                        "url": art_url
-                                    })
-                
-                except Exception as e:
-                    logger.warning(f"Error scraping art source {art_url}: {e}")
-                    continue
+        A fresh entry is used without a request; otherwise the page is
+        revalidated and a 304 reuses the items extracted last time. When the
+        source cannot be reached, a stale entry is better than nothing, and
+        without one the result is None.
+        """
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(self._parse_pool, http_cache.lookup, url)
         
-        except Exception as e:
-            logger.error(f"Error scraping art sources: {e}")
+        if entry is None or not http_cache.is_fresh(entry):
+            response = await self._fetch_page(url, http_cache.conditional_headers(entry))
+            if response is None:
+                if entry is None:
+                    return None
+                logger.info(f"Using stale cached copy of trend source {url}")
+            elif response[0] == 304 and entry is not None:
+                entry = await loop.run_in_executor(self._parse_pool, http_cache.revalidated, entry, response[1])
+            else:
+                entry = await loop.run_in_executor(self._parse_pool, http_cache.store, url, response[1], response[2])
         
-        return trends
+        return await loop.run_in_executor(self._parse_pool, self._extract_cached, entry, source_type)
+    
+    def _extract_cached(self, entry: Dict, source_type: str) -> List[Dict]:
+        """Items extracted from a cache entry's body, extracting and saving them on first use"""
+        name = f"{source_type}:{self.extractor.name}:v{self.extractor_version}"
+        if name not in entry["parsed"]:
+            items = self.extractor.extract(source_type, entry["url"], http_cache.read_body(entry))
+            http_cache.save_parsed(entry, name, items)
+        return entry["parsed"][name]
     
-    async def _fetch_social_trends(self, query: str) -> List[Dict]:
+    async def _fetch_social_trends(self) -> List[Dict]:
         """Fetch trends from social media (simulated API calls)"""
         trends = []
         
         try:
             # Simulate social media trend data
             # In a real implementation, you would use Instagram API, Pinterest API, etc.
-            social_trends_data = [
+            trends = [
                 {
                     "title": "Biophilic Design Surge",
                     "content": "Plant-filled spaces and natural materials are trending across social media platforms.",
-                    "relevance_score": 0.9,
                     "trend_type": "style",
                     "source": "social_media",
                     "engagement_score": 0.85
@@ -232,7 +269,6 @@ class TrendIntelAgent:
                 {
                     "title": "Warm Minimalism",
                     "content": "Soft, warm minimalism is replacing cold, stark minimalism in interior design.",
-                    "relevance_score": 0.8,
                     "trend_type": "style",
                     "source": "social_media",
                     "engagement_score": 0.78
@@ -240,47 +276,17 @@ class TrendIntelAgent:
                 {
                     "title": "Sustainable Decor",
                     "content": "Eco-friendly and upcycled decor items are gaining popularity.",
-                    "relevance_score": 0.75,
                     "trend_type": "material",
                     "source": "social_media",
                     "engagement_score": 0.72
                 }
             ]
-            
-            # Filter by query relevance
-            for trend in social_trends_data:
-                if self._calculate_relevance_score(trend["title"] + " " + trend["content"], query) > 0.3:
-                    trends.append(trend)
         
         except Exception as e:
             logger.error(f"Error fetching social trends: {e}")
         
         return trends
     
-    def _calculate_relevance_score(self, text: str, query: str) -> float:
-        """Calculate relevance score between text and query"""
-        try:
-            text_lower = text.lower()
-            query_lower = query.lower()
-            
-            # Simple keyword matching
-            query_words = query_lower.split()
-            matches = sum(1 for word in query_words if word in text_lower)
-            
-            # Calculate score based on matches and text length
-            score = matches / len(query_words) if query_words else 0
-            
-            # Boost score for design-related keywords
-            design_keywords = ["design", "interior", "decor", "style", "trend", "art", "furniture"]
-            design_matches = sum(1 for keyword in design_keywords if keyword in text_lower)
-            score += design_matches * 0.1
-            
-            return min(score, 1.0)
-        
-        except Exception as e:
-            logger.error(f"Error calculating relevance score: {e}")
-            return 0.0
-    
     def _classify_trend_type(self, text: str) -> str:
         """Classify the type of trend based on text content"""
         text_lower = text.lower()
@@ -298,60 +304,32 @@ class TrendIntelAgent:
         else:
             return "style"
     
-    def _process_and_rank_trends(self, trends: List[Dict], query: str) -> List[Dict]:
-        """Process and rank trends by relevance and popularity"""
-        try:
-            # Remove duplicates based on title similarity
-            unique_trends = self._remove_duplicate_trends(trends)
-            
-            # Sort by relevance score
-            unique_trends.sort(key=lambda x: x["relevance_score"], reverse=True)
-            
-            # Add trend momentum (simulated)
-            for trend in unique_trends:
-                trend["momentum"] = self._calculate_trend_momentum(trend)
-                trend["final_score"] = trend["relevance_score"] * 0.7 + trend["momentum"] * 0.3
-            
-            # Sort by final score
-            unique_trends.sort(key=lambda x: x["final_score"], reverse=True)
-            
-            return unique_trends
-            
-        except Exception as e:
-            logger.error(f"Error processing trends: {e}")
-            return trends
-    
-    def _remove_duplicate_trends(self, trends: List[Dict]) -> List[Dict]:
-        """Remove duplicate trends based on title similarity"""
-        unique_trends = []
-        seen_titles = set()
-        
-        for trend in trends:
-            title_lower = trend["title"].lower()
-            
-            # Check if similar title already exists
-            is_duplicate = False
-            for seen_title in seen_titles:
-                if self._titles_similar(title_lower, seen_title):
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_trends.append(trend)
-                seen_titles.add(title_lower)
-        
-        return unique_trends
+    def _get_ranking(self, documents: List[Dict]) -> Dict:
+        """BM25 index and the query-independent ranking inputs for the stored documents"""
+        if self._ranking is None or self._ranking["index"].documents is not documents:
+            index = TrendIndex(documents)
+            self._ranking = {
+                "index": index,
+                "keyword_boost": index.matches(self.design_keywords) * 0.1,
+                "momentum": np.array([document["momentum"] for document in documents]),
+                "min_relevance": np.array([self.min_relevance.get(document["source"], 0.3) for document in documents]),
+            }
+            logger.info(f"Indexed {len(documents)} trend documents, {len(index.vocabulary)} terms")
+        return self._ranking
     
-    def _titles_similar(self, title1: str, title2: str) -> bool:
-        """Check if two titles are similar"""
-        words1 = set(title1.split())
-        words2 = set(title2.split())
+    def _rank_trends(self, documents: List[Dict], query: str, max_results: int) -> List[Dict]:
+        """The stored trend documents most relevant to the query, ranked by relevance and momentum"""
+        ranking = self._get_ranking(documents)
+        relevance = np.minimum(ranking["index"].score(query) + ranking["keyword_boost"], 1.0)
+        final = relevance * 0.7 + ranking["momentum"] * 0.3
         
-        # If more than 70% of words overlap, consider them similar
-        overlap = len(words1.intersection(words2))
-        total_words = len(words1.union(words2))
-        
-        return overlap / total_words > 0.7 if total_words > 0 else False
+        # Ties on the final score go to the more relevant trend
+        candidates = np.flatnonzero(relevance > ranking["min_relevance"])
+        positions = TrendIndex.top_k(final, max_results, candidates, relevance)
+        return [
+            {**documents[i], "relevance_score": float(relevance[i]), "final_score": float(final[i])}
+            for i in positions
+        ]
     
     def _calculate_trend_momentum(self, trend: Dict) -> float:
         """Calculate trend momentum based on various factors"""
@@ -371,14 +349,6 @@ class TrendIntelAgent:
         
         return min(momentum, 1.0)
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cached data is still valid"""
-        if cache_key not in self.trend_cache:
-            return False
-        
-        cache_time = self.trend_cache[cache_key]["timestamp"]
-        return datetime.now() - cache_time < self.cache_duration
-    
     def _get_fallback_trends(self) -> List[Dict]:
         """Fallback trends when real-time fetching fails"""
         return [
@@ -410,54 +380,61 @@ class TrendIntelAgent:
         try:
             logger.info("Analyzing style evolution based on current trends")
             
-            # Extract user preferences
-            preferences = user_profile.get("preferences", {})
-            current_style = preferences.get("aesthetic_style", "modern")
-            
-            # Check Redis cache first
-            cache_key = f"style_evolution_{current_style}_{hash(str(preferences))}"
-            cached_evolution = await redis_cache.get_cached_trend_data(cache_key)
-            if cached_evolution:
-                logger.info("Returning cached style evolution from Redis")
-                return cached_evolution
-            
-            # Get current trends for the user's style
-            trend_query = f"{current_style} interior design trends 2024"
-            current_trends = await self.search_trending_styles(trend_query, max_results=5)
-            
-            # Analyze style evolution patterns
-            evolution_insights = self._generate_evolution_insights(current_style, current_trends, preferences)
-            
-            # Get trending complements
-            trending_complements = self._extract_trending_complements(current_style, current_trends)
-            
-            # Get seasonal adaptations
-            seasonal_adaptations = self._get_seasonal_adaptations()
-            
-            # Get local trends if location is provided
-            location = user_profile.get("location")
-            local_trends = await self.get_local_trends(location) if location else []
-            
-            evolution_result = {
-                "evolution_insights": evolution_insights,
-                "trending_complements": trending_complements,
-                "seasonal_adaptations": seasonal_adaptations,
-                "local_trends": local_trends,
-                "current_trends": current_trends,
-                "style_evolution_score": self._calculate_evolution_score(current_style, current_trends),
-                "analysis_timestamp": datetime.now().isoformat()
-            }
-            
-            # Cache the result in Redis (4 hours TTL)
-            await redis_cache.cache_trend_data(cache_key, evolution_result, ttl=14400)
-            logger.info("Cached style evolution analysis in Redis")
-            
-            return evolution_result
-            
+            # Fresh for 4 hours, then served stale while it refreshes in the background
+            return await redis_cache.get_or_refresh(
+                self.style_evolution_cache_key(user_profile),
+                "style_evolution_analysis", user_profile,
+                soft_ttl=self.style_evolution_soft_ttl
+            )
+        
         except Exception as e:
             logger.error(f"Error analyzing style evolution: {e}")
             return self._get_fallback_evolution()
     
+    def style_evolution_cache_key(self, user_profile: Dict) -> str:
+        """Redis key analyze_style_evolution caches a profile's analysis under.
+        
+        The analysis depends only on the style (and location, when given), so
+        profiles sharing a style share the entry the warmup precomputes.
+        """
+        preferences = user_profile.get("preferences", {})
+        current_style = preferences.get("aesthetic_style", "modern")
+        location = user_profile.get("location")
+        suffix = f"_{location}" if location else ""
+        return redis_cache.make_key('trend_data', f"style_evolution_{current_style}{suffix}")
+    
+    async def _compute_style_evolution(self, user_profile: Dict) -> Dict:
+        """Build the style evolution analysis for a user profile"""
+        preferences = user_profile.get("preferences", {})
+        current_style = preferences.get("aesthetic_style", "modern")
+        
+        # Get current trends for the user's style
+        trend_query = f"{current_style} interior design trends 2024"
+        current_trends = await self.search_trending_styles(trend_query, max_results=5)
+        
+        # Analyze style evolution patterns
+        evolution_insights = self._generate_evolution_insights(current_style, current_trends, preferences)
+        
+        # Get trending complements
+        trending_complements = self._extract_trending_complements(current_style, current_trends)
+        
+        # Get seasonal adaptations
+        seasonal_adaptations = self._get_seasonal_adaptations()
+        
+        # Get local trends if location is provided
+        location = user_profile.get("location")
+        local_trends = await self.get_local_trends(location) if location else []
+        
+        return {
+            "evolution_insights": evolution_insights,
+            "trending_complements": trending_complements,
+            "seasonal_adaptations": seasonal_adaptations,
+            "local_trends": local_trends,
+            "current_trends": current_trends,
+            "style_evolution_score": self._calculate_evolution_score(current_style, current_trends),
+            "analysis_timestamp": datetime.now().isoformat()
+        }
+    
     def _generate_evolution_insights(self, current_style: str, trends: List[Dict], preferences: Dict) -> str:
         """Generate personalized evolution insights"""
         try:
@@ -494,7 +471,7 @@ class TrendIntelAgent:
                 insights_parts.append(f"Material trends indicate {material_trend['content'][:100]}...")
             
             return " ".join(insights_parts)
-            
+        
         except Exception as e:
             logger.error(f"Error generating evolution insights: {e}")
             return f"Your {current_style} style can benefit from incorporating current trends like warm earth tones, sustainable materials, and mixed textures."
@@ -527,7 +504,7 @@ class TrendIntelAgent:
             # Remove duplicates and limit results
             unique_complements = list(set(complements))
             return unique_complements[:8]  # Limit to 8 complements
-            
+        
         except Exception as e:
             logger.error(f"Error extracting trending complements: {e}")
             return self.style_evolution_patterns.get(current_style.lower(), {}).get("emerging", ["mixed textures", "accent lighting", "artwork"])
@@ -548,7 +525,7 @@ class TrendIntelAgent:
             evolution_score = (avg_relevance * 0.6) + (avg_momentum * 0.4)
             
             return round(evolution_score, 3)
-            
+        
         except Exception as e:
             logger.error(f"Error calculating evolution score: {e}")
             return 0.5
@@ -590,6 +567,7 @@ class TrendIntelAgent:
             "analysis_timestamp": datetime.now().isoformat()
         }
     
+    @cache_result('trend_data')
     async def get_local_trends(self, location: str) -> List[Dict]:
         """Get location-specific trends"""
         try:
@@ -604,10 +582,10 @@ class TrendIntelAgent:
             
             # Add location-specific insights
             enhanced_trends = []
-            for trend in local_trends:
+            for trend, local_relevance in zip(local_trends, self._calculate_local_relevance(local_trends, location)):
                 enhanced_trend = trend.copy()
                 enhanced_trend["location"] = location
-                enhanced_trend["local_relevance"] = self._calculate_local_relevance(trend, location)
+                enhanced_trend["local_relevance"] = local_relevance
                 enhanced_trends.append(enhanced_trend)
             
             # Add regional style insights
@@ -615,34 +593,22 @@ class TrendIntelAgent:
             enhanced_trends.extend(regional_insights)
             
             return enhanced_trends
-            
+        
         except Exception as e:
             logger.error(f"Error getting local trends: {e}")
             return self._get_fallback_local_trends(location)
     
-    def _calculate_local_relevance(self, trend: Dict, location: str) -> float:
-        """Calculate how relevant a trend is to a specific location"""
+    def _calculate_local_relevance(self, trends: List[Dict], location: str) -> List[float]:
+        """How relevant each trend is to a specific location"""
         try:
-            location_lower = location.lower()
-            trend_text = (trend.get("title", "") + " " + trend.get("content", "")).lower()
-            
-            # Check for location-specific keywords
-            location_keywords = location_lower.split()
-            matches = sum(1 for keyword in location_keywords if keyword in trend_text)
-            
-            # Calculate relevance score
-            relevance = matches / len(location_keywords) if location_keywords else 0
-            
-            # Boost for regional design terms
-            regional_terms = ["regional", "local", "traditional", "cultural", "heritage"]
-            regional_matches = sum(1 for term in regional_terms if term in trend_text)
-            relevance += regional_matches * 0.2
-            
-            return min(relevance, 1.0)
-            
+            # The results are few, so a throwaway index over them is cheap
+            index = TrendIndex(trends)
+            relevance = index.score(location) + index.matches(self.regional_terms) * 0.2
+            return [float(score) for score in np.minimum(relevance, 1.0)]
+        
         except Exception as e:
             logger.error(f"Error calculating local relevance: {e}")
-            return 0.5
+            return [0.5] * len(trends)
     
     def _get_regional_style_insights(self, location: str) -> List[Dict]:
         """Get regional style insights based on location"""
@@ -712,7 +678,7 @@ class TrendIntelAgent:
             })
             
             return insights
-            
+        
         except Exception as e:
             logger.error(f"Error getting regional style insights: {e}")
             return []
@@ -3,7 +3,6 @@ import logging
 from typing import List, Dict, Optional, Tuple
 import os
 from datetime import datetime
-from cache import redis_cache
 
 logger = logging.getLogger(__name__)
 
@@ -156,22 +155,9 @@ class ArtworkRetrievalSystem:
             return []
     
     async def get_personalized_recommendations(self, room_analysis: Dict, user_preferences: Dict, k: int = 5) -> List[Dict]:
-        """Get personalized artwork recommendations with Redis caching"""
+        """Get personalized artwork recommendations; the decision router caches them per user"""
         try:
-            logger.info("Getting personalized recommendations with caching")
-            
-            # Create cache key based on analysis and preferences
-            style = room_analysis.get("aesthetic_style", {}).get("style", "modern")
-            max_price = user_preferences.get("max_price", 500)
-            cache_key = f"recommendations_{style}_{max_price}_{k}"
-            
-            # Check Redis cache first
-            cached_recommendations = await redis_cache.get_cached_artwork_recommendations(
-                cache_key, style
-            )
-            if cached_recommendations:
-                logger.info("Returning cached artwork recommendations from Redis")
-                return cached_recommendations
+            logger.info("Getting personalized recommendations")
             
             # Extract style from room analysis
             aesthetic_style = room_analysis.get("aesthetic_style", {})
@@ -181,34 +167,30 @@ class ArtworkRetrievalSystem:
             preferred_style = user_preferences.get("aesthetic_style", "modern").lower()
             max_price = user_preferences.get("max_price", 500)
             
-            # Filter artworks by style and price
-            filtered_artworks = []
-            for artwork in self.artwork_catalog:
-                artwork_style = artwork.get("style", "").lower()
-                artwork_price = artwork.get("price", 0)
-                
-                # Check if style matches and price is within budget
-                if (detected_style in artwork_style or preferred_style in artwork_style) and artwork_price <= max_price:
-                    artwork_copy = artwork.copy()
-                    artwork_copy["recommendation_reason"] = f"Matches your {detected_style} style and fits your budget"
-                    filtered_artworks.append(artwork_copy)
-            
-            # Sort by price (ascending) and return top k
-            filtered_artworks.sort(key=lambda x: x["price"])
-            recommendations = filtered_artworks[:k]
-            
-            # Cache the recommendations in Redis (2 hours TTL)
-            await redis_cache.cache_artwork_recommendations(
-                cache_key, style, recommendations, ttl=7200
-            )
-            logger.info(f"Cached {len(recommendations)} artwork recommendations in Redis")
-            
-            return recommendations
+            return self._recommend(detected_style, preferred_style, max_price, k)
             
         except Exception as e:
             logger.error(f"Error getting personalized recommendations: {e}")
             return []
     
+    def _recommend(self, detected_style: str, preferred_style: str, max_price: float, k: int) -> List[Dict]:
+        """Catalog artworks matching either style within budget, cheapest first"""
+        # Filter artworks by style and price
+        filtered_artworks = []
+        for artwork in self.artwork_catalog:
+            artwork_style = artwork.get("style", "").lower()
+            artwork_price = artwork.get("price", 0)
+            
+            # Check if style matches and price is within budget
+            if (detected_style in artwork_style or preferred_style in artwork_style) and artwork_price <= max_price:
+                artwork_copy = artwork.copy()
+                artwork_copy["recommendation_reason"] = f"Matches your {detected_style} style and fits your budget"
+                filtered_artworks.append(artwork_copy)
+        
+        # Sort by price (ascending) and return top k
+        filtered_artworks.sort(key=lambda x: x["price"])
+        return filtered_artworks[:k]
+    
     def get_artwork_by_id(self, artwork_id: str) -> Optional[Dict]:
         """Get artwork by ID"""
         try:
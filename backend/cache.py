@@ -1,27 +1,198 @@
 import redis.asyncio as redis
+import asyncio
 import json
 import logging
-from typing import Any, Optional, Dict, List
-from datetime import timedelta
+from typing import Any, Optional, Dict, List, Tuple
+from datetime import date, datetime, timedelta
+from collections import OrderedDict, deque
 import hashlib
+import inspect
+import math
 import os
-from functools import wraps
+import random
+import time
+import uuid
+from functools import partial, wraps
+from cache_codecs import CacheCodec
+from cache_metrics import CacheMetrics
+from cache_sharding import ShardedRedis
+from cache_inventory import CacheInventory
 
 logger = logging.getLogger(__name__)
 
+# Sentinel returned by L1Cache.get on a miss (None is a valid cached value)
+_MISSING = object()
+
+# Delete a lock only if it still holds our token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Push a lock's expiry out only if it still holds our token
+_EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Give a user a generation no user has held before, so a pruned field never
+# revives entries written under an earlier one, and note when it was bumped
+_BUMP_USER_GENERATION_SCRIPT = """
+local generation = redis.call('incr', KEYS[3])
+local current = tonumber(redis.call('hget', KEYS[1], ARGV[1]) or '0')
+if generation <= current then
+    generation = current + 1
+    redis.call('set', KEYS[3], generation)
+end
+redis.call('hset', KEYS[1], ARGV[1], generation)
+redis.call('zadd', KEYS[2], ARGV[2], ARGV[1])
+return generation
+"""
+
+# Drop user generations bumped before a cutoff, returning the dropped fields
+_PRUNE_GENERATIONS_SCRIPT = """
+local fields = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, field in ipairs(fields) do
+    redis.call('hdel', KEYS[1], field)
+    redis.call('zrem', KEYS[2], field)
+end
+return fields
+"""
+
+class L1Cache:
+    """Bounded in-process LRU cache with per-namespace TTLs.
+
+    Values are stored already decoded and are shared between callers, so
+    anything returned from here must be treated as read-only.
+    """
+    
+    def __init__(self, max_entries: int = 2048, ttl_settings: Optional[Dict[str, int]] = None):
+        self.max_entries = max_entries
+        self.ttl_settings = ttl_settings or {}
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+    
+    def handles(self, namespace: Optional[str]) -> bool:
+        """Check whether a namespace is cached in-process"""
+        return namespace in self.ttl_settings
+    
+    def get(self, key: str) -> Any:
+        """Get value from L1, returning _MISSING when absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any, namespace: str, ttl: Optional[int] = None):
+        """Store value in L1, capped by the namespace TTL and evicting LRU entries"""
+        l1_ttl = self.ttl_settings.get(namespace)
+        if not l1_ttl:
+            return
+        if ttl:
+            l1_ttl = min(l1_ttl, ttl)
+        
+        self._entries[key] = (time.monotonic() + l1_ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def delete(self, key: str):
+        """Drop a key from L1"""
+        self._entries.pop(key, None)
+    
+    def clear(self):
+        """Drop every L1 entry"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CircuitBreaker:
+    """Opens after repeated connection failures so callers bypass Redis instead of waiting on timeouts.
+
+    It stays open until the owner's reconnect probe succeeds and calls close().
+    """
+    
+    def __init__(self, failure_threshold: int = 5, window_seconds: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self._failures = deque()
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+    
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+    
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this one opened the breaker"""
+        if self.is_open:
+            return False
+        
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window_seconds:
+            self._failures.popleft()
+        if len(self._failures) >= self.failure_threshold:
+            self.opened_at = now
+            self.trips += 1
+            return True
+        return False
+    
+    def close(self):
+        self.opened_at = None
+        self._failures.clear()
+    
+    def get_stats(self) -> Dict:
+        return {
+            "state": "open" if self.is_open else "closed",
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.is_open else 0,
+            "trips": self.trips,
+        }
+
 class RedisCache:
     """Redis caching service for AI decor application"""
     
     def __init__(self):
         """Initialize Redis connection"""
+        self.pool = None
         self.client = None
-        self.is_connected = False
+        self.store = None
+        self._connected = False
         
         # Redis configuration
         self.host = os.getenv('REDIS_HOST', 'localhost')
         self.port = int(os.getenv('REDIS_PORT', 6379))
         self.password = os.getenv('REDIS_PASSWORD', None)
         self.db = int(os.getenv('REDIS_DB', 0))
+        self.max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+        self.socket_timeout = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))
+        
+        # Optional sharded mode: cache entries are spread over these nodes
+        # ("host:port" or redis:// URLs, comma-separated) by consistent hashing.
+        # Locks, pub/sub, metrics and other coordination stay on REDIS_HOST.
+        self.shard_nodes = [node.strip() for node in os.getenv('REDIS_SHARDS', '').split(',') if node.strip()]
+        self.shard_virtual_nodes = int(os.getenv('REDIS_SHARD_VIRTUAL_NODES', 160))
+        
+        # While Redis is unhealthy the breaker keeps is_connected False, so every
+        # cache call falls through immediately; a background probe reconnects with backoff
+        self.breaker = CircuitBreaker(
+            int(os.getenv('REDIS_BREAKER_FAILURES', 5)),
+            float(os.getenv('REDIS_BREAKER_WINDOW_SECONDS', 10))
+        )
+        self.reconnect_base_delay = float(os.getenv('REDIS_RECONNECT_BASE_DELAY', 0.5))
+        self.reconnect_max_delay = float(os.getenv('REDIS_RECONNECT_MAX_DELAY', 30))
+        self._reconnect_task = None
         
         # Cache TTL settings (in seconds)
         self.ttl_settings = {
@@ -34,85 +205,709 @@ class RedisCache:
             'location_data': 3600,      # 1 hour
             'session_data': 7200,       # 2 hours
         }
+        
+        # How long past its soft TTL a stale-while-revalidate entry may still be
+        # served while a background refresh runs (hard TTL = soft TTL + this)
+        self.stale_ttl_settings = {
+            'trend_data': int(os.getenv('REDIS_STALE_TTL_TREND_DATA', 86400)),  # 24 hours
+        }
+        
+        # XFetch beta per namespace (1.0 is the standard setting; higher refreshes earlier).
+        # Namespaces not listed never recompute early.
+        self.early_expiration_settings = {
+            'trend_data': float(os.getenv('REDIS_XFETCH_BETA_TREND_DATA', 1.0)),
+            'location_data': float(os.getenv('REDIS_XFETCH_BETA_LOCATION_DATA', 1.0)),
+            'artwork_recommendations': float(os.getenv('REDIS_XFETCH_BETA_ARTWORK_RECOMMENDATIONS', 1.0)),
+        }
+        
+        # Fraction of each TTL added as random jitter on write, so keys written
+        # together (e.g. after a deploy) do not all expire together
+        self.ttl_jitter = float(os.getenv('REDIS_TTL_JITTER', 0.1))
+        
+        # In-process L1 cache for small, hot, rarely-changing namespaces.
+        # TTLs are kept short because cross-worker invalidation is best-effort.
+        self.l1 = L1Cache(
+            max_entries=int(os.getenv('REDIS_L1_MAX_ENTRIES', 2048)),
+            ttl_settings={
+                'user_preferences': int(os.getenv('REDIS_L1_TTL_USER_PREFERENCES', 300)),
+                'trend_data': int(os.getenv('REDIS_L1_TTL_TREND_DATA', 120)),
+                'location_data': int(os.getenv('REDIS_L1_TTL_LOCATION_DATA', 300)),
+            }
+        )
+        
+        # Pub/sub channel used to tell other workers to drop L1 entries
+        self.invalidation_channel = os.getenv('REDIS_L1_INVALIDATION_CHANNEL', 'cache:l1:invalidate')
+        self.instance_id = uuid.uuid4().hex
+        self._invalidation_task: Optional[asyncio.Task] = None
+        
+        # Hit/miss counters for each tier
+        self.metrics = {
+            'l1_hits': 0,
+            'l1_misses': 0,
+            'l2_hits': 0,
+            'l2_misses': 0,
+            'l1_invalidations_received': 0,
+            'stale_served': 0,
+            'background_refreshes': 0,
+            'early_recomputes': 0,
+        }
+        
+        # Per-namespace, per-operation counters and latency histograms, shared across workers
+        self.namespace_metrics = CacheMetrics()
+        self._metrics_task = None
+        
+        # Key counts per namespace, maintained on write and delete
+        self.inventory = CacheInventory(self.ttl_settings)
+        self._inventory_task = None
+        
+        # Stale-while-revalidate: named recompute functions and running refresh tasks
+        self._refreshers: Dict[str, Any] = {}
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Per-namespace codecs. Large documents are compressed above the threshold;
+        # embeddings are float lists that msgpack stores far more compactly than JSON.
+        compress_threshold = int(os.getenv('REDIS_CODEC_COMPRESS_THRESHOLD', 4096))
+        compression = os.getenv('REDIS_CODEC_COMPRESSION', 'zlib')
+        self.default_codec = CacheCodec('orjson', compression, compress_threshold)
+        self.codecs = {
+            'room_analysis': CacheCodec('orjson', compression, compress_threshold),
+            'trend_data': CacheCodec('orjson', compression, compress_threshold),
+            'artwork_recommendations': CacheCodec('orjson', compression, compress_threshold),
+            'style_embeddings': CacheCodec('msgpack', 'none'),
+            'color_palette': CacheCodec('orjson', 'none'),
+            'user_preferences': CacheCodec('orjson', 'none'),
+            'location_data': CacheCodec('orjson', compression, compress_threshold),
+            'session_data': CacheCodec('orjson', compression, compress_threshold),
+        }
+        
+        # Key layout: namespace:version:hash(args). Bump the version to orphan every entry.
+        self.key_version = os.getenv('REDIS_KEY_VERSION', 'v1')
+        
+        # Generation counters ("ns:<namespace>", "user:<user_id>") live in one Redis hash
+        # and are mixed into keys, so invalidating a namespace or a user is one HINCRBY;
+        # orphaned entries age out through their TTLs. Mirrored locally, kept current
+        # through the invalidation channel plus a periodic reload.
+        self.generations_key = "cache:generations"
+        self.generations: Dict[str, int] = {}
+        self.generation_refresh_interval = float(os.getenv('REDIS_GENERATION_REFRESH_SECONDS', 30))
+        self._generation_task = None
+        # Longest a configured entry can live: a stale-while-revalidate hard TTL plus jitter
+        self.max_entry_ttl = int(max(
+            ttl + self.stale_ttl_settings.get(namespace, ttl) for namespace, ttl in self.ttl_settings.items()
+        ) * (1 + self.ttl_jitter))
+        # A user's registry outlives every key in it; members of expired keys are
+        # pruned by the inventory reconciliation SCAN
+        self.user_registry_ttl = self.max_entry_ttl
+        # User generations come from one sequence and their bump times are kept in a
+        # sorted set; once every entry a bump orphaned has expired the user's field is
+        # dropped, so the hash holds recently invalidated users only
+        self.generation_sequence_key = "cache:generation_sequence"
+        self.generation_bumps_key = "cache:generation_bumps"
+        self.generation_retention = self.max_entry_ttl + self.generation_refresh_interval
+        self.generation_prune_batch_size = 1000
+        
+        # Namespaces whose writes are also recorded as (key, write time) in a sorted
+        # set, so entries older than an age are found without scanning the keyspace
+        self.expiry_indexed_namespaces = {'trend_data'}
+        # Index members older than this are dropped on write, bounding the index
+        self.expiry_index_retention = int(os.getenv('REDIS_EXPIRY_INDEX_RETENTION_SECONDS', 7 * 86400))
+        
+        # Keys per UNLINK, so large deletes never block Redis on one command
+        self.unlink_batch_size = int(os.getenv('REDIS_UNLINK_BATCH_SIZE', 500))
+        
+        # Single-flight state for get_or_set
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.lock_ttl_ms = int(os.getenv('REDIS_SINGLE_FLIGHT_LOCK_MS', 30000))
+        self.lock_poll_interval = float(os.getenv('REDIS_SINGLE_FLIGHT_POLL_SECONDS', 0.1))
+    
+    @property
+    def is_connected(self) -> bool:
+        """Whether cache calls should use Redis: connected and the circuit breaker closed"""
+        return self._connected and not self.breaker.is_open
+    
+    @is_connected.setter
+    def is_connected(self, value: bool):
+        self._connected = value
     
     async def connect(self):
-        """Establish Redis connection"""
+        """Open the shared connection pool; keeps retrying in the background if Redis is down"""
+        if self._connected:
+            return
+        
         try:
-            self.client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                password=self.password,
-                db=self.db,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
+            if self.client is None:
+                self._create_client()
+            if self.store is None:
+                self.store = self._create_store()
             
             # Test connection
-            await self.client.ping()
-            self.is_connected = True
+            await self._ping()
+            self._on_connected()
             logger.info(f"Redis connected successfully to {self.host}:{self.port}")
             
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
-            self.is_connected = False
-            self.client = None
+            self._connected = False
+            self._schedule_reconnect()
+    
+    def _create_client(self):
+        """Create the one connection pool and client shared by the whole process"""
+        self.pool = redis.ConnectionPool(
+            host=self.host,
+            port=self.port,
+            password=self.password,
+            db=self.db,
+            # Values are binary (codec header + payload); keys are decoded where read back
+            decode_responses=False,
+            max_connections=self.max_connections,
+            socket_connect_timeout=self.socket_timeout,
+            socket_timeout=self.socket_timeout,
+            retry_on_timeout=True,
+            health_check_interval=30
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+    
+    def _create_store(self):
+        """Client holding cache entries: the control client, or one client per shard"""
+        if not self.shard_nodes:
+            return self.client
+        
+        clients = {}
+        for node in self.shard_nodes:
+            url = node if "://" in node else f"redis://{node}/{self.db}"
+            clients[node] = redis.Redis.from_url(
+                url,
+                password=self.password,
+                decode_responses=False,
+                max_connections=self.max_connections,
+                socket_connect_timeout=self.socket_timeout,
+                socket_timeout=self.socket_timeout,
+                retry_on_timeout=True,
+                health_check_interval=30
+            )
+        logger.info(f"Sharding cache entries over {len(clients)} Redis nodes")
+        return ShardedRedis(clients, self.client, self.shard_virtual_nodes)
+    
+    @property
+    def is_sharded(self) -> bool:
+        return isinstance(self.store, ShardedRedis)
+    
+    async def _ping(self):
+        """Ping the control node and, when sharded, every shard"""
+        await self.client.ping()
+        if self.is_sharded:
+            await self.store.ping()
+    
+    def _on_connected(self):
+        """Mark Redis usable and (re)start the tasks that depend on it"""
+        self._connected = True
+        self.breaker.close()
+        
+        # Start listening for L1 invalidations from other workers
+        if self._invalidation_task is None or self._invalidation_task.done():
+            self._invalidation_task = asyncio.create_task(self._listen_for_invalidations())
+        if self._metrics_task is None or self._metrics_task.done():
+            self._metrics_task = asyncio.create_task(self._flush_metrics_periodically())
+        if self._generation_task is None or self._generation_task.done():
+            self._generation_task = asyncio.create_task(self._refresh_generations_periodically())
+        if self._inventory_task is None or self._inventory_task.done():
+            self._inventory_task = asyncio.create_task(self.inventory.run(self))
+    
+    def _record_failure(self, error: Exception):
+        """Feed connection errors to the circuit breaker; open it and start reconnecting when it trips"""
+        if not isinstance(error, (redis.ConnectionError, redis.TimeoutError, OSError, asyncio.TimeoutError)):
+            return
+        if self.breaker.record_failure():
+            logger.warning(f"Redis circuit breaker opened, bypassing cache until Redis recovers: {error}")
+            self._schedule_reconnect()
+    
+    def _schedule_reconnect(self):
+        """Start the background reconnect loop unless it is already running"""
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            return
+        try:
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_with_backoff())
+        except RuntimeError:
+            # No running event loop; the next connect() call retries
+            pass
+    
+    async def _reconnect_with_backoff(self):
+        """Probe Redis with exponential backoff and jitter until it answers"""
+        delay = self.reconnect_base_delay
+        while True:
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            try:
+                if self.client is None:
+                    self._create_client()
+                if self.store is None:
+                    self.store = self._create_store()
+                await asyncio.wait_for(self._ping(), self.socket_timeout)
+                self._on_connected()
+                logger.info(f"Redis reachable again at {self.host}:{self.port}, cache re-enabled")
+                return
+            except Exception as e:
+                delay = min(delay * 2, self.reconnect_max_delay)
+                logger.warning(f"Redis still unavailable, retrying in {delay:.1f}s: {e}")
     
     async def disconnect(self):
         """Close Redis connection"""
+        for task in (self._reconnect_task, self._invalidation_task, self._metrics_task,
+                     self._generation_task, self._inventory_task):
+            if task:
+                task.cancel()
+        self._reconnect_task = None
+        self._invalidation_task = None
+        self._metrics_task = None
+        self._generation_task = None
+        self._inventory_task = None
+        self.l1.clear()
+        if self.is_sharded:
+            await self.store.close()
+        self.store = None
         if self.client:
-            await self.client.close()
-            self.is_connected = False
+            await self.client.aclose()
+            if self.pool:
+                await self.pool.disconnect()
+            self.client = None
+            self.pool = None
+            self._connected = False
             logger.info("Redis connection closed")
     
-    def _generate_cache_key(self, prefix: str, *args) -> str:
-        """Generate a consistent cache key"""
-        # Create a hash of all arguments for consistent key generation
-        key_data = f"{prefix}:{':'.join(str(arg) for arg in args)}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+    async def health(self) -> Dict:
+        """Connection and breaker state, pinging Redis only when the cache is in use"""
+        status = {
+            "redis_url": f"redis://{self.host}:{self.port}/{self.db}",
+            "connected": self.is_connected,
+            "circuit_breaker": self.breaker.get_stats(),
+            "reconnecting": self._reconnect_task is not None and not self._reconnect_task.done(),
+        }
+        if self.is_sharded:
+            status["shards"] = self.shard_nodes
+        if self.is_connected:
+            try:
+                started = time.perf_counter()
+                await asyncio.wait_for(self._ping(), self.socket_timeout)
+                status["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            except Exception as e:
+                self._record_failure(e)
+                status["connected"] = False
+                status["error"] = str(e)
+        return status
+    
+    def make_key(self, namespace: str, *args, user_id: Optional[str] = None) -> str:
+        """Build the cache key used by the specialized methods, for use with get_or_set.
+
+        Pass user_id for entries that belong to a user, so invalidate_user_cache
+        reaches them.
+        """
+        return self._generate_cache_key(namespace, *args, user_id=user_id)
+    
+    def _generate_cache_key(self, prefix: str, *args, user_id: Optional[str] = None) -> str:
+        """Generate a consistent cache key of the form namespace:version:hash(args, generations)"""
+        parts = [str(arg) for arg in args]
+        if user_id is not None:
+            parts.append(str(user_id))
+        
+        # Generation zero adds nothing, so keys are unchanged until the first invalidation
+        namespace_generation = self.generations.get(f"ns:{prefix}", 0)
+        if namespace_generation:
+            parts.append(f"ns_gen={namespace_generation}")
+        if user_id is not None:
+            user_generation = self.generations.get(f"user:{user_id}", 0)
+            if user_generation:
+                parts.append(f"user_gen={user_generation}")
+        
+        # Keep the namespace readable so pattern matching and stats work;
+        # hash only the arguments to bound key length
+        args_digest = hashlib.md5(':'.join(parts).encode()).hexdigest()
+        return f"{prefix}:{self.key_version}:{args_digest}"
+    
+    @staticmethod
+    def _namespace_of(key: str) -> Optional[str]:
+        """Extract the namespace prefix from a structured cache key"""
+        return key.split(':', 1)[0] if ':' in key else None
+    
+    def _batch_namespace(self, keys) -> str:
+        """Namespace shared by every key in a batch, or 'mixed'"""
+        namespaces = {self._namespace_of(key) for key in keys}
+        return namespaces.pop() if len(namespaces) == 1 else "mixed"
+    
+    def _count_batch(self, keys, operation: str, result: str):
+        """Count one result per key of a batched operation, by namespace"""
+        for key in keys:
+            self.namespace_metrics.count(self._namespace_of(key), operation, result)
+    
+    def _user_registry_key(self, user_id: str) -> str:
+        """Redis set recording every key written on a user's behalf"""
+        return f"user_keys:{user_id}"
+    
+    def _codec_for(self, namespace: Optional[str]) -> CacheCodec:
+        """Codec configured for a namespace"""
+        return self.codecs.get(namespace) or self.default_codec
+    
+    def _encode(self, value: Any, namespace: Optional[str]) -> bytes:
+        """Serialize a value for storage in Redis"""
+        return self._codec_for(namespace).encode(value)
+    
+    def _decode(self, raw: Any, namespace: Optional[str]) -> Any:
+        """Deserialize a value read from Redis (the header names its codec)"""
+        return self._codec_for(namespace).decode(raw)
     
-    async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+    @staticmethod
+    def _to_str(value: Any) -> str:
+        """Decode a key returned by Redis"""
+        return value.decode() if isinstance(value, bytes) else value
+    
+    def get_local(self, key: str) -> Optional[Any]:
+        """Get a value from this worker's L1 only, without touching Redis"""
+        value = self.l1.get(key)
+        return None if value is _MISSING else self._unwrap(key, value)
+    
+    async def get(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        """Get value from cache, checking the in-process L1 before Redis"""
+        return self._unwrap(key, await self._get_stored(key, namespace))
+    
+    async def _get_stored(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
+        """Read the stored form of a key (possibly an envelope) from L1 or Redis"""
+        namespace = namespace or self._namespace_of(key)
+        use_l1 = self.l1.handles(namespace)
+        if use_l1:
+            value = self.l1.get(key)
+            if value is not _MISSING:
+                self.metrics['l1_hits'] += 1
+                self.namespace_metrics.count(namespace, 'get', 'l1_hit')
+                return value
+            self.metrics['l1_misses'] += 1
+        
         if not self.is_connected:
             return None
         
         try:
-            value = await self.client.get(key)
+            started = time.perf_counter()
+            value = await self.store.get(key)
+            self.namespace_metrics.observe(namespace, 'get', time.perf_counter() - started)
             if value:
-                return json.loads(value)
+                self.metrics['l2_hits'] += 1
+                self.namespace_metrics.count(namespace, 'get', 'hit')
+                decoded = self._decode(value, namespace)
+                if use_l1:
+                    self.l1.set(key, decoded, namespace)
+                return decoded
+            self.metrics['l2_misses'] += 1
+            self.namespace_metrics.count(namespace, 'get', 'miss')
             return None
         except Exception as e:
             logger.error(f"Error getting cache key {key}: {e}")
+            self._record_failure(e)
+            self.namespace_metrics.count(namespace, 'get', 'error')
+            return None
+    
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values in one round trip, serving L1 hits locally.
+
+        Returns a list aligned with keys, with None for misses and for entries
+        this reader should recompute early.
+        """
+        results: List[Optional[Any]] = [None] * len(keys)
+        remote_indexes = []
+        
+        for index, key in enumerate(keys):
+            namespace = self._namespace_of(key)
+            if self.l1.handles(namespace):
+                value = self.l1.get(key)
+                if value is not _MISSING:
+                    self.metrics['l1_hits'] += 1
+                    self.namespace_metrics.count(namespace, 'mget', 'l1_hit')
+                    results[index] = self._batch_value(key, value)
+                    continue
+                self.metrics['l1_misses'] += 1
+            remote_indexes.append(index)
+        
+        if not remote_indexes or not self.is_connected:
+            return results
+        
+        remote_keys = [keys[index] for index in remote_indexes]
+        try:
+            started = time.perf_counter()
+            raw_values = await self.store.mget(remote_keys)
+            self.namespace_metrics.observe(self._batch_namespace(remote_keys), 'mget', time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Error getting cache keys {keys[:5]}: {e}")
+            self._record_failure(e)
+            for key in remote_keys:
+                self.namespace_metrics.count(self._namespace_of(key), 'mget', 'error')
+            return results
+        
+        for index, raw in zip(remote_indexes, raw_values):
+            key = keys[index]
+            namespace = self._namespace_of(key)
+            if not raw:
+                self.metrics['l2_misses'] += 1
+                self.namespace_metrics.count(namespace, 'mget', 'miss')
+                continue
+            try:
+                results[index] = self._decode(raw, namespace)
+            except Exception as e:
+                logger.error(f"Error decoding cache key {key}: {e}")
+                self.namespace_metrics.count(namespace, 'mget', 'error')
+                continue
+            self.metrics['l2_hits'] += 1
+            self.namespace_metrics.count(namespace, 'mget', 'hit')
+            if self.l1.handles(namespace):
+                self.l1.set(key, results[index], namespace)
+            results[index] = self._batch_value(key, results[index])
+        
+        return results
+    
+    def _batch_value(self, key: str, stored: Any) -> Optional[Any]:
+        """Value of a batched read, or None when this reader wins the early-recompute draw.
+
+        Callers treat the None as a miss and recompute through single_flight,
+        the same way get_or_set handles an early recompute.
+        """
+        if self._should_recompute_early(key, stored):
+            self.metrics['early_recomputes'] += 1
+            logger.debug(f"Early recompute for key: {key}")
             return None
+        return self._unwrap(key, stored)
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with optional TTL"""
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None,
+                  namespace: Optional[str] = None, user_id: Optional[str] = None) -> bool:
+        """Set value in cache with optional TTL, registering the key under user_id if given"""
         if not self.is_connected:
             return False
         
+        namespace = namespace or self._namespace_of(key)
         try:
-            serialized_value = json.dumps(value, default=str)
-            if ttl:
-                await self.client.setex(key, ttl, serialized_value)
-            else:
-                await self.client.set(key, serialized_value)
+            serialized_value = self._encode(value, namespace)
+            use_l1 = self.l1.handles(namespace)
+            
+            started = time.perf_counter()
+            async with self.store.pipeline(transaction=False) as pipe:
+                self._queue_write(pipe, key, serialized_value, ttl, user_id)
+                if use_l1:
+                    # Other workers may hold the previous value in their L1
+                    pipe.publish(self.invalidation_channel, self._invalidation_message([key]))
+                results = await pipe.execute()
+            if not results[0]:
+                self.inventory.record(namespace, 1)
+            self.namespace_metrics.observe(namespace, 'set', time.perf_counter() - started)
+            self.namespace_metrics.count(namespace, 'set', 'ok')
+            
+            if use_l1:
+                self.l1.set(key, value, namespace, ttl)
             return True
         except Exception as e:
             logger.error(f"Error setting cache key {key}: {e}")
+            self._record_failure(e)
+            self.namespace_metrics.count(namespace, 'set', 'error')
             return False
     
+    async def mset(self, entries: Dict[str, Any], ttls: Optional[Dict[str, int]] = None,
+                   owners: Optional[Dict[str, str]] = None) -> bool:
+        """Set several values in one pipelined round trip.
+
+        TTLs default to each key's namespace setting; owners maps keys to the
+        user_id whose key registry should record them.
+        """
+        if not self.is_connected or not entries:
+            return False
+        
+        ttls = ttls or {}
+        owners = owners or {}
+        try:
+            l1_keys = []
+            started = time.perf_counter()
+            # Position of each key's EXISTS result in the pipeline results
+            exists_at = {}
+            queued = 0
+            async with self.store.pipeline(transaction=False) as pipe:
+                for key, value in entries.items():
+                    namespace = self._namespace_of(key)
+                    ttl = ttls.get(key, self.ttl_settings.get(namespace))
+                    exists_at[key] = queued
+                    queued += self._queue_write(pipe, key, self._encode(value, namespace), ttl, owners.get(key))
+                    if self.l1.handles(namespace):
+                        l1_keys.append(key)
+                if l1_keys:
+                    pipe.publish(self.invalidation_channel, self._invalidation_message(l1_keys))
+                results = await pipe.execute()
+            for key, position in exists_at.items():
+                if not results[position]:
+                    self.inventory.record(self._namespace_of(key), 1)
+            self.namespace_metrics.observe(self._batch_namespace(entries), 'mset', time.perf_counter() - started)
+            self._count_batch(entries, 'mset', 'ok')
+            
+            for key in l1_keys:
+                self.l1.set(key, entries[key], self._namespace_of(key), ttls.get(key))
+            return True
+        except Exception as e:
+            logger.error(f"Error setting cache keys {list(entries)[:5]}: {e}")
+            self._record_failure(e)
+            self._count_batch(entries, 'mset', 'error')
+            return False
+    
+    def _jittered_ttl(self, ttl: int) -> int:
+        """Lengthen a TTL by up to ttl_jitter, never shortening it below the requested TTL"""
+        if self.ttl_jitter <= 0:
+            return ttl
+        return ttl + random.randint(0, int(ttl * self.ttl_jitter))
+    
+    def _expiry_index_key(self, namespace: str) -> str:
+        """Sorted set of a namespace's keys scored by write time"""
+        return f"cache:expiry_index:{namespace}"
+    
+    def _queue_write(self, pipe, key: str, serialized_value: Any, ttl: Optional[int], user_id: Optional[str]) -> int:
+        """Queue a value write, plus its user registry and expiry index entries, on a pipeline.
+        
+        The first queued command is an EXISTS, telling whether the write created
+        the key; returns the number of commands queued.
+        """
+        pipe.exists(key)
+        queued = 2
+        if ttl:
+            pipe.setex(key, self._jittered_ttl(ttl), serialized_value)
+        else:
+            pipe.set(key, serialized_value)
+        namespace = self._namespace_of(key)
+        if namespace in self.expiry_indexed_namespaces:
+            now = time.time()
+            index_key = self._expiry_index_key(namespace)
+            pipe.zadd(index_key, {key: now})
+            pipe.zremrangebyscore(index_key, "-inf", now - self.expiry_index_retention)
+            queued += 2
+        if user_id:
+            # Members may outlive their keys; UNLINK of a missing key is a no-op
+            registry_key = self._user_registry_key(user_id)
+            pipe.sadd(registry_key, key)
+            pipe.expire(registry_key, self.user_registry_ttl)
+            queued += 2
+        return queued
+    
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
         if not self.is_connected:
+            self.l1.delete(key)
             return False
         
+        await self.delete_many([key])
+        return True
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete keys from Redis and from every worker's L1, returning the Redis delete count"""
+        for key in keys:
+            self.l1.delete(key)
+        
+        if not self.is_connected or not keys:
+            return 0
+        
         try:
-            await self.client.delete(key)
-            return True
+            # UNLINK frees memory in a background thread; batching keeps each command small.
+            # Batches hold one namespace each so their counts update the key inventory.
+            by_namespace: Dict[str, List[str]] = {}
+            for key in keys:
+                by_namespace.setdefault(self._namespace_of(key), []).append(key)
+            batches = [
+                (namespace, namespace_keys[i:i + self.unlink_batch_size])
+                for namespace, namespace_keys in by_namespace.items()
+                for i in range(0, len(namespace_keys), self.unlink_batch_size)
+            ]
+            
+            started = time.perf_counter()
+            async with self.store.pipeline(transaction=False) as pipe:
+                for _, batch in batches:
+                    pipe.unlink(*batch)
+                pipe.publish(self.invalidation_channel, self._invalidation_message(keys))
+                results = await pipe.execute()
+            self.namespace_metrics.observe(self._batch_namespace(keys), 'delete', time.perf_counter() - started)
+            self._count_batch(keys, 'delete', 'ok')
+            for (namespace, _), deleted in zip(batches, results):
+                self.inventory.record(namespace, -deleted)
+            return sum(results[:-1])
         except Exception as e:
-            logger.error(f"Error deleting cache key {key}: {e}")
-            return False
+            logger.error(f"Error deleting cache keys {keys[:5]}: {e}")
+            self._record_failure(e)
+            self._count_batch(keys, 'delete', 'error')
+            return 0
+    
+    async def delete_older_than(self, namespace: str, max_age_seconds: float) -> int:
+        """Delete a namespace's entries written more than max_age_seconds ago.
+        
+        Reads the stale keys from the namespace's expiry index, so the cost
+        grows with the number of stale keys rather than the keyspace size.
+        """
+        if namespace not in self.expiry_indexed_namespaces:
+            raise ValueError(f"Namespace {namespace} has no expiry index")
+        if not self.is_connected:
+            return 0
+        
+        index_key = self._expiry_index_key(namespace)
+        cutoff = time.time() - max_age_seconds
+        try:
+            started = time.perf_counter()
+            keys = [self._to_str(key) for key in await self.store.zrangebyscore(index_key, "-inf", cutoff)]
+            if not keys:
+                return 0
+            
+            for key in keys:
+                self.l1.delete(key)
+            async with self.store.pipeline(transaction=False) as pipe:
+                for i in range(0, len(keys), self.unlink_batch_size):
+                    pipe.unlink(*keys[i:i + self.unlink_batch_size])
+                pipe.zremrangebyscore(index_key, "-inf", cutoff)
+                if self.l1.handles(namespace):
+                    pipe.publish(self.invalidation_channel, self._invalidation_message(keys))
+                results = await pipe.execute()
+            self.namespace_metrics.observe(namespace, 'delete', time.perf_counter() - started)
+            self._count_batch(keys, 'delete', 'ok')
+            
+            # Keys that already expired through their TTL are only dropped from the index
+            unlink_batches = (len(keys) + self.unlink_batch_size - 1) // self.unlink_batch_size
+            deleted = sum(results[:unlink_batches])
+            self.inventory.record(namespace, -deleted)
+            return deleted
+        except Exception as e:
+            logger.error(f"Error deleting stale {namespace} entries: {e}")
+            self._record_failure(e)
+            self.namespace_metrics.count(namespace, 'delete', 'error')
+            return 0
+    
+    def _invalidation_message(self, keys: List[str]) -> str:
+        """Build the pub/sub payload announcing that keys changed"""
+        return json.dumps({"origin": self.instance_id, "keys": keys})
+    
+    async def _listen_for_invalidations(self):
+        """Drop L1 entries when another worker writes or deletes them"""
+        pubsub = self.client.pubsub()
+        try:
+            await pubsub.subscribe(self.invalidation_channel)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    payload = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if payload.get("origin") == self.instance_id:
+                    continue
+                self._apply_generations(payload.get("generations", {}))
+                for field in payload.get("pruned_generations", []):
+                    self.generations.pop(field, None)
+                for key in payload.get("keys", []):
+                    self.l1.delete(key)
+                self.metrics['l1_invalidations_received'] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Without invalidations we can no longer trust L1 beyond its TTL
+            logger.error(f"L1 invalidation listener stopped: {e}")
+            self._record_failure(e)
+            self.l1.clear()
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
     
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
@@ -120,152 +915,620 @@ class RedisCache:
             return False
         
         try:
-            return await self.client.exists(key) > 0
+            return await self.store.exists(key) > 0
         except Exception as e:
             logger.error(f"Error checking cache key {key}: {e}")
+            self._record_failure(e)
             return False
     
-    async def get_or_set(self, key: str, func, ttl: Optional[int] = None, *args, **kwargs) -> Any:
-        """Get from cache or set if not exists"""
+    # Generation counters
+    
+    async def bump_generation(self, namespace: Optional[str] = None, user_id: Optional[str] = None) -> int:
+        """Orphan every entry of a namespace or of a user with one HINCRBY; returns the new generation"""
+        field = f"user:{user_id}" if user_id is not None else f"ns:{namespace}"
+        if not self.is_connected:
+            return self.generations.get(field, 0)
+        
+        try:
+            if user_id is not None:
+                generation = await self.client.eval(
+                    _BUMP_USER_GENERATION_SCRIPT, 3, self.generations_key, self.generation_bumps_key,
+                    self.generation_sequence_key, field, time.time()
+                )
+            else:
+                generation = await self.client.hincrby(self.generations_key, field, 1)
+            self._apply_generations({field: generation})
+            # Other workers switch keys as soon as they hear about it
+            await self.client.publish(
+                self.invalidation_channel,
+                json.dumps({"origin": self.instance_id, "generations": {field: generation}})
+            )
+            logger.info(f"Bumped cache generation {field} to {generation}")
+            return generation
+        except Exception as e:
+            logger.error(f"Error bumping cache generation {field}: {e}")
+            self._record_failure(e)
+            return self.generations.get(field, 0)
+    
+    async def refresh_generations(self):
+        """Reload every generation counter from Redis"""
+        try:
+            raw = await self.client.hgetall(self.generations_key)
+            self._apply_generations({self._to_str(field): int(value) for field, value in raw.items()})
+        except Exception as e:
+            logger.error(f"Error loading cache generations: {e}")
+            self._record_failure(e)
+    
+    async def prune_generations(self) -> int:
+        """Drop user generations whose orphaned entries have all expired; returns how many"""
+        try:
+            fields = await self.client.eval(
+                _PRUNE_GENERATIONS_SCRIPT, 2, self.generations_key, self.generation_bumps_key,
+                time.time() - self.generation_retention, self.generation_prune_batch_size
+            )
+            fields = [self._to_str(field) for field in fields]
+            if not fields:
+                return 0
+            
+            for field in fields:
+                self.generations.pop(field, None)
+            await self.client.publish(
+                self.invalidation_channel,
+                json.dumps({"origin": self.instance_id, "pruned_generations": fields})
+            )
+            logger.info(f"Pruned {len(fields)} user cache generations")
+            return len(fields)
+        except Exception as e:
+            logger.error(f"Error pruning cache generations: {e}")
+            self._record_failure(e)
+            return 0
+    
+    def _apply_generations(self, generations: Dict[str, int]):
+        """Merge generation counters; they only ever move forward"""
+        for field, generation in generations.items():
+            if generation > self.generations.get(field, 0):
+                self.generations[field] = generation
+    
+    async def _refresh_generations_periodically(self):
+        """Catch up on generation bumps whose pub/sub message was missed, and prune old ones"""
+        while True:
+            if self.is_connected:
+                await self.refresh_generations()
+                await self.prune_generations()
+            await asyncio.sleep(self.generation_refresh_interval)
+    
+    async def _flush_metrics_periodically(self):
+        """Add this worker's metric increments to the shared totals every flush interval"""
+        while True:
+            await asyncio.sleep(self.namespace_metrics.flush_interval)
+            if self.is_connected:
+                await self.namespace_metrics.flush(self.client)
+    
+    async def get_or_set(self, key: str, func, ttl: Optional[int] = None, *args,
+                         namespace: Optional[str] = None, user_id: Optional[str] = None, **kwargs) -> Any:
+        """Get from cache or compute and set, with single-flight semantics.
+
+        Concurrent misses for the same key in this worker await one shared
+        future; across workers a short-lived Redis lock elects one computer
+        while the others poll for its result.
+        """
         # Try to get from cache first
-        cached_value = await self.get(key)
-        if cached_value is not None:
-            logger.debug(f"Cache hit for key: {key}")
-            return cached_value
+        stored = await self._get_stored(key, namespace)
+        if stored is not None:
+            if not self._should_recompute_early(key, stored):
+                logger.debug(f"Cache hit for key: {key}")
+                return self._unwrap(key, stored)
+            # XFetch: this reader won the early-recompute draw; others keep the cached value
+            self.metrics['early_recomputes'] += 1
+            logger.debug(f"Early recompute for key: {key}")
+        
+        return await self.single_flight(key, func, ttl, *args, namespace=namespace, user_id=user_id, **kwargs)
+    
+    async def single_flight(self, key: str, func, ttl: Optional[int] = None, *args,
+                            namespace: Optional[str] = None, user_id: Optional[str] = None, **kwargs) -> Any:
+        """Compute and cache a value already known to be missing, coalescing concurrent callers"""
+        # Join a computation already running in this worker
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            logger.debug(f"Joining in-flight computation for key: {key}")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leader was cancelled, not us: start over
+                return await self.get_or_set(key, func, ttl, *args, namespace=namespace, user_id=user_id, **kwargs)
         
         # Cache miss, execute function and cache result
         logger.debug(f"Cache miss for key: {key}")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._compute_once(key, func, ttl, namespace, user_id, args, kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Error in get_or_set for key {key}: {e}")
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    # Stale-while-revalidate
+    
+    def register_refresher(self, name: str, func):
+        """Register a named function used to recompute stale-while-revalidate entries.
+
+        The name and arguments are stored with each entry, so any worker that
+        reads a stale value can schedule the refresh.
+        """
+        self._refreshers[name] = func
+    
+    async def get_or_refresh(self, key: str, refresher: str, *args, soft_ttl: Optional[int] = None,
+                             hard_ttl: Optional[int] = None, namespace: Optional[str] = None) -> Any:
+        """Get with stale-while-revalidate semantics.
+
+        Fresh until soft_ttl; between soft_ttl and hard_ttl the cached value is
+        returned immediately and one background refresh is scheduled. Only a
+        true miss waits for the computation. args must be JSON-serializable.
+        """
+        namespace = namespace or self._namespace_of(key)
+        soft_ttl, hard_ttl = self._swr_ttls(namespace, soft_ttl, hard_ttl)
+        
+        # get() serves stale values and schedules their refresh
+        cached_value = await self.get(key, namespace=namespace)
+        if cached_value is not None:
+            return cached_value
+        
+        result = await self.single_flight(
+            key, self._compute_envelope, hard_ttl, refresher, list(args), soft_ttl, hard_ttl,
+            namespace=namespace
+        )
+        # Leaders get the envelope back, waiters get the unwrapped value via get()
+        return self._unwrap(key, result)
+    
+    async def warm(self, key: str, refresher: str, *args, soft_ttl: Optional[int] = None,
+                   hard_ttl: Optional[int] = None, namespace: Optional[str] = None,
+                   min_fresh_seconds: int = 0) -> bool:
+        """Precompute a stale-while-revalidate entry unless it stays fresh for min_fresh_seconds.
+
+        Returns True when the entry was computed, False when it was already fresh.
+        Entries are never recomputed before half their soft TTL has passed.
+        """
+        namespace = namespace or self._namespace_of(key)
+        soft_ttl, hard_ttl = self._swr_ttls(namespace, soft_ttl, hard_ttl)
+        min_fresh_seconds = min(min_fresh_seconds, soft_ttl // 2)
+        
+        stored = await self._get_stored(key, namespace)
+        if self._is_envelope(stored) and stored.get("fresh_until", 0) - time.time() > min_fresh_seconds:
+            return False
+        
+        await self.single_flight(
+            key, self._compute_envelope, hard_ttl, refresher, list(args), soft_ttl, hard_ttl,
+            namespace=namespace
+        )
+        return True
+    
+    def _swr_ttls(self, namespace: str, soft_ttl: Optional[int], hard_ttl: Optional[int]) -> Tuple[int, int]:
+        """Default soft TTL to the namespace TTL and hard TTL to soft plus the namespace stale window"""
+        soft_ttl = soft_ttl or self.ttl_settings.get(namespace, 3600)
+        hard_ttl = hard_ttl or soft_ttl + self.stale_ttl_settings.get(namespace, soft_ttl)
+        return soft_ttl, hard_ttl
+    
+    async def _compute_envelope(self, refresher: str, args: List, soft_ttl: int, hard_ttl: int) -> Dict:
+        """Run a refresher and wrap its result with its freshness deadline"""
+        func = self._refreshers[refresher]
+        started = time.monotonic()
+        if asyncio.iscoroutinefunction(func):
+            value = await func(*args)
+        else:
+            value = func(*args)
+        
+        return {
+            "__envelope__": 1,
+            "value": value,
+            "delta": time.monotonic() - started,
+            "computed_at": time.time(),
+            "fresh_until": time.time() + soft_ttl,
+            "refresher": refresher,
+            "args": args,
+            "soft_ttl": soft_ttl,
+            "hard_ttl": hard_ttl,
+        }
+    
+    def _unwrap(self, key: str, stored: Any) -> Any:
+        """Return the value held in a cache envelope, scheduling a refresh when due.
+
+        Stale-while-revalidate entries refresh in the background once past their
+        soft deadline, or earlier with XFetch probability when enabled.
+        """
+        if not self._is_envelope(stored):
+            return stored
+        
+        fresh_until = stored.get("fresh_until")
+        if fresh_until is not None:
+            if time.time() >= fresh_until:
+                self.metrics['stale_served'] += 1
+                self._schedule_refresh(key, stored)
+            elif self._expires_early(key, stored, fresh_until):
+                self.metrics['early_recomputes'] += 1
+                self._schedule_refresh(key, stored)
+        return stored.get("value")
+    
+    @staticmethod
+    def _is_envelope(stored: Any) -> bool:
+        """Check whether a stored value is a metadata envelope rather than a plain value"""
+        return isinstance(stored, dict) and bool(stored.get("__envelope__"))
+    
+    def _written_since(self, stored: Any, since: float) -> bool:
+        """Whether a stored value can stand in for a computation requested at since.
+
+        Plain values only exist if someone wrote them; envelopes also exist when
+        stale or due for early recompute, so they count only if computed later.
+        """
+        if stored is None:
+            return False
+        if not self._is_envelope(stored):
+            return True
+        return stored.get("computed_at", 0) >= since
+    
+    def _should_recompute_early(self, key: str, stored: Any) -> bool:
+        """XFetch check for get_or_set entries (stale-while-revalidate entries refresh in _unwrap)"""
+        if not self._is_envelope(stored) or "fresh_until" in stored or "expires_at" not in stored:
+            return False
+        return self._expires_early(key, stored, stored["expires_at"])
+    
+    def _expires_early(self, key: str, envelope: Dict, deadline: float) -> bool:
+        """XFetch: recompute with probability rising toward the deadline, scaled by compute time.
+
+        Triggers when now - delta * beta * ln(rand) >= deadline, so slow
+        computations start refreshing earlier and hot keys rarely expire
+        for everyone at once.
+        """
+        beta = self.early_expiration_settings.get(self._namespace_of(key))
+        delta = envelope.get("delta", 0)
+        if not beta or delta <= 0:
+            return False
+        # 1 - random() is in (0, 1], so the log is defined
+        return time.time() - delta * beta * math.log(1.0 - random.random()) >= deadline
+    
+    def _schedule_refresh(self, key: str, envelope: Dict):
+        """Start one background refresh per key in this worker"""
+        running = self._refresh_tasks.get(key)
+        if running is not None and not running.done():
+            return
+        if envelope.get("refresher") not in self._refreshers:
+            return
+        
+        try:
+            self._refresh_tasks[key] = asyncio.get_running_loop().create_task(self._refresh(key, envelope))
+        except RuntimeError:
+            # No running event loop (synchronous caller); the entry will refresh on a later read
+            pass
+    
+    async def _refresh(self, key: str, envelope: Dict):
+        """Recompute a stale entry; the Redis lock keeps other workers from doing the same"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        if not await self._acquire_lock(lock_key, token):
+            self._refresh_tasks.pop(key, None)
+            return
+        
         try:
+            self.metrics['background_refreshes'] += 1
+            refreshed = await self._compute_envelope(
+                envelope["refresher"], envelope.get("args", []),
+                envelope["soft_ttl"], envelope["hard_ttl"]
+            )
+            await self.set(key, refreshed, envelope["hard_ttl"])
+            logger.debug(f"Refreshed stale cache key: {key}")
+        except Exception as e:
+            # Keep serving the stale value until its hard TTL
+            logger.error(f"Error refreshing stale cache key {key}: {e}")
+        finally:
+            await self._release_lock(lock_key, token)
+            self._refresh_tasks.pop(key, None)
+    
+    async def _compute_once(self, key: str, func, ttl: Optional[int], namespace: Optional[str],
+                            user_id: Optional[str], args: tuple, kwargs: dict) -> Any:
+        """Compute a missing value, deferring to another worker that holds the key's lock"""
+        requested_at = time.time()
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        acquired = await self._acquire_lock(lock_key, token)
+        
+        while not acquired:
+            value = await self._wait_for_value(key, lock_key, namespace)
+            if value is not None:
+                return value
+            # The lock holder gave up or died without writing; take over unless
+            # another waiter got there first, in which case wait for that one
+            acquired = await self._acquire_lock(lock_key, token)
+        
+        # Keep the lock while func runs, however long that takes
+        heartbeat = asyncio.create_task(self._hold_lock(key, token, self.lock_ttl_ms)) if self.is_connected else None
+        try:
+            # The previous holder may have written the key just before we took the lock
+            stored = await self._get_stored(key, namespace)
+            if self._written_since(stored, requested_at):
+                return self._unwrap(key, stored)
+            
+            started = time.monotonic()
             if asyncio.iscoroutinefunction(func):
                 result = await func(*args, **kwargs)
             else:
                 result = func(*args, **kwargs)
+            delta = time.monotonic() - started
+            
+            # Record compute time and expiry so later reads can recompute early
+            stored = result
+            namespace = namespace or self._namespace_of(key)
+            if ttl and namespace in self.early_expiration_settings and not self._is_envelope(result):
+                stored = {
+                    "__envelope__": 1, "value": result, "delta": delta,
+                    "computed_at": time.time(), "expires_at": time.time() + ttl,
+                }
             
             # Cache the result
-            await self.set(key, result, ttl)
+            await self.set(key, stored, ttl, namespace=namespace, user_id=user_id)
             return result
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            await self._release_lock(lock_key, token)
+    
+    async def _hold_lock(self, name: str, token: str, ttl_ms: int):
+        """Renew a named lock every third of its TTL until cancelled or the lock is lost"""
+        while True:
+            await asyncio.sleep(ttl_ms / 3000)
+            if not await self.extend_lock(name, token, ttl_ms):
+                logger.warning(f"Lost lock {name} before the computation finished")
+                return
+    
+    async def acquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """Take a named cross-worker lock; returns its token, or None if held elsewhere or Redis is down"""
+        if not self.is_connected:
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            if await self.client.set(f"lock:{name}", token, nx=True, px=ttl_ms):
+                return token
+            return None
         except Exception as e:
-            logger.error(f"Error in get_or_set for key {key}: {e}")
-            raise
+            logger.error(f"Error acquiring lock {name}: {e}")
+            self._record_failure(e)
+            return None
+    
+    async def release_lock(self, name: str, token: str):
+        """Release a named lock taken with acquire_lock"""
+        await self._release_lock(f"lock:{name}", token)
+    
+    async def extend_lock(self, name: str, token: str, ttl_ms: int) -> bool:
+        """Renew a named lock we still hold; False if it expired or was taken over"""
+        if not self.is_connected:
+            return False
+        
+        try:
+            return bool(await self.client.eval(_EXTEND_LOCK_SCRIPT, 1, f"lock:{name}", token, ttl_ms))
+        except Exception as e:
+            logger.error(f"Error extending lock {name}: {e}")
+            self._record_failure(e)
+            return False
+    
+    async def _acquire_lock(self, lock_key: str, token: str) -> bool:
+        """Try to take the cross-worker compute lock; fail open when Redis is unavailable"""
+        if not self.is_connected:
+            return True
+        
+        try:
+            return bool(await self.client.set(lock_key, token, nx=True, px=self.lock_ttl_ms))
+        except Exception as e:
+            logger.error(f"Error acquiring lock {lock_key}: {e}")
+            self._record_failure(e)
+            return True
+    
+    async def _release_lock(self, lock_key: str, token: str):
+        """Release the compute lock if we still own it"""
+        if not self.is_connected:
+            return
+        
+        try:
+            await self.client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Error releasing lock {lock_key}: {e}")
+            self._record_failure(e)
+    
+    async def _wait_for_value(self, key: str, lock_key: str, namespace: Optional[str]) -> Optional[Any]:
+        """Poll for a value another worker is computing, until it lands or the lock goes away"""
+        deadline = time.monotonic() + self.lock_ttl_ms / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            if not self.is_connected:
+                return None
+            value = await self.get(key, namespace=namespace)
+            if value is not None:
+                return value
+            try:
+                if not await self.client.exists(lock_key):
+                    # Lock released; give the writer's SET one last chance to be visible
+                    return await self.get(key, namespace=namespace)
+            except Exception as e:
+                logger.error(f"Error checking lock {lock_key}: {e}")
+                self._record_failure(e)
+                return None
+        return None
     
     # Specialized cache methods for different data types
     
     async def cache_room_analysis(self, image_hash: str, user_id: str, analysis_result: Dict) -> bool:
         """Cache room analysis result"""
-        key = self._generate_cache_key('room_analysis', image_hash, user_id)
+        key = self._generate_cache_key('room_analysis', image_hash, user_id=user_id)
         ttl = self.ttl_settings['room_analysis']
-        return await self.set(key, analysis_result, ttl)
+        return await self.set(key, analysis_result, ttl, namespace='room_analysis', user_id=user_id)
     
     async def get_cached_room_analysis(self, image_hash: str, user_id: str) -> Optional[Dict]:
         """Get cached room analysis result"""
-        key = self._generate_cache_key('room_analysis', image_hash, user_id)
-        return await self.get(key)
+        key = self._generate_cache_key('room_analysis', image_hash, user_id=user_id)
+        return await self.get(key, namespace='room_analysis')
     
-    async def cache_trend_data(self, query: str, trend_data: List[Dict]) -> bool:
+    async def cache_trend_data(self, query: str, trend_data: Any, ttl: Optional[int] = None) -> bool:
         """Cache trend intelligence data"""
         key = self._generate_cache_key('trend_data', query)
-        ttl = self.ttl_settings['trend_data']
-        return await self.set(key, trend_data, ttl)
+        ttl = ttl or self.ttl_settings['trend_data']
+        return await self.set(key, trend_data, ttl, namespace='trend_data')
     
     async def get_cached_trend_data(self, query: str) -> Optional[List[Dict]]:
         """Get cached trend data"""
         key = self._generate_cache_key('trend_data', query)
-        return await self.get(key)
+        return await self.get(key, namespace='trend_data')
     
-    async def cache_artwork_recommendations(self, user_id: str, style_preferences: str, recommendations: List[Dict]) -> bool:
+    async def cache_artwork_recommendations(self, user_id: str, style_preferences: str, recommendations: List[Dict],
+                                            ttl: Optional[int] = None) -> bool:
         """Cache artwork recommendations"""
-        key = self._generate_cache_key('artwork_recommendations', user_id, style_preferences)
-        ttl = self.ttl_settings['artwork_recommendations']
-        return await self.set(key, recommendations, ttl)
+        key = self._generate_cache_key('artwork_recommendations', style_preferences, user_id=user_id)
+        ttl = ttl or self.ttl_settings['artwork_recommendations']
+        return await self.set(key, recommendations, ttl, namespace='artwork_recommendations', user_id=user_id)
     
     async def get_cached_artwork_recommendations(self, user_id: str, style_preferences: str) -> Optional[List[Dict]]:
         """Get cached artwork recommendations"""
-        key = self._generate_cache_key('artwork_recommendations', user_id, style_preferences)
-        return await self.get(key)
+        key = self._generate_cache_key('artwork_recommendations', style_preferences, user_id=user_id)
+        return await self.get(key, namespace='artwork_recommendations')
     
     async def cache_user_preferences(self, user_id: str, preferences: Dict) -> bool:
         """Cache user preferences"""
-        key = self._generate_cache_key('user_preferences', user_id)
+        key = self._generate_cache_key('user_preferences', user_id=user_id)
         ttl = self.ttl_settings['user_preferences']
-        return await self.set(key, preferences, ttl)
+        return await self.set(key, preferences, ttl, namespace='user_preferences', user_id=user_id)
     
     async def get_cached_user_preferences(self, user_id: str) -> Optional[Dict]:
         """Get cached user preferences"""
-        key = self._generate_cache_key('user_preferences', user_id)
-        return await self.get(key)
+        key = self._generate_cache_key('user_preferences', user_id=user_id)
+        return await self.get(key, namespace='user_preferences')
     
     async def cache_style_embeddings(self, image_hash: str, embeddings: List[float]) -> bool:
         """Cache style embeddings"""
         key = self._generate_cache_key('style_embeddings', image_hash)
         ttl = self.ttl_settings['style_embeddings']
-        return await self.set(key, embeddings, ttl)
+        return await self.set(key, embeddings, ttl, namespace='style_embeddings')
     
     async def get_cached_style_embeddings(self, image_hash: str) -> Optional[List[float]]:
         """Get cached style embeddings"""
         key = self._generate_cache_key('style_embeddings', image_hash)
-        return await self.get(key)
+        return await self.get(key, namespace='style_embeddings')
     
     async def cache_color_palette(self, image_hash: str, color_palette: List[Dict]) -> bool:
         """Cache color palette analysis"""
         key = self._generate_cache_key('color_palette', image_hash)
         ttl = self.ttl_settings['color_palette']
-        return await self.set(key, color_palette, ttl)
+        return await self.set(key, color_palette, ttl, namespace='color_palette')
     
     async def get_cached_color_palette(self, image_hash: str) -> Optional[List[Dict]]:
         """Get cached color palette"""
         key = self._generate_cache_key('color_palette', image_hash)
-        return await self.get(key)
+        return await self.get(key, namespace='color_palette')
     
     async def cache_location_data(self, location: str, data: Dict) -> bool:
         """Cache location-based data"""
         key = self._generate_cache_key('location_data', location)
         ttl = self.ttl_settings['location_data']
-        return await self.set(key, data, ttl)
+        return await self.set(key, data, ttl, namespace='location_data')
     
     async def get_cached_location_data(self, location: str) -> Optional[Dict]:
         """Get cached location data"""
         key = self._generate_cache_key('location_data', location)
-        return await self.get(key)
+        return await self.get(key, namespace='location_data')
     
     async def cache_session_data(self, session_id: str, session_data: Dict) -> bool:
         """Cache session data"""
         key = self._generate_cache_key('session_data', session_id)
         ttl = self.ttl_settings['session_data']
-        return await self.set(key, session_data, ttl)
+        return await self.set(key, session_data, ttl, namespace='session_data')
     
     async def get_cached_session_data(self, session_id: str) -> Optional[Dict]:
         """Get cached session data"""
         key = self._generate_cache_key('session_data', session_id)
-        return await self.get(key)
+        return await self.get(key, namespace='session_data')
     
-    async def invalidate_user_cache(self, user_id: str) -> bool:
-        """Invalidate all cache entries for a specific user"""
+    async def invalidate_user_cache(self, user_id: str, namespaces: Optional[List[str]] = None) -> int:
+        """Invalidate cache entries written for a user, optionally limited to some namespaces.
+
+        A full invalidation bumps the user's generation and drops the user's
+        registry, since every key in it is orphaned; it reports the registry's
+        size, which can include keys that already expired. Limiting to
+        namespaces unlinks exactly those registry keys instead.
+        """
         if not self.is_connected:
-            return False
+            return 0
         
         try:
-            # Get all keys with user_id pattern
-            pattern = f"*:{user_id}*"
-            keys = await self.client.keys(pattern)
+            registry_key = self._user_registry_key(user_id)
+            
+            if namespaces is None:
+                await self.bump_generation(user_id=user_id)
+                invalidated = await self.store.scard(registry_key)
+                await self.store.unlink(registry_key)
+            else:
+                keys = [self._to_str(key) for key in await self.store.smembers(registry_key)]
+                keys = [key for key in keys if self._namespace_of(key) in namespaces]
+                invalidated = await self.delete_many(keys)
+                if keys:
+                    await self.store.srem(registry_key, *keys)
             
-            if keys:
-                await self.client.delete(*keys)
-                logger.info(f"Invalidated {len(keys)} cache entries for user {user_id}")
+            if invalidated:
+                logger.info(f"Invalidated {invalidated} cache entries for user {user_id}")
             
-            return True
+            return invalidated
         except Exception as e:
             logger.error(f"Error invalidating user cache for {user_id}: {e}")
-            return False
+            self._record_failure(e)
+            return 0
+    
+    async def prune_user_registry(self, registry_key: str) -> int:
+        """Remove registry members whose keys no longer exist; returns how many"""
+        members = [self._to_str(key) for key in await self.store.smembers(registry_key)]
+        if not members:
+            return 0
+        
+        async with self.store.pipeline(transaction=False) as pipe:
+            for key in members:
+                pipe.exists(key)
+            found = await pipe.execute()
+        gone = [key for key, exists in zip(members, found) if not exists]
+        if gone:
+            await self.store.srem(registry_key, *gone)
+        return len(gone)
+    
+    async def invalidate_namespace(self, namespace: str) -> int:
+        """Orphan every entry in a namespace (one HINCRBY); returns the new generation"""
+        return await self.bump_generation(namespace=namespace)
     
     async def get_cache_stats(self) -> Dict:
         """Get cache statistics"""
         if not self.is_connected:
-            return {"status": "disconnected"}
+            return {
+                "status": "bypassed" if self.breaker.is_open else "disconnected",
+                "circuit_breaker": self.breaker.get_stats()
+            }
         
         try:
             info = await self.client.info()
-            return {
+            stats = {
                 "status": "connected",
+                "l1": self._tier_stats('l1', entries=len(self.l1)),
+                "l2": self._tier_stats('l2'),
+                "stale_served": self.metrics['stale_served'],
+                "background_refreshes": self.metrics['background_refreshes'],
+                "early_recomputes": self.metrics['early_recomputes'],
+                "codecs": {namespace: codec.get_stats() for namespace, codec in self.codecs.items()},
+                "circuit_breaker": self.breaker.get_stats(),
+                "generations_tracked": len(self.generations),
+                "namespaces": await self.namespace_metrics.get_stats(self.client),
                 "used_memory": info.get("used_memory_human", "N/A"),
                 "connected_clients": info.get("connected_clients", 0),
                 "total_commands_processed": info.get("total_commands_processed", 0),
@@ -273,10 +1536,26 @@ class RedisCache:
                 "keyspace_misses": info.get("keyspace_misses", 0),
                 "hit_rate": self._calculate_hit_rate(info)
             }
+            if self.is_sharded:
+                # Server stats above are the control node's
+                stats["sharding"] = await self.store.get_stats()
+            return stats
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
             return {"status": "error", "error": str(e)}
     
+    def _tier_stats(self, tier: str, **extra) -> Dict:
+        """Hit/miss counters and hit rate for one cache tier"""
+        hits = self.metrics[f'{tier}_hits']
+        misses = self.metrics[f'{tier}_misses']
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round((hits / total) * 100, 2) if total else 0.0,
+            **extra
+        }
+    
     def _calculate_hit_rate(self, info: Dict) -> float:
         """Calculate cache hit rate"""
         hits = info.get("keyspace_hits", 0)
@@ -288,29 +1567,75 @@ class RedisCache:
         
         return round((hits / total) * 100, 2)
 
+def stable_digest(*values) -> str:
+    """Digest of canonicalized values that is identical across processes and restarts.
+
+    Unlike hash(), which is salted per process, equal arguments always give
+    the same digest; dicts are key-order independent.
+    """
+    payload = json.dumps(values, sort_keys=True, separators=(',', ':'), default=_canonical_default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _canonical_default(value: Any) -> Any:
+    """JSON form for argument types json cannot encode; refuses anything without a stable form"""
+    if isinstance(value, (set, frozenset)):
+        return sorted(json.dumps(item, sort_keys=True, default=_canonical_default) for item in value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):
+        # numpy arrays and scalars
+        return value.tolist()
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    if hasattr(value, 'dict') and callable(value.dict):
+        return value.dict()
+    # repr() of arbitrary objects embeds memory addresses, which would never match
+    raise TypeError(f"cannot build a stable cache key from {type(value).__name__}")
+
 # Cache decorator for easy function caching
-def cache_result(cache_type: str, ttl: Optional[int] = None):
-    """Decorator to cache function results"""
+def cache_result(cache_type: str, ttl: Optional[int] = None, version: str = "1"):
+    """Decorator to cache function results under keys shared by every worker.
+
+    The key is a stable digest of the arguments bound to their parameter names
+    (defaults applied, self/cls ignored), so f(x, k=5) and f(x, 5) share an
+    entry. ttl defaults to the namespace TTL; bump version when the function's
+    output changes. Sync functions run in a thread pool, so the decorated
+    function is always awaited. Concurrent misses share one computation.
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+        first_param = next(iter(signature.parameters), None)
+        skip_param = first_param if first_param in ('self', 'cls') else None
+        is_async = asyncio.iscoroutinefunction(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+        
+        def cache_key(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {param: value for param, value in bound.arguments.items() if param != skip_param}
+            return redis_cache.make_key(cache_type, name, version, stable_digest(arguments))
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            cache_key = f"{cache_type}:{func.__name__}:{hash(str(args) + str(kwargs))}"
+            async def compute():
+                if is_async:
+                    return await func(*args, **kwargs)
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, partial(func, *args, **kwargs))
             
-            # Try to get from cache
-            cached_result = await redis_cache.get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for {func.__name__}")
-                return cached_result
+            try:
+                cache_key_value = cache_key(*args, **kwargs)
+            except TypeError as e:
+                logger.warning(f"Not caching {name}: {e}")
+                return await compute()
             
-            # Execute function and cache result
-            logger.debug(f"Cache miss for {func.__name__}")
-            result = await func(*args, **kwargs)
-            
-            # Cache the result
-            await redis_cache.set(cache_key, result, ttl)
-            return result
+            return await redis_cache.get_or_set(
+                cache_key_value, compute, ttl or redis_cache.ttl_settings.get(cache_type),
+                namespace=cache_type
+            )
         
+        wrapper.cache_key = cache_key
+        wrapper.uncached = func
         return wrapper
     return decorator
 
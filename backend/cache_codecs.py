@@ -0,0 +1,176 @@
+import json
+import logging
+import time
+import zlib
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Optional faster serializers/compressors; fall back to the stdlib when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Header byte layout: 1ccc ssss
+#   high bit set   -> value carries a header (legacy plain JSON never starts with a byte >= 0x80)
+#   ccc            -> compression id
+#   ssss           -> serializer id
+HEADER_FLAG = 0x80
+
+SERIALIZERS = {'json': 0, 'orjson': 1, 'msgpack': 2}
+COMPRESSIONS = {'none': 0, 'zlib': 1, 'lz4': 2}
+
+_SERIALIZER_NAMES = {v: k for k, v in SERIALIZERS.items()}
+_COMPRESSION_NAMES = {v: k for k, v in COMPRESSIONS.items()}
+
+class CacheCodec:
+    """Serializer plus optional compression for one cache namespace.
+    
+    Every encoded value starts with a header byte naming its serializer and
+    compression, so any codec can decode data written by any other (and
+    headerless values written before codecs existed are read as JSON).
+    """
+    
+    def __init__(self, serializer: str = 'json', compression: str = 'zlib', compress_threshold: int = 4096):
+        self.serializer = self._available_serializer(serializer)
+        self.compression = self._available_compression(compression)
+        self.compress_threshold = compress_threshold
+        
+        self.stats = {
+            'encoded_count': 0,
+            'decoded_count': 0,
+            'raw_bytes': 0,
+            'encoded_bytes': 0,
+            'compressed_count': 0,
+            'encode_seconds': 0.0,
+            'decode_seconds': 0.0,
+        }
+    
+    @staticmethod
+    def _available_serializer(name: str) -> str:
+        """Fall back to stdlib JSON when the requested serializer is not installed"""
+        if name == 'orjson' and orjson is None:
+            logger.warning("orjson not available, using json cache codec")
+            return 'json'
+        if name == 'msgpack' and msgpack is None:
+            logger.warning("msgpack not available, using json cache codec")
+            return 'json'
+        if name not in SERIALIZERS:
+            raise ValueError(f"Unknown cache serializer: {name}")
+        return name
+    
+    @staticmethod
+    def _available_compression(name: str) -> str:
+        """Fall back to zlib when lz4 is not installed"""
+        if name == 'lz4' and lz4_frame is None:
+            logger.warning("lz4 not available, using zlib cache compression")
+            return 'zlib'
+        if name not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache compression: {name}")
+        return name
+    
+    def encode(self, value: Any) -> bytes:
+        """Serialize and, above the size threshold, compress a value"""
+        started = time.perf_counter()
+        
+        payload = _serialize(self.serializer, value)
+        raw_size = len(payload)
+        compression = 'none'
+        if self.compression != 'none' and raw_size >= self.compress_threshold:
+            compressed = _compress(self.compression, payload)
+            # Keep the raw payload when compression does not pay for itself
+            if len(compressed) < raw_size:
+                payload = compressed
+                compression = self.compression
+        
+        header = HEADER_FLAG | (COMPRESSIONS[compression] << 4) | SERIALIZERS[self.serializer]
+        encoded = bytes([header]) + payload
+        
+        self.stats['encode_seconds'] += time.perf_counter() - started
+        self.stats['encoded_count'] += 1
+        self.stats['raw_bytes'] += raw_size
+        self.stats['encoded_bytes'] += len(encoded)
+        if compression != 'none':
+            self.stats['compressed_count'] += 1
+        return encoded
+    
+    def decode(self, raw: Any) -> Any:
+        """Decode a value written by any codec, or a legacy plain-JSON value"""
+        started = time.perf_counter()
+        try:
+            if isinstance(raw, str):
+                raw = raw.encode()
+            
+            if not raw or raw[0] < HEADER_FLAG:
+                return json.loads(raw)
+            
+            header = raw[0]
+            compression = _COMPRESSION_NAMES[(header >> 4) & 0x07]
+            serializer = _SERIALIZER_NAMES[header & 0x0F]
+            payload = _decompress(compression, raw[1:])
+            return _deserialize(serializer, payload)
+        finally:
+            self.stats['decode_seconds'] += time.perf_counter() - started
+            self.stats['decoded_count'] += 1
+    
+    def get_stats(self) -> Dict:
+        """Codec settings, encoded sizes and CPU time"""
+        encoded_count = self.stats['encoded_count']
+        decoded_count = self.stats['decoded_count']
+        raw_bytes = self.stats['raw_bytes']
+        return {
+            "serializer": self.serializer,
+            "compression": self.compression,
+            "compress_threshold": self.compress_threshold,
+            **self.stats,
+            "avg_encoded_bytes": round(self.stats['encoded_bytes'] / encoded_count, 1) if encoded_count else 0,
+            "compression_ratio": round(self.stats['encoded_bytes'] / raw_bytes, 3) if raw_bytes else 1.0,
+            "avg_encode_ms": round(self.stats['encode_seconds'] * 1000 / encoded_count, 3) if encoded_count else 0,
+            "avg_decode_ms": round(self.stats['decode_seconds'] * 1000 / decoded_count, 3) if decoded_count else 0,
+        }
+
+def _serialize(serializer: str, value: Any) -> bytes:
+    """Serialize a value with the named serializer"""
+    if serializer == 'orjson':
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    if serializer == 'msgpack':
+        return msgpack.packb(value, default=str, use_bin_type=True)
+    return json.dumps(value, default=str).encode()
+
+def _deserialize(serializer: str, payload: bytes) -> Any:
+    """Deserialize a payload with the named serializer"""
+    if serializer == 'orjson':
+        # orjson output is plain JSON, so the stdlib can read it if orjson is missing here
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
+    if serializer == 'msgpack':
+        if msgpack is None:
+            raise RuntimeError("msgpack-encoded cache value but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+def _compress(compression: str, payload: bytes) -> bytes:
+    """Compress a serialized payload"""
+    if compression == 'lz4':
+        return lz4_frame.compress(payload)
+    return zlib.compress(payload, 6)
+
+def _decompress(compression: str, payload: bytes) -> bytes:
+    """Undo _compress for the named compression"""
+    if compression == 'lz4':
+        if lz4_frame is None:
+            raise RuntimeError("lz4-compressed cache value but lz4 is not installed")
+        return lz4_frame.decompress(payload)
+    if compression == 'zlib':
+        return zlib.decompress(payload)
+    return payload
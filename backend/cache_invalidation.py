@@ -1,7 +1,8 @@
 import logging
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta
 from cache import redis_cache
+from cache_warmup import cache_warmup
+from cache_memory import cache_memory_sampler
 
 logger = logging.getLogger(__name__)
 
@@ -22,18 +23,16 @@ class CacheInvalidationService:
         try:
             logger.info(f"Invalidating cache for user {user_id}")
             
-            if cache_types is None:
-                cache_types = list(self.invalidation_patterns.keys())
+            namespaces = None
+            if cache_types is not None:
+                namespaces = [
+                    pattern.split(":", 1)[0]
+                    for cache_type in cache_types
+                    for pattern in self.invalidation_patterns.get(cache_type, [])
+                ]
             
-            invalidated_count = 0
-            
-            for cache_type in cache_types:
-                patterns = self.invalidation_patterns.get(cache_type, [])
-                for pattern in patterns:
-                    # Add user_id to pattern
-                    user_pattern = pattern.replace("*", f"*{user_id}*")
-                    count = await self._invalidate_by_pattern(user_pattern)
-                    invalidated_count += count
+            # Uses the user's key registry rather than scanning the keyspace
+            invalidated_count = await redis_cache.invalidate_user_cache(user_id, namespaces)
             
             logger.info(f"Invalidated {invalidated_count} cache entries for user {user_id}")
             return invalidated_count
@@ -42,27 +41,27 @@ class CacheInvalidationService:
             logger.error(f"Error invalidating user cache: {e}")
             return 0
     
+    async def invalidate_cache_type(self, cache_type: str) -> List[str]:
+        """Orphan every entry of a cache type by bumping its namespace generations"""
+        try:
+            namespaces = [pattern.split(":", 1)[0] for pattern in self.invalidation_patterns.get(cache_type, [])]
+            for namespace in namespaces:
+                await redis_cache.invalidate_namespace(namespace)
+            
+            logger.info(f"Invalidated cache type {cache_type} ({', '.join(namespaces)})")
+            return namespaces
+            
+        except Exception as e:
+            logger.error(f"Error invalidating cache type {cache_type}: {e}")
+            return []
+    
     async def invalidate_stale_trends(self, max_age_hours: int = 6):
-        """Invalidate trend data older than specified hours"""
+        """Invalidate trend data written more than max_age_hours ago"""
         try:
             logger.info(f"Invalidating trend data older than {max_age_hours} hours")
             
-            # Get all trend data keys
-            trend_keys = await self._get_keys_by_pattern("trend_data:*")
-            invalidated_count = 0
-            
-            for key in trend_keys:
-                trend_data = await redis_cache.get(key)
-                if trend_data and "timestamp" in trend_data:
-                    try:
-                        timestamp = datetime.fromisoformat(trend_data["timestamp"])
-                        if datetime.now() - timestamp > timedelta(hours=max_age_hours):
-                            await redis_cache.client.delete(key)
-                            invalidated_count += 1
-                    except (ValueError, TypeError):
-                        # Invalid timestamp format, delete the key
-                        await redis_cache.client.delete(key)
-                        invalidated_count += 1
+            # Trend writes are indexed by write time, so no keyspace scan is needed
+            invalidated_count = await redis_cache.delete_older_than("trend_data", max_age_hours * 3600)
             
             logger.info(f"Invalidated {invalidated_count} stale trend entries")
             return invalidated_count
@@ -77,16 +76,12 @@ class CacheInvalidationService:
             logger.info(f"Invalidating room analysis cache for image {image_hash}")
             
             keys_to_invalidate = [
-                f"room_analysis:{user_id}:{image_hash}",
-                f"style_embeddings:{image_hash}",
-                f"color_palette:{image_hash}"
+                redis_cache.make_key("room_analysis", image_hash, user_id=user_id),
+                redis_cache.make_key("style_embeddings", image_hash),
+                redis_cache.make_key("color_palette", image_hash)
             ]
             
-            invalidated_count = 0
-            for key in keys_to_invalidate:
-                if await redis_cache.client.exists(key):
-                    await redis_cache.client.delete(key)
-                    invalidated_count += 1
+            invalidated_count = await redis_cache.delete_many(keys_to_invalidate)
             
             logger.info(f"Invalidated {invalidated_count} room analysis cache entries")
             return invalidated_count
@@ -102,15 +97,14 @@ class CacheInvalidationService:
             
             if style_preference:
                 # Invalidate specific style preference
-                key = f"artwork_recommendations:{user_id}:{style_preference}"
-                if await redis_cache.client.exists(key):
-                    await redis_cache.client.delete(key)
+                key = redis_cache.make_key("artwork_recommendations", style_preference, user_id=user_id)
+                count = await redis_cache.delete_many([key])
+                if count:
                     logger.info(f"Invalidated specific recommendation cache: {key}")
-                    return 1
+                return count
             else:
                 # Invalidate all recommendations for user
-                pattern = f"artwork_recommendations:{user_id}:*"
-                count = await self._invalidate_by_pattern(pattern)
+                count = await redis_cache.invalidate_user_cache(user_id, ["artwork_recommendations"])
                 logger.info(f"Invalidated {count} recommendation cache entries")
                 return count
             
@@ -119,23 +113,16 @@ class CacheInvalidationService:
             return 0
     
     async def warm_up_cache(self, user_id: str, common_styles: List[str] = None):
-        """Pre-populate cache with common data"""
+        """Pre-populate cache with trend data for common styles"""
         try:
             logger.info(f"Warming up cache for user {user_id}")
             
-            if common_styles is None:
-                common_styles = ["modern", "traditional", "scandinavian", "contemporary"]
-            
-            warmed_count = 0
-            
-            # Pre-populate trend data for common styles
-            for style in common_styles:
-                trend_key = f"trends_{style}_interior_design_trends_2024_5"
-                cached_trends = await redis_cache.get_cached_trend_data(trend_key)
-                if not cached_trends:
-                    # This would trigger trend fetching in background
-                    logger.info(f"Pre-warming trend cache for style: {style}")
-                    warmed_count += 1
+            # Runs a warmup pass limited to these styles (defaults when None)
+            progress = await cache_warmup.run(
+                trigger=f"user:{user_id}",
+                values={"style": common_styles or []}
+            )
+            warmed_count = progress.get("warmed", 0)
             
             logger.info(f"Warmed up {warmed_count} cache entries")
             return warmed_count
@@ -154,51 +141,40 @@ class CacheInvalidationService:
                 "hit_rate": 0
             }
             
-            # Get total keys
-            all_keys = await self._get_keys_by_pattern("*")
-            stats["total_keys"] = len(all_keys)
+            # Get total keys (DBSIZE is O(1), unlike listing every key)
+            if redis_cache.is_connected:
+                stats["total_keys"] = await redis_cache.store.dbsize()
+            
+            # Count by type from the key counters maintained on write and delete; never scan keys here
+            if redis_cache.is_connected:
+                inventory = await redis_cache.inventory.get_counts(redis_cache.client)
+                for cache_type, patterns in self.invalidation_patterns.items():
+                    namespaces = [pattern.split(":", 1)[0] for pattern in patterns]
+                    stats["by_type"][cache_type] = sum(
+                        inventory["counts"].get(namespace, 0) for namespace in namespaces
+                    )
+                stats["keys_by_namespace"] = inventory
             
-            # Count by type
-            for cache_type, patterns in self.invalidation_patterns.items():
-                count = 0
-                for pattern in patterns:
-                    keys = await self._get_keys_by_pattern(pattern)
-                    count += len(keys)
-                stats["by_type"][cache_type] = count
+            stats["memory_by_namespace"] = await cache_memory_sampler.get_latest()
             
             # Get memory usage (if Redis supports it)
             try:
-                info = await redis_cache.client.info("memory")
-                stats["memory_usage"] = info.get("used_memory", 0)
+                if redis_cache.is_connected:
+                    info = await redis_cache.client.info("memory")
+                    stats["memory_usage"] = info.get("used_memory", 0)
             except:
                 stats["memory_usage"] = 0
             
+            # Hit rates and latencies per namespace and operation, across all workers
+            stats["namespaces"] = await redis_cache.namespace_metrics.get_stats(
+                redis_cache.client if redis_cache.is_connected else None
+            )
+            
             return stats
             
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
             return {}
-    
-    async def _invalidate_by_pattern(self, pattern: str) -> int:
-        """Invalidate all keys matching a pattern"""
-        try:
-            keys = await self._get_keys_by_pattern(pattern)
-            if keys:
-                await redis_cache.client.delete(*keys)
-            return len(keys)
-        except Exception as e:
-            logger.error(f"Error invalidating pattern {pattern}: {e}")
-            return 0
-    
-    async def _get_keys_by_pattern(self, pattern: str) -> List[str]:
-        """Get all keys matching a pattern"""
-        try:
-            if redis_cache.client:
-                return await redis_cache.client.keys(pattern)
-            return []
-        except Exception as e:
-            logger.error(f"Error getting keys for pattern {pattern}: {e}")
-            return []
 
 # Global instance
 cache_invalidation = CacheInvalidationService()
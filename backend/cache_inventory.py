@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def _to_str(value):
+    """Redis replies as text"""
+    return value.decode() if isinstance(value, bytes) else value
+
+class CacheInventory:
+    """Per-namespace key counts kept current without scanning on the request path.
+    
+    Writes and deletes record deltas that each worker flushes to one Redis
+    hash. Keyspace notifications, when enabled, subtract expired keys; a
+    periodic, budgeted SCAN on one worker resets the counts to the truth and
+    prunes the user registries it passes. Without notifications the counts
+    are approximate.
+    """
+    
+    def __init__(self, namespaces: Iterable[str]):
+        self.namespaces = set(namespaces)
+        self.redis_key = "cache:key_counts"
+        self.meta_key = "cache:key_counts:meta"
+        self.flush_interval = float(os.getenv('CACHE_INVENTORY_FLUSH_SECONDS', 5))
+        self.reconcile_interval = int(os.getenv('CACHE_INVENTORY_RECONCILE_SECONDS', 900))
+        self.scan_count = int(os.getenv('CACHE_INVENTORY_SCAN_COUNT', 1000))
+        # Each reconcile step scans for at most this long; the cursor and partial
+        # counts are kept in Redis so the next step, on any worker, resumes there
+        self.scan_time_budget = float(os.getenv('CACHE_INVENTORY_SCAN_TIME_BUDGET_SECONDS', 2.0))
+        self.scan_state_key = "cache:key_counts:scan"
+        # Subtract expirations using keyspace notifications, which are switched on
+        # ("Exe") on every node holding entries where CONFIG SET is allowed
+        keyspace_events = os.getenv('CACHE_INVENTORY_KEYSPACE_EVENTS', 'false')
+        self.keyspace_events = keyspace_events.lower() == 'true'
+        self.expirations_counted = False
+        self.listener_lease_ms = 30000
+        # Namespace of the per-user key registries (RedisCache._user_registry_key)
+        self.registry_namespace = "user_keys"
+        
+        self._pending: Dict[str, int] = defaultdict(int)
+    
+    def record(self, namespace: str, delta: int):
+        """Count keys created (positive) or removed (negative); other namespaces are ignored"""
+        if namespace in self.namespaces:
+            self._pending[namespace] += delta
+    
+    async def flush(self, client):
+        """Add this worker's pending deltas to the shared counts in one pipeline"""
+        pending = {namespace: delta for namespace, delta in self._pending.items() if delta}
+        self._pending = defaultdict(int)
+        if not pending:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for namespace, delta in pending.items():
+                    pipe.hincrby(self.redis_key, namespace, delta)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error flushing cache key counts: {e}")
+            for namespace, delta in pending.items():
+                self._pending[namespace] += delta
+    
+    async def get_counts(self, client) -> Dict:
+        """Key count per namespace, read from the counters (one HGETALL each, no scan)"""
+        await self.flush(client)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self.redis_key)
+            pipe.hgetall(self.meta_key)
+            raw_counts, raw_meta = await pipe.execute()
+        
+        counts = dict.fromkeys(sorted(self.namespaces), 0)
+        for field, value in raw_counts.items():
+            field = _to_str(field)
+            # Deltas racing a reconciliation can briefly push a count below zero
+            counts[field] = max(0, int(value))
+        meta = {_to_str(field): _to_str(value) for field, value in raw_meta.items()}
+        return {
+            "counts": counts,
+            "total": sum(counts.values()),
+            "reconciled_at": meta.get("reconciled_at"),
+            "keyspace_events": self.keyspace_events,
+            # Keys that expired since reconciled_at are still counted
+            "approximate": not self.expirations_counted,
+        }
+    
+    async def reconcile(self, store, client,
+                        prune_registry: Optional[Callable[[str], Awaitable[int]]] = None
+                        ) -> Optional[Dict[str, int]]:
+        """Advance the SCAN that recounts every key, for at most the scan time budget.
+        
+        Returns the counts once the walk completes and the counters are
+        replaced with them, or None while it is still in progress.
+        prune_registry, if given, is awaited with each user registry found.
+        """
+        started = time.monotonic()
+        deadline = started + self.scan_time_budget
+        state = await self._load_scan_state(client)
+        counts, cursor = state["counts"], state["cursor"]
+        while True:
+            cursor, batch = await store.scan(cursor=cursor, count=self.scan_count)
+            registries = []
+            for key in batch:
+                key = _to_str(key)
+                namespace = key.split(':', 1)[0]
+                if namespace in counts:
+                    counts[namespace] += 1
+                elif namespace == self.registry_namespace:
+                    registries.append(key)
+            state["scanned"] += len(batch)
+            if prune_registry:
+                for registry_key in registries:
+                    state["pruned"] += await prune_registry(registry_key)
+            if cursor == 0 or time.monotonic() >= deadline:
+                break
+        state["duration_ms"] += (time.monotonic() - started) * 1000
+        
+        if cursor != 0:
+            await self._save_scan_state(client, cursor, state)
+            return None
+        
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.scan_state_key)
+            pipe.delete(self.redis_key)
+            pipe.hset(self.redis_key, mapping=counts)
+            pipe.hset(self.meta_key, mapping={
+                "reconciled_at": datetime.now().isoformat(),
+                "scanned_keys": state["scanned"],
+                "pruned_registry_members": state["pruned"],
+                "duration_ms": round(state["duration_ms"], 1),
+            })
+            await pipe.execute()
+        logger.info(
+            f"Reconciled cache key counts from {state['scanned']} keys: {counts}; "
+            f"pruned {state['pruned']} registry members"
+        )
+        return counts
+    
+    async def _load_scan_state(self, client) -> Dict:
+        """Cursor and partial counts of the walk in progress, or a fresh walk"""
+        raw = await client.hgetall(self.scan_state_key)
+        fields = {_to_str(field): _to_str(value) for field, value in raw.items()}
+        return {
+            "cursor": int(fields.get("cursor", 0)),
+            "scanned": int(fields.get("scanned", 0)),
+            "pruned": int(fields.get("pruned", 0)),
+            "duration_ms": float(fields.get("duration_ms", 0)),
+            "counts": {
+                namespace: int(fields.get(f"count:{namespace}", 0)) for namespace in self.namespaces
+            },
+        }
+    
+    async def _save_scan_state(self, client, cursor: int, state: Dict):
+        """Store where the walk stopped; an abandoned walk expires and starts over"""
+        mapping = {
+            "cursor": cursor,
+            "scanned": state["scanned"],
+            "pruned": state["pruned"],
+            "duration_ms": state["duration_ms"],
+            **{f"count:{namespace}": count for namespace, count in state["counts"].items()},
+        }
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.scan_state_key, mapping=mapping)
+            pipe.expire(self.scan_state_key, self.reconcile_interval * 2)
+            await pipe.execute()
+    
+    async def enable_keyspace_events(self, cache) -> bool:
+        """Switch on expired/evicted notifications on every node holding entries, best-effort"""
+        try:
+            for client in self._nodes(cache):
+                config = await client.config_get("notify-keyspace-events")
+                flags = next(iter(config.values()), "") if config else ""
+                flags = _to_str(flags)
+                # "A" already includes the expired and evicted classes
+                missing = "".join(
+                    flag for flag in "Exe"
+                    if flag not in flags and not (flag != "E" and "A" in flags)
+                )
+                if missing:
+                    await client.config_set("notify-keyspace-events", flags + missing)
+            return True
+        except Exception as e:
+            logger.warning(
+                f"Could not enable keyspace notifications, key counts will be approximate: {e}"
+            )
+            return False
+    
+    @staticmethod
+    def _nodes(cache) -> List:
+        """Clients of every node holding entries"""
+        return list(cache.store.clients.values()) if cache.is_sharded else [cache.store]
+    
+    async def run(self, cache):
+        """Flush deltas every flush interval and reconcile on one worker every reconcile interval"""
+        listener = None
+        if self.keyspace_events and cache.is_connected:
+            self.expirations_counted = await self.enable_keyspace_events(cache)
+            if self.expirations_counted:
+                listener = asyncio.create_task(self._count_expirations(cache))
+        next_reconcile = time.monotonic() + self.flush_interval
+        # Held while this worker's walk spans several steps
+        token = None
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                if not cache.is_connected:
+                    continue
+                await self.flush(cache.client)
+                
+                if token or time.monotonic() >= next_reconcile:
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+                    token = await self._reconcile_step(cache, token)
+        finally:
+            if listener:
+                listener.cancel()
+    
+    async def _reconcile_step(self, cache, token: Optional[str]) -> Optional[str]:
+        """Run one reconcile step under the lease; returns the token while the walk continues.
+        
+        The lease is left to expire once the walk ends, so no other worker
+        reconciles this interval.
+        """
+        lease_ms = self.reconcile_interval * 1000
+        if token is None:
+            token = await cache.acquire_lock("cache_inventory_reconcile", lease_ms)
+        elif not await cache.extend_lock("cache_inventory_reconcile", token, lease_ms):
+            return None
+        if token is None:
+            return None
+        
+        try:
+            if await self.reconcile(cache.store, cache.client, cache.prune_user_registry) is None:
+                return token
+        except Exception as e:
+            logger.error(f"Error reconciling cache key counts: {e}")
+            cache._record_failure(e)
+        return None
+    
+    async def _count_expirations(self, cache):
+        """On one worker at a time, subtract keys Redis expired or evicted"""
+        while True:
+            token = None
+            try:
+                if cache.is_connected:
+                    token = await cache.acquire_lock(
+                        "cache_inventory_expirations", self.listener_lease_ms
+                    )
+                if token:
+                    await self._listen(cache, token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Keyspace notification listener stopped: {e}")
+            finally:
+                if token:
+                    await cache.release_lock("cache_inventory_expirations", token)
+            await asyncio.sleep(self.listener_lease_ms / 2000)
+    
+    async def _listen(self, cache, token: str):
+        """Consume expired/evicted events from every node holding entries while the lease lasts"""
+        pubsubs = [client.pubsub() for client in self._nodes(cache)]
+        try:
+            for pubsub in pubsubs:
+                await pubsub.psubscribe("__keyevent@*__:expired", "__keyevent@*__:evicted")
+            renew_at = time.monotonic() + self.listener_lease_ms / 3000
+            while True:
+                if time.monotonic() >= renew_at:
+                    lease_ms = self.listener_lease_ms
+                    if not await cache.extend_lock("cache_inventory_expirations", token, lease_ms):
+                        return
+                    renew_at = time.monotonic() + self.listener_lease_ms / 3000
+                received = False
+                for pubsub in pubsubs:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.1)
+                    if message and message.get("type") == "pmessage":
+                        key = _to_str(message["data"])
+                        self.record(key.split(':', 1)[0], -1)
+                        received = True
+                if not received:
+                    await asyncio.sleep(0.1)
+        finally:
+            for pubsub in pubsubs:
+                await pubsub.aclose()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+class CacheMemorySampler:
+    """Estimates Redis memory per cache namespace from a bounded random sample.
+    
+    A background task walks a limited slice of the keyspace with SCAN from a
+    random cursor, measures up to sample_size keys per namespace with
+    MEMORY USAGE, and extrapolates key counts and bytes using DBSIZE. The
+    request path only ever reads the last published sample.
+    """
+    
+    def __init__(self):
+        self.interval = int(os.getenv('CACHE_MEMORY_SAMPLE_INTERVAL_SECONDS', 300))
+        # Keys measured per namespace, and keys examined per pass across all namespaces
+        self.sample_size = int(os.getenv('CACHE_MEMORY_SAMPLE_PER_NAMESPACE', 50))
+        self.scan_budget = int(os.getenv('CACHE_MEMORY_SCAN_BUDGET', 10000))
+        self.scan_count = int(os.getenv('CACHE_MEMORY_SCAN_COUNT', 500))
+        self.sample_key = "cache:memory_sample"
+        self._task = None
+        self.latest: Optional[Dict] = None
+    
+    def start(self):
+        """Start sampling every interval"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+    
+    async def stop(self):
+        """Stop the sampling task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run_periodically(self):
+        """Take a sample every interval, on one worker at a time"""
+        while True:
+            try:
+                if redis_cache.is_connected:
+                    # The lock is left to expire so no other worker samples this interval
+                    token = await redis_cache.acquire_lock("cache_memory_sampler", self.interval * 1000)
+                    if token:
+                        await self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling cache memory: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def sample(self) -> Dict:
+        """Take one sample and publish the per-namespace estimates"""
+        started = time.monotonic()
+        # Entries may be spread over shards; the sample itself is kept on the control node
+        client = redis_cache.store
+        total_keys = await client.dbsize()
+        
+        examined = 0
+        examined_by_namespace = defaultdict(int)
+        sampled: Dict[str, List[str]] = defaultdict(list)
+        
+        # Any cursor is valid for SCAN; a random start spreads samples across runs.
+        # Small keyspaces are walked from the start so the counts are exact.
+        cursor = 0 if total_keys <= self.scan_budget else random.getrandbits(32)
+        while examined < self.scan_budget:
+            cursor, batch = await client.scan(cursor=cursor, count=self.scan_count)
+            for raw_key in batch:
+                key = redis_cache._to_str(raw_key)
+                namespace = redis_cache._namespace_of(key) or "other"
+                examined += 1
+                examined_by_namespace[namespace] += 1
+                if len(sampled[namespace]) < self.sample_size:
+                    sampled[namespace].append(key)
+            if cursor == 0:
+                break
+        
+        sizes = await self._memory_usage(sampled)
+        
+        namespaces = {}
+        for namespace, count in examined_by_namespace.items():
+            namespace_sizes = sorted(sizes.get(namespace, []))
+            # The examined slice is a random subset of the keyspace, so each
+            # namespace's share of it estimates its share of DBSIZE
+            estimated_keys = round(total_keys * count / examined) if examined else 0
+            avg_bytes = sum(namespace_sizes) / len(namespace_sizes) if namespace_sizes else 0
+            namespaces[namespace] = {
+                "estimated_keys": estimated_keys,
+                "estimated_bytes": round(avg_bytes * estimated_keys),
+                "sampled_keys": len(namespace_sizes),
+                "avg_bytes": round(avg_bytes, 1),
+                "p50_bytes": self._percentile(namespace_sizes, 0.5),
+                "p90_bytes": self._percentile(namespace_sizes, 0.9),
+                "p99_bytes": self._percentile(namespace_sizes, 0.99),
+                "max_bytes": namespace_sizes[-1] if namespace_sizes else 0,
+            }
+        
+        self.latest = {
+            "sampled_at": datetime.now().isoformat(),
+            "total_keys": total_keys,
+            "examined_keys": examined,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "namespaces": namespaces,
+        }
+        await redis_cache.client.set(self.sample_key, json.dumps(self.latest), ex=self.interval * 3)
+        logger.info(f"Sampled cache memory: {examined} of {total_keys} keys examined")
+        return self.latest
+    
+    async def _memory_usage(self, sampled: Dict[str, List[str]]) -> Dict[str, List[int]]:
+        """MEMORY USAGE of every sampled key, in one pipeline"""
+        pipe = redis_cache.store.pipeline(transaction=False)
+        ordered = [(namespace, key) for namespace, keys in sampled.items() for key in keys]
+        for _, key in ordered:
+            pipe.memory_usage(key)
+        results = await pipe.execute(raise_on_error=False)
+        
+        # Some managed Redis services disable MEMORY; fall back to the value length
+        if ordered and all(isinstance(result, Exception) for result in results):
+            logger.warning("MEMORY USAGE unavailable, sampling value lengths instead")
+            pipe = redis_cache.store.pipeline(transaction=False)
+            for _, key in ordered:
+                pipe.strlen(key)
+            results = await pipe.execute(raise_on_error=False)
+        
+        sizes: Dict[str, List[int]] = defaultdict(list)
+        for (namespace, _), size in zip(ordered, results):
+            # Keys may expire between SCAN and MEMORY USAGE
+            if isinstance(size, int) and size:
+                sizes[namespace].append(size)
+        return sizes
+    
+    @staticmethod
+    def _percentile(sorted_values: List[int], quantile: float) -> int:
+        """Nearest-rank percentile of an already sorted list"""
+        if not sorted_values:
+            return 0
+        index = min(len(sorted_values) - 1, max(0, int(round(quantile * len(sorted_values))) - 1))
+        return sorted_values[index]
+    
+    async def get_latest(self) -> Optional[Dict]:
+        """Last published sample from any worker, without touching the keyspace"""
+        if redis_cache.is_connected:
+            try:
+                raw = await redis_cache.client.get(self.sample_key)
+                if raw:
+                    return json.loads(raw)
+            except Exception as e:
+                logger.error(f"Error reading cache memory sample: {e}")
+        return self.latest
+
+# Global memory sampler instance
+cache_memory_sampler = CacheMemorySampler()
@@ -0,0 +1,184 @@
+import bisect
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency bucket upper bounds in seconds (Prometheus "le" labels); +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class CacheMetrics:
+    """Per-namespace, per-operation cache counters and latency histograms.
+    
+    Each worker counts in-process and periodically adds its increments to one
+    Redis hash, so reading that hash gives totals across all workers.
+    """
+    
+    def __init__(self):
+        self.redis_key = "cache:metrics"
+        self.flush_interval = float(os.getenv('CACHE_METRICS_FLUSH_SECONDS', 10))
+        
+        # (namespace, operation, result) -> count
+        self.counters: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        # (namespace, operation) -> [per-bucket counts..., +Inf count], sum of seconds
+        self.histograms: Dict[Tuple[str, str], List[int]] = {}
+        self.latency_sums: Dict[Tuple[str, str], float] = defaultdict(float)
+        
+        # Increments not yet added to Redis
+        self._pending_counters: Dict[str, int] = defaultdict(int)
+        self._pending_sums: Dict[str, float] = defaultdict(float)
+    
+    def count(self, namespace: str, operation: str, result: str, amount: int = 1):
+        """Count operation results, e.g. hits and misses of get in trend_data"""
+        namespace = namespace or "other"
+        self.counters[(namespace, operation, result)] += amount
+        self._pending_counters[f"c|{namespace}|{operation}|{result}"] += amount
+    
+    def observe(self, namespace: str, operation: str, seconds: float):
+        """Record the latency of one Redis round trip"""
+        namespace = namespace or "other"
+        series = (namespace, operation)
+        buckets = self.histograms.get(series)
+        if buckets is None:
+            buckets = self.histograms[series] = [0] * (len(LATENCY_BUCKETS) + 1)
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        buckets[index] += 1
+        self.latency_sums[series] += seconds
+        
+        bound = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else "+Inf"
+        self._pending_counters[f"h|{namespace}|{operation}|{bound}"] += 1
+        self._pending_sums[f"s|{namespace}|{operation}"] += seconds
+    
+    async def flush(self, client):
+        """Add this worker's pending increments to the shared hash in one pipeline"""
+        if not self._pending_counters and not self._pending_sums:
+            return
+        
+        counters, self._pending_counters = self._pending_counters, defaultdict(int)
+        sums, self._pending_sums = self._pending_sums, defaultdict(float)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for field, amount in counters.items():
+                    pipe.hincrby(self.redis_key, field, amount)
+                for field, amount in sums.items():
+                    pipe.hincrbyfloat(self.redis_key, field, amount)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error flushing cache metrics: {e}")
+            # Keep the increments for the next flush
+            for field, amount in counters.items():
+                self._pending_counters[field] += amount
+            for field, amount in sums.items():
+                self._pending_sums[field] += amount
+    
+    async def load_aggregate(self, client) -> Optional[Tuple[Dict, Dict, Dict]]:
+        """Read totals across all workers as (counters, histograms, latency sums)"""
+        try:
+            await self.flush(client)
+            raw = await client.hgetall(self.redis_key)
+        except Exception as e:
+            logger.error(f"Error reading cache metrics: {e}")
+            return None
+        
+        counters = defaultdict(int)
+        histograms = {}
+        sums = defaultdict(float)
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            kind, *labels = field.split("|")
+            if kind == "c" and len(labels) == 3:
+                counters[tuple(labels)] += int(value)
+            elif kind == "h" and len(labels) == 3:
+                namespace, operation, bound = labels
+                buckets = histograms.setdefault((namespace, operation), [0] * (len(LATENCY_BUCKETS) + 1))
+                index = len(LATENCY_BUCKETS) if bound == "+Inf" else LATENCY_BUCKETS.index(float(bound))
+                buckets[index] += int(value)
+            elif kind == "s" and len(labels) == 2:
+                sums[tuple(labels)] += float(value)
+        return counters, histograms, sums
+    
+    async def get_stats(self, client=None) -> Dict:
+        """Hit rates and latency percentiles per namespace and operation.
+        
+        Aggregated across workers when a Redis client is given, otherwise this
+        worker's numbers only.
+        """
+        aggregate = await self.load_aggregate(client) if client is not None else None
+        scope = "all_workers" if aggregate else "this_worker"
+        counters, histograms, sums = aggregate or (self.counters, self.histograms, self.latency_sums)
+        
+        stats: Dict[str, Dict] = {}
+        for (namespace, operation, result), count in counters.items():
+            entry = stats.setdefault(namespace, {}).setdefault(operation, {})
+            entry[result] = entry.get(result, 0) + count
+        
+        for namespace, operations in stats.items():
+            for operation, entry in operations.items():
+                if operation in ('get', 'mget'):
+                    hits = entry.get('l1_hit', 0) + entry.get('hit', 0)
+                    total = hits + entry.get('miss', 0)
+                    entry["hit_rate"] = round((hits / total) * 100, 2) if total else 0.0
+        
+        for (namespace, operation), buckets in histograms.items():
+            entry = stats.setdefault(namespace, {}).setdefault(operation, {})
+            entry["latency"] = self._latency_summary(buckets, sums.get((namespace, operation), 0.0))
+        
+        return {"scope": scope, "namespaces": stats}
+    
+    @staticmethod
+    def _latency_summary(buckets: List[int], total_seconds: float) -> Dict:
+        """Count, mean and bucket-estimated percentiles in milliseconds"""
+        count = sum(buckets)
+        summary = {
+            "count": count,
+            "avg_ms": round(total_seconds * 1000 / count, 3) if count else 0,
+        }
+        for name, quantile in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            summary[name] = CacheMetrics._bucket_quantile(buckets, quantile)
+        return summary
+    
+    @staticmethod
+    def _bucket_quantile(buckets: List[int], quantile: float) -> Optional[float]:
+        """Upper bound in milliseconds of the bucket holding the quantile (None when in +Inf)"""
+        count = sum(buckets)
+        if not count:
+            return 0
+        rank = quantile * count
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS[index] * 1000 if index < len(LATENCY_BUCKETS) else None
+        return None
+    
+    async def render_prometheus(self, client=None) -> str:
+        """Prometheus text exposition of the counters and histograms"""
+        aggregate = await self.load_aggregate(client) if client is not None else None
+        counters, histograms, sums = aggregate or (self.counters, self.histograms, self.latency_sums)
+        
+        lines = [
+            "# HELP cache_requests_total Cache operations by namespace, operation and result.",
+            "# TYPE cache_requests_total counter",
+        ]
+        for (namespace, operation, result), count in sorted(counters.items()):
+            lines.append(
+                f'cache_requests_total{{namespace="{namespace}",operation="{operation}",result="{result}"}} {count}'
+            )
+        
+        lines += [
+            "# HELP cache_operation_duration_seconds Redis round-trip latency by namespace and operation.",
+            "# TYPE cache_operation_duration_seconds histogram",
+        ]
+        for (namespace, operation), buckets in sorted(histograms.items()):
+            labels = f'namespace="{namespace}",operation="{operation}"'
+            cumulative = 0
+            for index, bucket_count in enumerate(buckets):
+                cumulative += bucket_count
+                bound = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else "+Inf"
+                lines.append(f'cache_operation_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'cache_operation_duration_seconds_sum{{{labels}}} {sums.get((namespace, operation), 0.0)}')
+            lines.append(f'cache_operation_duration_seconds_count{{{labels}}} {cumulative}')
+        
+        return "\n".join(lines) + "\n"
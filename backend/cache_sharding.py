@@ -0,0 +1,224 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+    
+    Each node owns `replicas` points on a 64-bit ring and a key belongs to the
+    node owning the first point at or after the key's hash, so adding or
+    removing one of N nodes moves only about 1/N of the keys.
+    """
+    
+    def __init__(self, nodes: List[str], replicas: int = 160):
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        ring = sorted((self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        """Position of a string on the ring"""
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+    
+    def node_for(self, key: Any) -> str:
+        """Node owning a key"""
+        if isinstance(key, bytes):
+            key = key.decode()
+        index = bisect.bisect_left(self._points, self._hash(key))
+        return self._owners[index % len(self._owners)]
+    
+    def group(self, keys) -> Dict[str, List]:
+        """Keys grouped by owning node, each group in the original order"""
+        groups: Dict[str, List] = {}
+        for key in keys:
+            groups.setdefault(self.node_for(key), []).append(key)
+        return groups
+    
+    def ownership(self) -> Dict[str, float]:
+        """Fraction of the ring, and so of the keys, owned by each node"""
+        shares = dict.fromkeys(self.nodes, 0)
+        previous = self._points[-1] - 2 ** 64
+        for point, node in zip(self._points, self._owners):
+            shares[node] += point - previous
+            previous = point
+        return {node: round(share / 2 ** 64, 4) for node, share in shares.items()}
+
+class ShardedPipeline:
+    """Pipeline that queues each command on the pipeline of the shard owning its key.
+    
+    execute() runs the shard pipelines concurrently and returns results in the
+    order the commands were queued. Multi-key commands are split per shard and
+    their counts summed; PUBLISH goes to the control node.
+    """
+    
+    _MULTI_KEY = {"unlink", "delete", "exists", "touch"}
+    
+    def __init__(self, sharded: "ShardedRedis", transaction: bool):
+        self._sharded = sharded
+        self._transaction = transaction
+        self._pipes: Dict[Any, Any] = {}
+        self._sizes: Dict[Any, int] = {}
+        # Per queued command: whether results are summed, and its (pipe, index) slots
+        self._commands: List[Tuple[bool, List[Tuple[Any, int]]]] = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.reset()
+    
+    def _queue(self, node, method: str, *args, **kwargs) -> Tuple[Any, int]:
+        """Queue a command on one node's pipeline (None is the control node)"""
+        if node not in self._pipes:
+            client = self._sharded.control if node is None else self._sharded.clients[node]
+            self._pipes[node] = client.pipeline(transaction=self._transaction)
+            self._sizes[node] = 0
+        getattr(self._pipes[node], method)(*args, **kwargs)
+        self._sizes[node] += 1
+        return node, self._sizes[node] - 1
+    
+    def publish(self, channel, message):
+        self._commands.append((False, [self._queue(None, "publish", channel, message)]))
+        return self
+    
+    def __getattr__(self, method: str):
+        def queue(*args, **kwargs):
+            if method in self._MULTI_KEY:
+                slots = [
+                    self._queue(node, method, *keys)
+                    for node, keys in self._sharded.ring.group(args).items()
+                ]
+                self._commands.append((True, slots))
+            else:
+                node = self._sharded.ring.node_for(args[0])
+                self._commands.append((False, [self._queue(node, method, *args, **kwargs)]))
+            return self
+        return queue
+    
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        """Run every shard's pipeline at once; results come back in queue order"""
+        nodes = list(self._pipes)
+        outputs = await asyncio.gather(
+            *(self._pipes[node].execute(raise_on_error=raise_on_error) for node in nodes)
+        )
+        by_node = dict(zip(nodes, outputs))
+        
+        results = []
+        for summed, slots in self._commands:
+            values = [by_node[node][index] for node, index in slots]
+            if summed:
+                errors = [value for value in values if isinstance(value, Exception)]
+                results.append(errors[0] if errors else sum(values))
+            else:
+                results.append(values[0])
+        await self.reset()
+        return results
+    
+    async def reset(self):
+        """Discard queued commands and return connections to their pools"""
+        for pipe in self._pipes.values():
+            await pipe.reset()
+        self._pipes = {}
+        self._sizes = {}
+        self._commands = []
+
+class ShardedRedis:
+    """Client-side sharding of cache entries over several Redis nodes.
+    
+    Exposes the subset of the redis.asyncio client the cache uses: commands
+    whose first argument is a key go to the node owning that key, multi-key
+    commands fan out to each shard concurrently, and pipelines split per
+    shard. Pub/sub and other coordination stay on the control client.
+    """
+    
+    def __init__(self, clients: Dict[str, Any], control, replicas: int = 160):
+        self.clients = clients
+        self.control = control
+        self.ring = HashRing(list(clients), replicas)
+        # Node order for composite SCAN cursors
+        self._nodes = list(clients)
+    
+    def client_for(self, key: Any):
+        """Client of the node owning a key"""
+        return self.clients[self.ring.node_for(key)]
+    
+    def __getattr__(self, method: str):
+        # Single-key commands: GET, SET, SMEMBERS, MEMORY USAGE, ...
+        def call(key, *args, **kwargs):
+            return getattr(self.client_for(key), method)(key, *args, **kwargs)
+        return call
+    
+    def pipeline(self, transaction: bool = False) -> ShardedPipeline:
+        """Pipeline that splits per shard; transactions are only atomic within a shard"""
+        return ShardedPipeline(self, transaction)
+    
+    async def mget(self, keys: List[Any]) -> List[Any]:
+        """MGET fanned out to every shard at once, results aligned with keys"""
+        groups = self.ring.group(keys)
+        outputs = await asyncio.gather(*(self.clients[node].mget(group) for node, group in groups.items()))
+        values = {}
+        for group, output in zip(groups.values(), outputs):
+            values.update(zip(group, output))
+        return [values[key] for key in keys]
+    
+    async def _sum_per_shard(self, method: str, keys) -> int:
+        groups = self.ring.group(keys)
+        counts = await asyncio.gather(*(getattr(self.clients[node], method)(*group) for node, group in groups.items()))
+        return sum(counts)
+    
+    async def exists(self, *keys) -> int:
+        return await self._sum_per_shard("exists", keys)
+    
+    async def unlink(self, *keys) -> int:
+        return await self._sum_per_shard("unlink", keys)
+    
+    async def delete(self, *keys) -> int:
+        return await self._sum_per_shard("delete", keys)
+    
+    async def scan(self, cursor: int = 0, match=None, count=None, **kwargs) -> Tuple[int, List]:
+        """SCAN every shard in turn behind one cursor.
+        
+        The composite cursor is node_cursor * len(nodes) + node_index, and
+        returns to 0 after the last shard, like a single-node SCAN.
+        """
+        node_index = cursor % len(self._nodes)
+        node_cursor = cursor // len(self._nodes)
+        client = self.clients[self._nodes[node_index]]
+        node_cursor, batch = await client.scan(cursor=node_cursor, match=match, count=count, **kwargs)
+        if node_cursor == 0:
+            node_index += 1
+            if node_index == len(self._nodes):
+                return 0, batch
+        return node_cursor * len(self._nodes) + node_index, batch
+    
+    async def dbsize(self) -> int:
+        sizes = await asyncio.gather(*(client.dbsize() for client in self.clients.values()))
+        return sum(sizes)
+    
+    async def ping(self) -> bool:
+        await asyncio.gather(*(client.ping() for client in self.clients.values()))
+        return True
+    
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+            await client.connection_pool.disconnect()
+    
+    async def get_stats(self) -> Dict:
+        """Keys per shard next to the share of the ring each shard owns"""
+        ownership = self.ring.ownership()
+        stats = {"virtual_nodes": self.ring.replicas, "shards": {}}
+        for node, client in self.clients.items():
+            try:
+                keys = await client.dbsize()
+            except Exception as e:
+                logger.error(f"Error reading size of shard {node}: {e}")
+                keys = None
+            stats["shards"][node] = {"keys": keys, "ring_share": ownership[node]}
+        return stats
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmupScheduler:
+    """Keeps the most requested trend and location entries precomputed.
+    
+    Request handlers record which styles and locations they serve. On startup
+    and then every interval, one worker warms the top entries of each kind
+    through the stale-while-revalidate refreshers registered for them.
+    """
+    
+    def __init__(self):
+        self.interval = int(os.getenv('CACHE_WARMUP_INTERVAL_SECONDS', 1800))
+        self.concurrency = int(os.getenv('CACHE_WARMUP_CONCURRENCY', 4))
+        self.limits = {
+            'style': int(os.getenv('CACHE_WARMUP_TOP_STYLES', 8)),
+            'location': int(os.getenv('CACHE_WARMUP_TOP_LOCATIONS', 10)),
+        }
+        
+        # Warmed until enough requests have been observed
+        self.defaults = {
+            'style': ["modern", "traditional", "scandinavian", "contemporary"],
+            'location': [],
+        }
+        
+        # Request counts are multiplied by this after every pass, so recent demand dominates
+        self.decay = float(os.getenv('CACHE_WARMUP_DECAY', 0.5))
+        self.max_tracked = 1000
+        self.frequency_prefix = "warmup:freq"
+        self.progress_key = "warmup:progress"
+        
+        # kind -> [(target name, build(value) -> warm job)]
+        self._targets: Dict[str, List[Tuple[str, Callable]]] = {kind: [] for kind in self.limits}
+        # Counted in-process and flushed to Redis once per pass
+        self._observed = {kind: Counter() for kind in self.limits}
+        self._task = None
+        self._running = False
+        self.progress = self._empty_progress()
+    
+    def register_target(self, kind: str, name: str, build: Callable):
+        """Register an entry to warm for every top value of a kind.
+        
+        build(value) returns the warm job: key, refresher, args and optionally
+        soft_ttl and namespace, as accepted by RedisCache.warm.
+        """
+        self._targets[kind].append((name, build))
+    
+    def record(self, kind: str, value: Optional[str]):
+        """Count one request for a style or location"""
+        if value and kind in self._observed:
+            self._observed[kind][str(value)] += 1
+    
+    def start(self):
+        """Start warming on startup and every interval"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+    
+    async def stop(self):
+        """Stop the periodic warmup task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run_periodically(self):
+        """Warm once at startup, then every interval"""
+        trigger = "startup"
+        while True:
+            try:
+                await self.run(trigger)
+            except Exception as e:
+                logger.error(f"Error in scheduled cache warmup: {e}")
+            trigger = "schedule"
+            self.progress["next_run_at"] = datetime.fromtimestamp(time.time() + self.interval).isoformat()
+            await asyncio.sleep(self.interval)
+    
+    async def run(self, trigger: str = "manual", values: Optional[Dict[str, List[str]]] = None) -> Dict:
+        """Run one warmup pass, unless one ran on any worker this interval.
+        
+        values overrides the observed top styles/locations; only the kinds it
+        names are warmed.
+        """
+        if self._running:
+            return self.progress
+        
+        if not redis_cache.is_connected:
+            logger.warning("Redis not connected, skipping cache warmup")
+            return self.progress
+        
+        await self._flush_observations()
+        
+        token = await redis_cache.acquire_lock("cache_warmup", self.interval * 1000)
+        if token is None:
+            logger.info("Cache warmup already running on another worker")
+            return self.progress
+        
+        self._running = True
+        try:
+            jobs = await self._plan(values)
+            self.progress = {
+                **self._empty_progress(),
+                "status": "running",
+                "trigger": trigger,
+                "started_at": datetime.now().isoformat(),
+                "total": len(jobs),
+                "next_run_at": self.progress.get("next_run_at"),
+            }
+            await self._publish_progress()
+            logger.info(f"Cache warmup ({trigger}) starting with {len(jobs)} entries")
+            
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._run_job(semaphore, job) for job in jobs))
+            
+            if values is None:
+                await self._decay_frequencies()
+            
+            logger.info(
+                f"Cache warmup finished: {self.progress['warmed']} warmed, "
+                f"{self.progress['skipped']} already fresh, {self.progress['failed']} failed"
+            )
+        finally:
+            self._running = False
+            self.progress["status"] = "idle"
+            self.progress["finished_at"] = datetime.now().isoformat()
+            await self._publish_progress()
+            # A scheduled pass keeps the lease for the interval, so workers waking
+            # later do not warm and decay again; manual runs free it at once
+            if trigger == "manual":
+                await redis_cache.release_lock("cache_warmup", token)
+        
+        return self.progress
+    
+    async def _plan(self, values: Optional[Dict[str, List[str]]]) -> List[Dict]:
+        """Build warm jobs for the top values of each kind, highest request count first"""
+        jobs = []
+        for kind, targets in self._targets.items():
+            if values is not None:
+                if kind not in values:
+                    continue
+                candidates = [(value, 0.0) for value in values[kind] or self.defaults[kind]]
+            else:
+                candidates = await self._top_values(kind)
+            
+            for value, score in candidates:
+                for name, build in targets:
+                    jobs.append({"label": f"{name}:{value}", "priority": score, **build(value)})
+        
+        # Stable sort keeps explicit values in the order given
+        jobs.sort(key=lambda job: job["priority"], reverse=True)
+        return jobs
+    
+    async def _run_job(self, semaphore: asyncio.Semaphore, job: Dict):
+        """Warm one entry, bounded by the pass concurrency"""
+        async with semaphore:
+            self.progress["in_progress"].append(job["label"])
+            try:
+                warmed = await redis_cache.warm(
+                    job["key"], job["refresher"], *job.get("args", []),
+                    soft_ttl=job.get("soft_ttl"), namespace=job.get("namespace"),
+                    min_fresh_seconds=self.interval
+                )
+                self.progress["warmed" if warmed else "skipped"] += 1
+            except Exception as e:
+                logger.error(f"Error warming {job['label']}: {e}")
+                self.progress["failed"] += 1
+            finally:
+                self.progress["in_progress"].remove(job["label"])
+                self.progress["completed"] += 1
+                await self._publish_progress()
+    
+    async def _flush_observations(self):
+        """Add this worker's request counts to the shared frequency sets in one pipeline"""
+        if not any(self._observed.values()):
+            return
+        
+        observed, self._observed = self._observed, {kind: Counter() for kind in self.limits}
+        try:
+            pipe = redis_cache.client.pipeline(transaction=False)
+            for kind, counts in observed.items():
+                for value, count in counts.items():
+                    pipe.zincrby(f"{self.frequency_prefix}:{kind}", count, value)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording warmup frequencies: {e}")
+    
+    async def _top_values(self, kind: str) -> List[Tuple[str, float]]:
+        """Most requested values of a kind, padded with the defaults"""
+        limit = self.limits[kind]
+        top = []
+        try:
+            entries = await redis_cache.client.zrevrange(
+                f"{self.frequency_prefix}:{kind}", 0, limit - 1, withscores=True
+            )
+            top = [(value.decode() if isinstance(value, bytes) else value, score) for value, score in entries]
+        except Exception as e:
+            logger.error(f"Error reading warmup frequencies for {kind}: {e}")
+        
+        seen = {value for value, _ in top}
+        for value in self.defaults[kind]:
+            if len(top) >= limit:
+                break
+            if value not in seen:
+                top.append((value, 0.0))
+        return top
+    
+    async def _decay_frequencies(self):
+        """Age request counts and trim the frequency sets"""
+        try:
+            pipe = redis_cache.client.pipeline(transaction=False)
+            for kind in self.limits:
+                key = f"{self.frequency_prefix}:{kind}"
+                pipe.zunionstore(key, {key: self.decay})
+                pipe.zremrangebyrank(key, 0, -(self.max_tracked + 1))
+                pipe.zremrangebyscore(key, "-inf", 0.1)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error decaying warmup frequencies: {e}")
+    
+    async def _publish_progress(self):
+        """Share progress so any worker can report it"""
+        try:
+            await redis_cache.client.set(
+                self.progress_key, json.dumps(self.progress), ex=self.interval * 2
+            )
+        except Exception as e:
+            logger.error(f"Error publishing warmup progress: {e}")
+    
+    async def get_progress(self) -> Dict[str, Any]:
+        """Progress of the current or last warmup pass on any worker, plus current priorities"""
+        progress = self.progress
+        top = {}
+        if redis_cache.is_connected:
+            try:
+                raw = await redis_cache.client.get(self.progress_key)
+                if raw:
+                    progress = json.loads(raw)
+                for kind in self.limits:
+                    top[kind] = [
+                        {"value": value, "score": round(score, 2)}
+                        for value, score in await self._top_values(kind)
+                    ]
+            except Exception as e:
+                logger.error(f"Error reading warmup progress: {e}")
+        
+        return {
+            **progress,
+            "interval_seconds": self.interval,
+            "concurrency": self.concurrency,
+            "priorities": top,
+        }
+    
+    @staticmethod
+    def _empty_progress() -> Dict[str, Any]:
+        """Progress fields before any pass has run"""
+        return {
+            "status": "idle",
+            "trigger": None,
+            "started_at": None,
+            "finished_at": None,
+            "total": 0,
+            "completed": 0,
+            "warmed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "in_progress": [],
+            "next_run_at": None,
+        }
+
+# Global warmup scheduler instance
+cache_warmup = CacheWarmupScheduler()
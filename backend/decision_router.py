@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, List, Optional
 from agents.vision_match_agent import vision_agent
@@ -6,6 +7,7 @@ from agents.geo_finder_agent import geo_agent
 from artwork_retrieval import artwork_retrieval
 from database import supabase_client
 from cache import redis_cache
+from cache_warmup import cache_warmup
 import json
 from datetime import datetime
 import hashlib
@@ -21,6 +23,25 @@ class DecisionRouter:
         self.artwork_retrieval = artwork_retrieval
         self.supabase_client = supabase_client
         self.redis_cache = redis_cache
+        
+        # Lets any worker refresh stale location entries in the background
+        self.redis_cache.register_refresher("location_suggestions", self.geo_agent.get_location_based_recommendations)
+        
+        # Keep the entries behind the most requested styles and locations warm. Style
+        # evolution entries belong to the trend agent and are keyed on the style alone.
+        cache_warmup.register_target("style", "style_evolution", lambda style: {
+            "key": self.trend_agent.style_evolution_cache_key({"preferences": {"aesthetic_style": style}}),
+            "refresher": "style_evolution_analysis",
+            "args": [{"preferences": {"aesthetic_style": style}}],
+            "soft_ttl": self.trend_agent.style_evolution_soft_ttl,
+            "namespace": 'trend_data',
+        })
+        cache_warmup.register_target("location", "location_suggestions", lambda location: {
+            "key": self.redis_cache.make_key('location_data', location),
+            "refresher": "location_suggestions",
+            "args": [location, {}],
+            "namespace": 'location_data',
+        })
     
     def _generate_image_hash(self, image_path: str) -> str:
         """Generate hash for image to use as cache key"""
@@ -38,78 +59,32 @@ class DecisionRouter:
             # Generate image hash for caching
             image_hash = self._generate_image_hash(image_path)
             
+            # Resolve every cache lookup for this request in one round trip.
+            # Preference-dependent keys can join it when preferences are in L1.
+            cache_keys = self._room_cache_keys(image_hash, user_id, location)
+            local_preferences = self.redis_cache.get_local(cache_keys["user_preferences"])
+            if local_preferences is not None:
+                cache_keys.update(self._preference_cache_keys(user_id, local_preferences))
+                cache_warmup.record("style", local_preferences.get("aesthetic_style"))
+            cache_warmup.record("location", location)
+            cached = await self._mget_named(cache_keys)
+            
             # Check cache first
-            cached_result = await self.redis_cache.get_cached_room_analysis(image_hash, user_id)
-            if cached_result:
+            if cached.get("room_analysis"):
                 logger.info("Returning cached room analysis result")
-                return cached_result
+                return cached["room_analysis"]
             
             logger.info("Cache miss - processing room analysis")
             
-            # Step 1: Vision analysis with caching
-            logger.info("Starting vision analysis")
-            room_analysis = await self._get_or_cache_vision_analysis(image_path, image_hash)
-            
-            # Step 2: Get user preferences with caching
-            user_preferences = await self._get_or_cache_user_preferences(user_id)
-            
-            # Step 3: Get personalized recommendations with caching
-            logger.info("Getting personalized recommendations")
-            recommendations = await self._get_or_cache_recommendations(
-                room_analysis, user_preferences, user_id
+            # Identical concurrent uploads share one analysis run
+            return await self.redis_cache.single_flight(
+                cache_keys["room_analysis"],
+                self._run_room_analysis,
+                self.redis_cache.ttl_settings['room_analysis'],
+                image_path, image_hash, user_id, location, cached,
+                namespace='room_analysis', user_id=user_id
             )
             
-            # Step 4: Get trend insights with caching
-            logger.info("Getting trend insights")
-            trend_insights = await self._get_or_cache_trend_insights(user_preferences)
-            
-            # Step 5: Get location-based suggestions with caching
-            location_suggestions = {}
-            if location:
-                logger.info("Getting location-based suggestions")
-                location_suggestions = await self._get_or_cache_location_suggestions(
-                    location, user_preferences
-                )
-            
-            # Step 6: Generate final reasoning
-            final_reasoning = self._generate_final_reasoning(
-                room_analysis, recommendations, trend_insights, user_preferences
-            )
-            
-            # Step 7: Save session
-            session_data = {
-                "user_id": user_id,
-                "room_analysis": room_analysis,
-                "recommendations": recommendations,
-                "trend_insights": trend_insights,
-                "location_suggestions": location_suggestions,
-                "final_reasoning": final_reasoning,
-                "created_at": datetime.now().isoformat()
-            }
-            await self.supabase_client.save_session(session_data)
-            
-            # Format response according to new API structure
-            formatted_response = {
-                "room_analysis": {
-                    "detections": room_analysis.get("detections", {}),
-                    "color_palette": room_analysis.get("color_palette", []),
-                    "lighting": room_analysis.get("lighting", {}),
-                    "aesthetic_style": room_analysis.get("aesthetic_style", {})
-                },
-                "recommendations": self._format_recommendations(recommendations),
-                "trend_insights": trend_insights,
-                "location_suggestions": location_suggestions,
-                "final_reasoning": final_reasoning,
-                "session_id": session_data.get("id"),
-                "success": True
-            }
-            
-            # Cache the complete result
-            await self.redis_cache.cache_room_analysis(image_hash, user_id, formatted_response)
-            logger.info("Cached room analysis result")
-            
-            return formatted_response
-            
         except Exception as e:
             logger.error(f"Error in room analysis processing: {e}")
             return {
@@ -120,6 +95,115 @@ class DecisionRouter:
                 "location_suggestions": {}
             }
     
+    async def _run_room_analysis(self, image_path: str, image_hash: str, user_id: str,
+                                 location: str = None, cached: Dict = None) -> Dict:
+        """Run every agent for a room analysis cache miss, reusing prefetched cache entries"""
+        cached = cached or {}
+        cache_keys = self._room_cache_keys(image_hash, user_id, location)
+        pending_writes = {}
+        
+        # Step 1: Vision analysis with caching
+        logger.info("Starting vision analysis")
+        room_analysis = self._cached_vision_analysis(cached)
+        if room_analysis is None:
+            logger.info("Performing vision analysis")
+            # The vision pipeline is synchronous and CPU-bound; keep it off the event loop
+            # so heartbeats and other requests keep running
+            loop = asyncio.get_running_loop()
+            room_analysis = await loop.run_in_executor(None, self.vision_agent.analyze_room, image_path)
+            if room_analysis.get("style_embeddings"):
+                pending_writes[cache_keys["style_embeddings"]] = room_analysis["style_embeddings"]
+            if room_analysis.get("color_palette"):
+                pending_writes[cache_keys["color_palette"]] = room_analysis["color_palette"]
+        
+        # Step 2: Get user preferences with caching
+        user_preferences = cached.get("user_preferences")
+        if user_preferences is None:
+            logger.info("Fetching user preferences from database")
+            user_profile = await self.supabase_client.get_user_profile(user_id)
+            user_preferences = user_profile.get("preferences", {}) if user_profile else {}
+            pending_writes[cache_keys["user_preferences"]] = user_preferences
+        
+        # Preference-dependent entries need a second lookup unless they were prefetched
+        preference_keys = self._preference_cache_keys(user_id, user_preferences)
+        if any(name not in cached for name in preference_keys):
+            cache_warmup.record("style", user_preferences.get("aesthetic_style"))
+            cached = {**cached, **await self._mget_named(preference_keys)}
+        
+        # Step 3: Get personalized recommendations with caching
+        logger.info("Getting personalized recommendations")
+        recommendations = cached.get("artwork_recommendations")
+        # mget reports an entry this request should recompute early (XFetch) as a miss
+        if recommendations is None:
+            recommendations = await self.redis_cache.single_flight(
+                preference_keys["artwork_recommendations"],
+                self.artwork_retrieval.get_personalized_recommendations,
+                self.redis_cache.ttl_settings['artwork_recommendations'],
+                room_analysis, user_preferences, k=5,
+                namespace='artwork_recommendations', user_id=user_id
+            )
+        
+        # Step 4: Get trend insights with caching
+        logger.info("Getting trend insights")
+        trend_insights = cached.get("trend_data")
+        if trend_insights is None:
+            # The agent serves it stale-while-revalidate from the same key prefetched above
+            trend_insights = await self.trend_agent.analyze_style_evolution({"preferences": user_preferences})
+        
+        # Step 5: Get location-based suggestions with caching
+        location_suggestions = {}
+        if location:
+            logger.info("Getting location-based suggestions")
+            location_suggestions = cached.get("location_data")
+            if location_suggestions is None:
+                # Popular locations are read constantly; refresh them ahead of expiry
+                location_suggestions = await self.redis_cache.get_or_refresh(
+                    cache_keys["location_data"], "location_suggestions", location, user_preferences,
+                    namespace='location_data'
+                )
+        
+        # Write back everything computed above in one pipeline
+        if pending_writes:
+            await self.redis_cache.mset(
+                pending_writes,
+                owners={cache_keys["user_preferences"]: user_id}
+            )
+        
+        # Step 6: Generate final reasoning
+        final_reasoning = self._generate_final_reasoning(
+            room_analysis, recommendations, trend_insights, user_preferences
+        )
+        
+        # Step 7: Save session
+        session_data = {
+            "user_id": user_id,
+            "room_analysis": room_analysis,
+            "recommendations": recommendations,
+            "trend_insights": trend_insights,
+            "location_suggestions": location_suggestions,
+            "final_reasoning": final_reasoning,
+            "created_at": datetime.now().isoformat()
+        }
+        await self.supabase_client.save_session(session_data)
+        
+        # Format response according to new API structure
+        formatted_response = {
+            "room_analysis": {
+                "detections": room_analysis.get("detections", {}),
+                "color_palette": room_analysis.get("color_palette", []),
+                "lighting": room_analysis.get("lighting", {}),
+                "aesthetic_style": room_analysis.get("aesthetic_style", {})
+            },
+            "recommendations": self._format_recommendations(recommendations),
+            "trend_insights": trend_insights,
+            "location_suggestions": location_suggestions,
+            "final_reasoning": final_reasoning,
+            "session_id": session_data.get("id"),
+            "success": True
+        }
+        
+        return formatted_response
+    
     async def process_text_query(self, query: str, user_id: str, location: str = None) -> Dict:
         """Process text-based queries with context awareness"""
         try:
@@ -145,7 +229,9 @@ class DecisionRouter:
             )
             
             # Get trend insights
-            trend_insights = await self.trend_agent.analyze_style_evolution(user_preferences)
+            cache_warmup.record("style", user_preferences.get("aesthetic_style"))
+            cache_warmup.record("location", location)
+            trend_insights = await self.trend_agent.analyze_style_evolution({"preferences": user_preferences})
             
             # Get location suggestions
             location_suggestions = {}
@@ -224,7 +310,9 @@ class DecisionRouter:
             )
             
             # Get trend insights
-            trend_insights = await self.trend_agent.analyze_style_evolution(user_preferences)
+            cache_warmup.record("style", user_preferences.get("aesthetic_style"))
+            cache_warmup.record("location", location)
+            trend_insights = await self.trend_agent.analyze_style_evolution({"preferences": user_preferences})
             
             # Get location suggestions
             location_suggestions = {}
@@ -532,109 +620,48 @@ class DecisionRouter:
     
     # Caching helper methods
     
-    async def _get_or_cache_vision_analysis(self, image_path: str, image_hash: str) -> Dict:
-        """Get vision analysis from cache or compute and cache"""
-        # Check for cached style embeddings first
-        cached_embeddings = await self.redis_cache.get_cached_style_embeddings(image_hash)
-        cached_color_palette = await self.redis_cache.get_cached_color_palette(image_hash)
-        
-        if cached_embeddings and cached_color_palette:
-            logger.info("Using cached vision analysis components")
-            # Reconstruct room analysis from cached components
-            return {
-                "detections": {"walls": [], "windows": [], "furniture": [], "other": []},
-                "color_palette": cached_color_palette,
-                "lighting": {"mean_brightness": 125.5, "lighting_condition": "moderate"},
-                "style_embeddings": cached_embeddings,
-                "aesthetic_style": {"style": "modern", "confidence": 0.8},
-                "analysis_timestamp": datetime.now().isoformat()
-            }
-        
-        # Cache miss - perform vision analysis
-        logger.info("Performing vision analysis")
-        room_analysis = self.vision_agent.analyze_room(image_path)
-        
-        # Cache the components
-        if room_analysis.get("style_embeddings"):
-            await self.redis_cache.cache_style_embeddings(image_hash, room_analysis["style_embeddings"])
-        if room_analysis.get("color_palette"):
-            await self.redis_cache.cache_color_palette(image_hash, room_analysis["color_palette"])
-        
-        return room_analysis
+    def _room_cache_keys(self, image_hash: str, user_id: str, location: str = None) -> Dict[str, str]:
+        """Cache keys a room analysis needs that do not depend on user preferences"""
+        cache_keys = {
+            "room_analysis": self.redis_cache.make_key('room_analysis', image_hash, user_id=user_id),
+            "style_embeddings": self.redis_cache.make_key('style_embeddings', image_hash),
+            "color_palette": self.redis_cache.make_key('color_palette', image_hash),
+            "user_preferences": self.redis_cache.make_key('user_preferences', user_id=user_id),
+        }
+        if location:
+            cache_keys["location_data"] = self.redis_cache.make_key('location_data', location)
+        return cache_keys
     
-    async def _get_or_cache_user_preferences(self, user_id: str) -> Dict:
-        """Get user preferences from cache or database"""
-        cached_preferences = await self.redis_cache.get_cached_user_preferences(user_id)
-        if cached_preferences:
-            logger.info("Using cached user preferences")
-            return cached_preferences
-        
-        # Cache miss - get from database
-        logger.info("Fetching user preferences from database")
-        user_profile = await self.supabase_client.get_user_profile(user_id)
-        user_preferences = user_profile.get("preferences", {}) if user_profile else {}
-        
-        # Cache the preferences
-        await self.redis_cache.cache_user_preferences(user_id, user_preferences)
-        
-        return user_preferences
-    
-    async def _get_or_cache_recommendations(self, room_analysis: Dict, user_preferences: Dict, user_id: str) -> List[Dict]:
-        """Get recommendations from cache or compute and cache"""
-        style_preferences = str(user_preferences.get("aesthetic_style", "modern"))
-        cached_recommendations = await self.redis_cache.get_cached_artwork_recommendations(user_id, style_preferences)
-        
-        if cached_recommendations:
-            logger.info("Using cached artwork recommendations")
-            return cached_recommendations
-        
-        # Cache miss - compute recommendations
-        logger.info("Computing artwork recommendations")
-        recommendations = await self.artwork_retrieval.get_personalized_recommendations(
-            room_analysis, user_preferences, k=5
-        )
-        
-        # Cache the recommendations
-        await self.redis_cache.cache_artwork_recommendations(user_id, style_preferences, recommendations)
-        
-        return recommendations
-    
-    async def _get_or_cache_trend_insights(self, user_preferences: Dict) -> Dict:
-        """Get trend insights from cache or compute and cache"""
+    def _preference_cache_keys(self, user_id: str, user_preferences: Dict) -> Dict[str, str]:
+        """Cache keys derived from the user's preferences"""
         style = user_preferences.get("aesthetic_style", "modern")
-        cached_trends = await self.redis_cache.get_cached_trend_data(f"style_evolution_{style}")
-        
-        if cached_trends:
-            logger.info("Using cached trend insights")
-            return cached_trends
-        
-        # Cache miss - compute trend insights
-        logger.info("Computing trend insights")
-        trend_insights = await self.trend_agent.analyze_style_evolution(user_preferences)
-        
-        # Cache the trend insights
-        await self.redis_cache.cache_trend_data(f"style_evolution_{style}", trend_insights)
-        
-        return trend_insights
+        return {
+            "artwork_recommendations": self.redis_cache.make_key('artwork_recommendations', str(style), user_id=user_id),
+            "trend_data": self.trend_agent.style_evolution_cache_key({"preferences": user_preferences}),
+        }
     
-    async def _get_or_cache_location_suggestions(self, location: str, user_preferences: Dict) -> Dict:
-        """Get location suggestions from cache or compute and cache"""
-        cached_location_data = await self.redis_cache.get_cached_location_data(location)
-        
-        if cached_location_data:
-            logger.info("Using cached location suggestions")
-            return cached_location_data
-        
-        # Cache miss - compute location suggestions
-        logger.info("Computing location-based suggestions")
-        location_suggestions = self.geo_agent.get_location_based_recommendations(
-            location, user_preferences
-        )
+    async def _mget_named(self, cache_keys: Dict[str, str]) -> Dict:
+        """Fetch named cache keys in one round trip; misses map to None"""
+        values = await self.redis_cache.mget(list(cache_keys.values()))
+        return dict(zip(cache_keys, values))
+    
+    def _cached_vision_analysis(self, cached: Dict) -> Optional[Dict]:
+        """Reconstruct room analysis from cached vision components, if all are present"""
+        cached_embeddings = cached.get("style_embeddings")
+        cached_color_palette = cached.get("color_palette")
         
-        # Cache the location suggestions
-        await self.redis_cache.cache_location_data(location, location_suggestions)
+        if not (cached_embeddings and cached_color_palette):
+            return None
         
-        return location_suggestions
+        logger.info("Using cached vision analysis components")
+        return {
+            "detections": {"walls": [], "windows": [], "furniture": [], "other": []},
+            "color_palette": cached_color_palette,
+            "lighting": {"mean_brightness": 125.5, "lighting_condition": "moderate"},
+            "style_embeddings": cached_embeddings,
+            "aesthetic_style": {"style": "modern", "confidence": 0.8},
+            "analysis_timestamp": datetime.now().isoformat()
+        }
     
     async def update_user_preferences(self, user_id: str, new_preferences: Dict) -> bool:
         """Update user preferences based on interactions"""
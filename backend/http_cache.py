@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Response headers kept with each entry; a 304 may update any of them
+_STORED_HEADERS = ("cache-control", "expires", "date", "age", "etag", "last-modified")
+
+class HTTPCache:
+    """On-disk HTTP cache for scraped pages, with conditional revalidation.
+    
+    Each URL keeps its body, validators (ETag / Last-Modified) and freshness
+    from Cache-Control, Expires or the Last-Modified heuristic, plus whatever
+    was extracted from the body. A 304 only refreshes the metadata, so the
+    extracted result is reused without downloading or parsing the page.
+    
+    Methods do blocking file I/O; async callers run them in a thread pool.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or os.getenv(
+            'HTTP_CACHE_DIR',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'http_cache')
+        )
+        self.max_entries = int(os.getenv('HTTP_CACHE_MAX_ENTRIES', 1000))
+        # Pages without explicit freshness stay fresh for 10% of their age, up to this
+        self.heuristic_max_age = int(os.getenv('HTTP_CACHE_HEURISTIC_MAX_AGE_SECONDS', 3600))
+    
+    def _path(self, url: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest() + suffix)
+    
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Stored entry for a URL, fresh or not"""
+        try:
+            with open(self._path(url, ".json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable HTTP cache entry for {url}: {e}")
+            return None
+    
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        """Whether an entry may be used without asking the server"""
+        return time.time() < entry.get("fresh_until", 0)
+    
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since for revalidating an entry"""
+        headers = {}
+        if entry:
+            stored = entry["headers"]
+            if stored.get("etag"):
+                headers["If-None-Match"] = stored["etag"]
+            if stored.get("last-modified"):
+                headers["If-Modified-Since"] = stored["last-modified"]
+        return headers
+    
+    def store(self, url: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        """Record a 200 response; with Cache-Control: no-store the entry is returned but not saved"""
+        headers = self._relevant_headers(headers)
+        entry = {
+            "url": url,
+            "headers": headers,
+            "stored_at": time.time(),
+            "parsed": {},
+        }
+        entry["fresh_until"] = entry["stored_at"] + self._freshness_lifetime(headers)
+        
+        if "no-store" in self._cache_control(headers):
+            entry["body"] = body
+            return entry
+        
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write(self._path(url, ".body"), body)
+            self._write(self._path(url, ".json"), json.dumps(entry).encode())
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Error writing HTTP cache entry for {url}: {e}")
+            entry["body"] = body
+        return entry
+    
+    def revalidated(self, entry: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """Apply a 304 response: merge its headers and restart the freshness lifetime"""
+        entry["headers"].update(self._relevant_headers(headers))
+        entry["stored_at"] = time.time()
+        entry["fresh_until"] = entry["stored_at"] + self._freshness_lifetime(entry["headers"])
+        self._save(entry)
+        return entry
+    
+    def read_body(self, entry: Dict[str, Any]) -> bytes:
+        """Body of an entry"""
+        if "body" in entry:
+            return entry["body"]
+        with open(self._path(entry["url"], ".body"), "rb") as f:
+            return f.read()
+    
+    def save_parsed(self, entry: Dict[str, Any], name: str, parsed: Any):
+        """Keep what an extractor produced from the body, to reuse while the body is unchanged"""
+        entry["parsed"][name] = parsed
+        if "body" not in entry:
+            self._save(entry)
+    
+    def _save(self, entry: Dict[str, Any]):
+        try:
+            self._write(self._path(entry["url"], ".json"), json.dumps(entry).encode())
+        except OSError as e:
+            # The entry still serves this fetch; the next one revalidates again
+            logger.warning(f"Error saving HTTP cache entry for {entry['url']}: {e}")
+    
+    @staticmethod
+    def _write(path: str, data: bytes):
+        """Write via a temporary file so readers never see a partial file"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    
+    def _prune(self):
+        """Drop the least recently stored entries beyond max_entries"""
+        entries = [name for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda name: os.path.getmtime(os.path.join(self.cache_dir, name)))
+        for name in entries[:len(entries) - self.max_entries]:
+            stem = os.path.join(self.cache_dir, name[:-len(".json")])
+            for path in (stem + ".json", stem + ".body"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    @staticmethod
+    def _relevant_headers(headers: Dict[str, str]) -> Dict[str, str]:
+        lowered = {name.lower(): value for name, value in headers.items()}
+        return {name: lowered[name] for name in _STORED_HEADERS if name in lowered}
+    
+    @staticmethod
+    def _cache_control(headers: Dict[str, str]) -> Dict[str, Optional[str]]:
+        """Cache-Control directives, e.g. {"max-age": "600", "no-cache": None}"""
+        directives = {}
+        for part in headers.get("cache-control", "").split(","):
+            name, _, value = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = value.strip('"') or None
+        return directives
+    
+    def _freshness_lifetime(self, headers: Dict[str, str]) -> float:
+        """Seconds a response stays fresh, per RFC 9111 for a private cache"""
+        directives = self._cache_control(headers)
+        if "no-cache" in directives or "no-store" in directives:
+            return 0
+        try:
+            age = float(headers.get("age", 0))
+        except ValueError:
+            age = 0
+        
+        if directives.get("max-age") is not None:
+            try:
+                return max(0, int(directives["max-age"]) - age)
+            except ValueError:
+                return 0
+        
+        date = self._parse_date(headers.get("date")) or time.time()
+        expires = headers.get("expires")
+        if expires:
+            expires_at = self._parse_date(expires)
+            # An invalid Expires (e.g. "0") means already expired
+            return max(0, expires_at - date - age) if expires_at else 0
+        
+        last_modified = self._parse_date(headers.get("last-modified"))
+        if last_modified is not None:
+            return min(self.heuristic_max_age, max(0, (date - last_modified) * 0.1 - age))
+        return 0
+    
+    @staticmethod
+    def _parse_date(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+# Global HTTP cache instance
+http_cache = HTTPCache()
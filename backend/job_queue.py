@@ -0,0 +1,393 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import redis.asyncio as redis
+from cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Job states a client can stop waiting on
+TERMINAL_STATES = ("done", "failed")
+
+# Upload extensions a job's temporary image file may carry; anything else becomes "jpg"
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "webp", "gif", "bmp", "tif", "tiff")
+
+class JobQueueUnavailable(Exception):
+    """Redis could not be reached to read a job"""
+
+class RoomAnalysisQueue:
+    """Redis Streams queue that runs room analyses on separate vision workers.
+    
+    The API stores the upload, adds the job to a stream and returns its ID.
+    Workers in one consumer group read jobs, ack them once the result is
+    stored, and claim entries left pending by workers that stopped
+    heartbeating. Clients poll the job or wait on its completion channel.
+    """
+    
+    def __init__(self):
+        self.stream_key = os.getenv('JOB_STREAM_KEY', 'jobs:room_analysis')
+        self.group = os.getenv('JOB_CONSUMER_GROUP', 'vision_workers')
+        self.dead_letter_key = f"{self.stream_key}:dead"
+        self.job_prefix = "job:room_analysis"
+        
+        # Jobs, their uploads and results expire this long after the last update
+        self.result_ttl = int(os.getenv('JOB_RESULT_TTL_SECONDS', 3600))
+        self.max_image_bytes = int(os.getenv('JOB_MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+        
+        # A job pending this long without a heartbeat is handed to another worker
+        self.visibility_timeout = int(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', 120))
+        self.max_attempts = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+        self.worker_concurrency = int(os.getenv('VISION_WORKER_CONCURRENCY', 2))
+        # Kept below REDIS_SOCKET_TIMEOUT so a blocking read never times out the socket
+        self.read_block_ms = int(os.getenv('JOB_READ_BLOCK_MS', 2000))
+        
+        self._claim_cursor = "0-0"
+        self._group_ready = False
+    
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.job_prefix}:{job_id}"
+    
+    def _image_key(self, job_id: str) -> str:
+        return f"{self.job_prefix}:{job_id}:image"
+    
+    def _channel(self, job_id: str) -> str:
+        return f"{self.job_prefix}:{job_id}:events"
+    
+    @staticmethod
+    def _safe_extension(extension: Optional[str]) -> str:
+        """Client-supplied file extension reduced to a known image type"""
+        extension = (extension or "").strip().lower()
+        return extension if extension in IMAGE_EXTENSIONS else "jpg"
+    
+    # API side
+    
+    async def enqueue(self, image_data: bytes, extension: str, user_id: str,
+                      location: Optional[str] = None) -> Optional[str]:
+        """Queue a room analysis; returns the job ID, or None when Redis is unavailable"""
+        if not redis_cache.is_connected:
+            return None
+        
+        job_id = uuid.uuid4().hex
+        job_key = self._job_key(job_id)
+        try:
+            async with redis_cache.client.pipeline(transaction=True) as pipe:
+                pipe.hset(job_key, mapping={
+                    "status": "queued",
+                    "user_id": user_id,
+                    "location": location or "",
+                    "extension": self._safe_extension(extension),
+                    "attempts": 0,
+                    "created_at": datetime.now().isoformat(),
+                })
+                pipe.expire(job_key, self.result_ttl)
+                # The upload travels through Redis so workers need no shared disk
+                pipe.set(self._image_key(job_id), image_data, ex=self.result_ttl)
+                pipe.xadd(self.stream_key, {"job_id": job_id})
+                await pipe.execute()
+            return job_id
+        except Exception as e:
+            logger.error(f"Error enqueuing room analysis: {e}")
+            redis_cache._record_failure(e)
+            return None
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status, and once finished the result, of a job; None if unknown or expired.
+        
+        Raises JobQueueUnavailable when Redis cannot be read, so callers do
+        not mistake an outage for a missing job.
+        """
+        if not redis_cache.is_connected:
+            raise JobQueueUnavailable("Redis is not connected")
+        try:
+            raw = await redis_cache.client.hgetall(self._job_key(job_id))
+        except Exception as e:
+            logger.error(f"Error reading job {job_id}: {e}")
+            redis_cache._record_failure(e)
+            raise JobQueueUnavailable(str(e)) from e
+        if not raw:
+            return None
+        
+        fields = {redis_cache._to_str(field): redis_cache._to_str(value) for field, value in raw.items()}
+        job = {
+            "job_id": job_id,
+            "status": fields.get("status"),
+            "user_id": fields.get("user_id"),
+            "attempts": int(fields.get("attempts", 0)),
+            "created_at": fields.get("created_at"),
+            "started_at": fields.get("started_at"),
+            "finished_at": fields.get("finished_at"),
+        }
+        if fields.get("error"):
+            job["error"] = fields["error"]
+        if fields.get("result"):
+            job["result"] = json.loads(fields["result"])
+        return job
+    
+    async def wait_for_job(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once finished or when timeout seconds pass.
+        
+        Raises JobQueueUnavailable like get_job.
+        """
+        if not redis_cache.is_connected:
+            raise JobQueueUnavailable("Redis is not connected")
+        
+        pubsub = redis_cache.client.pubsub()
+        try:
+            # Subscribe before reading, so a job finishing in between is not missed
+            await pubsub.subscribe(self._channel(job_id))
+            job = await self.get_job(job_id)
+            deadline = time.monotonic() + timeout
+            while job and job["status"] not in TERMINAL_STATES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 1.0))
+                if message:
+                    job = await self.get_job(job_id)
+            return job
+        except JobQueueUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error waiting for job {job_id}: {e}")
+            redis_cache._record_failure(e)
+            raise JobQueueUnavailable(str(e)) from e
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Backlog, in-flight and dead-lettered job counts, for sizing the worker fleet"""
+        try:
+            await self.ensure_group()
+            pipe = redis_cache.client.pipeline(transaction=False)
+            pipe.xlen(self.stream_key)
+            pipe.xpending(self.stream_key, self.group)
+            pipe.xlen(self.dead_letter_key)
+            pipe.xinfo_consumers(self.stream_key, self.group)
+            length, pending, dead, consumers = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error reading job queue stats: {e}")
+            return {"error": str(e)}
+        
+        in_flight = pending.get("pending", 0) if isinstance(pending, dict) else 0
+        return {
+            # Finished entries are deleted, so the stream holds only unfinished jobs
+            "queued": max(0, length - in_flight),
+            "in_flight": in_flight,
+            "dead_lettered": dead,
+            "workers": [
+                {
+                    "name": redis_cache._to_str(consumer.get("name")),
+                    "pending": consumer.get("pending", 0),
+                    "idle_ms": consumer.get("idle", 0),
+                }
+                for consumer in consumers
+            ],
+        }
+    
+    # Worker side
+    
+    async def ensure_group(self):
+        """Create the stream and consumer group if they do not exist yet"""
+        try:
+            await redis_cache.client.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+    
+    async def run_worker(self, handler: Callable[..., Awaitable[Dict]], consumer: str):
+        """Process jobs until cancelled, up to worker_concurrency at a time.
+        
+        handler(image_path, user_id, location) returns the analysis result.
+        """
+        logger.info(f"Vision worker {consumer} reading {self.stream_key} as part of {self.group}")
+        tasks = set()
+        next_claim = 0.0
+        while True:
+            try:
+                if len(tasks) >= self.worker_concurrency:
+                    _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                
+                if not redis_cache.is_connected:
+                    await asyncio.sleep(1)
+                    continue
+                
+                if not self._group_ready:
+                    await self.ensure_group()
+                free = self.worker_concurrency - len(tasks)
+                entries = []
+                # Entries abandoned by other workers go first, checked a few times per timeout
+                if time.monotonic() >= next_claim:
+                    entries = await self._claim_stale(consumer, free)
+                    if not entries:
+                        next_claim = time.monotonic() + self.visibility_timeout / 4
+                if not entries:
+                    entries = await self._read_new(consumer, free)
+                
+                for entry_id, fields in entries:
+                    tasks.add(asyncio.create_task(self._process(entry_id, fields, handler, consumer)))
+                tasks = {task for task in tasks if not task.done()}
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Error in vision worker loop: {e}")
+                # Recreate the group in case the stream was deleted
+                self._group_ready = False
+                redis_cache._record_failure(e)
+                await asyncio.sleep(1)
+    
+    async def _read_new(self, consumer: str, count: int) -> List[Tuple[str, Dict]]:
+        """Entries never delivered to any consumer, blocking briefly when there are none"""
+        response = await redis_cache.client.xreadgroup(
+            self.group, consumer, {self.stream_key: ">"}, count=count, block=self.read_block_ms
+        )
+        return [entry for _, entries in response or [] for entry in entries]
+    
+    async def _claim_stale(self, consumer: str, count: int) -> List[Tuple[str, Dict]]:
+        """Take over entries pending longer than the visibility timeout"""
+        response = await redis_cache.client.xautoclaim(
+            self.stream_key, self.group, consumer,
+            min_idle_time=self.visibility_timeout * 1000,
+            start_id=self._claim_cursor, count=count
+        )
+        self._claim_cursor = redis_cache._to_str(response[0])
+        # Entries deleted while pending come back without fields
+        return [(entry_id, fields) for entry_id, fields in response[1] if fields]
+    
+    async def _process(self, entry_id, fields: Dict, handler: Callable[..., Awaitable[Dict]], consumer: str):
+        """Run one job; ack it once the outcome is stored, leave it pending to retry if the run crashes"""
+        job_id = redis_cache._to_str(fields.get(b"job_id", fields.get("job_id")))
+        job_key = self._job_key(job_id)
+        client = redis_cache.client
+        
+        try:
+            attempts = await client.hincrby(job_key, "attempts", 1)
+            job = await self.get_job(job_id)
+            image_data = await client.get(self._image_key(job_id))
+            if job is None or image_data is None:
+                logger.warning(f"Job {job_id} expired before it ran, dropping it")
+                await client.delete(job_key)
+                await self._ack(entry_id)
+                return
+            
+            # Finished, but the ack was lost; nothing left to do
+            if job["status"] in TERMINAL_STATES:
+                await self._ack(entry_id)
+                return
+            
+            if attempts > self.max_attempts:
+                logger.error(f"Job {job_id} failed {self.max_attempts} times, moving it to {self.dead_letter_key}")
+                await client.xadd(self.dead_letter_key, {"job_id": job_id, "consumer": consumer}, maxlen=10000, approximate=True)
+                await self._finish(job_id, "failed", error=f"Gave up after {self.max_attempts} attempts")
+                await self._ack(entry_id)
+                return
+            
+            await client.hset(job_key, mapping={
+                "status": "running",
+                "worker": consumer,
+                "started_at": datetime.now().isoformat(),
+            })
+            await self._publish(job_id, "running")
+            
+            extension = self._safe_extension(redis_cache._to_str(await client.hget(job_key, "extension")))
+            location = redis_cache._to_str(await client.hget(job_key, "location")) or None
+        except Exception as e:
+            # Not acked: the entry is claimed again once its visibility timeout passes
+            logger.error(f"Error starting job {job_id} on {consumer}: {e}")
+            redis_cache._record_failure(e)
+            return
+        
+        image_path = None
+        heartbeat = None
+        try:
+            fd, image_path = tempfile.mkstemp(suffix=f".{extension}")
+            with os.fdopen(fd, "wb") as buffer:
+                buffer.write(image_data)
+            
+            heartbeat = asyncio.create_task(self._heartbeat(entry_id, consumer))
+            result = await handler(image_path, job["user_id"], location)
+            
+            # The analysis reports its own errors in the result; those are final
+            if isinstance(result, dict) and result.get("success") is False:
+                await self._finish(job_id, "failed", result=result, error=result.get("error"))
+            else:
+                await self._finish(job_id, "done", result=result)
+            await self._ack(entry_id)
+            logger.info(f"Job {job_id} finished on {consumer} (attempt {attempts})")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Not acked: the entry is retried once its visibility timeout passes
+            logger.error(f"Job {job_id} failed on attempt {attempts}: {e}")
+            try:
+                await client.hset(job_key, mapping={"status": "retrying", "error": str(e)})
+            except Exception as e:
+                logger.error(f"Error marking job {job_id} for retry: {e}")
+                redis_cache._record_failure(e)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if image_path is not None:
+                try:
+                    os.remove(image_path)
+                except OSError:
+                    pass
+    
+    async def _heartbeat(self, entry_id, consumer: str):
+        """Reset the entry's idle time so long analyses are not claimed by another worker"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await redis_cache.client.xclaim(
+                    self.stream_key, self.group, consumer, 0, [entry_id], justid=True
+                )
+            except Exception as e:
+                logger.error(f"Error extending job lease {entry_id}: {e}")
+    
+    async def _finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """Store a job's outcome, drop its upload and notify waiting clients"""
+        job_key = self._job_key(job_id)
+        fields = {"status": status, "finished_at": datetime.now().isoformat()}
+        if result is not None:
+            fields["result"] = json.dumps(result, default=str)
+        if error:
+            fields["error"] = error
+        
+        async with redis_cache.client.pipeline(transaction=True) as pipe:
+            pipe.hset(job_key, mapping=fields)
+            if not error:
+                pipe.hdel(job_key, "error")
+            pipe.expire(job_key, self.result_ttl)
+            pipe.delete(self._image_key(job_id))
+            await pipe.execute()
+        await self._publish(job_id, status)
+    
+    async def _ack(self, entry_id):
+        """Ack and delete a handled entry so the stream holds only unfinished jobs"""
+        async with redis_cache.client.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream_key, self.group, entry_id)
+            pipe.xdel(self.stream_key, entry_id)
+            await pipe.execute()
+    
+    async def _publish(self, job_id: str, status: str):
+        """Tell clients waiting on a job that its status changed"""
+        try:
+            await redis_cache.client.publish(self._channel(job_id), status)
+        except Exception as e:
+            logger.error(f"Error publishing status of job {job_id}: {e}")
+
+# Global room analysis queue instance
+room_analysis_queue = RoomAnalysisQueue()
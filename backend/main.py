@@ -1,31 +1,75 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 import os
 import uuid
 from datetime import datetime
 import shutil
 
 from decision_router import decision_router
+from agents.trend_intel_agent import trend_agent
 from database import supabase_client
 from config import HOST, PORT, DEBUG
 from auth import get_current_user, require_auth, optional_auth
 from cache import redis_cache
 from cache_invalidation import cache_invalidation
+from cache_warmup import cache_warmup
+from cache_memory import cache_memory_sampler
+from rate_limiter import rate_limiter
+from job_queue import JobQueueUnavailable, room_analysis_queue
+from trend_crawler import trend_crawler
 from search import vector_search, search_engine_search, hybrid_search
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One-off background tasks started by requests; held here so they are not
+# garbage collected mid-run
+background_tasks = set()
+
+def _background_task_done(task: asyncio.Task):
+    """Forget a finished background task and log how it failed, if it did"""
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+def start_background_task(coro, name: str) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared Redis pool and background cache work for the app's lifetime"""
+    await redis_cache.connect()
+    cache_warmup.start()
+    cache_memory_sampler.start()
+    if trend_crawler.run_in_api:
+        trend_crawler.start()
+    yield
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await cache_warmup.stop()
+    await cache_memory_sampler.stop()
+    await trend_crawler.stop()
+    await trend_agent.close()
+    await redis_cache.disconnect()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Art.Decor.AI API",
     description="AI-Powered Home Décor Recommendation Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -130,18 +174,40 @@ async def health_check():
         }
     }
 
-@app.post("/api/analyze-room")
+@app.post("/api/analyze-room", dependencies=[Depends(rate_limiter.limit("analyze_room"))])
 async def analyze_room(
     image: UploadFile = File(...),
     location: Optional[str] = Form(None),
+    run_async: bool = Query(False, alias="async"),
     current_user: dict = Depends(require_auth)
 ):
-    """Analyze room image and provide décor recommendations"""
+    """Analyze room image and provide décor recommendations.
+    
+    With ?async=true the analysis is queued for a vision worker and a job ID
+    is returned right away; fetch the result from /api/jobs/{job_id}.
+    """
     try:
         # Validate image file
         if not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
+        if run_async:
+            image_data = await image.read()
+            if len(image_data) > room_analysis_queue.max_image_bytes:
+                raise HTTPException(status_code=413, detail="Image too large")
+            
+            extension = image.filename.split(".")[-1] if image.filename and "." in image.filename else "jpg"
+            job_id = await room_analysis_queue.enqueue(image_data, extension, current_user["user_id"], location)
+            if job_id is None:
+                raise HTTPException(status_code=503, detail="Job queue unavailable, retry without async")
+            
+            return JSONResponse(status_code=202, content={
+                "success": True,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            })
+        
         # Save uploaded image
         image_path = save_uploaded_file(image)
         
@@ -162,6 +228,51 @@ async def analyze_room(
         logger.error(f"Error in room analysis: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/api/jobs/stats")
+async def get_job_queue_stats(current_user: dict = Depends(require_auth)):
+    """Room analysis queue backlog and vision workers (admin only)"""
+    try:
+        # Only allow admin users
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Forbidden")
+        
+        stats = await room_analysis_queue.get_stats()
+        return JSONResponse(content={
+            "success": True,
+            "queue": stats,
+            "timestamp": datetime.now().isoformat()
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting job queue stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: dict = Depends(require_auth)
+):
+    """Status and result of a queued room analysis; wait=N long-polls up to N seconds for it to finish"""
+    try:
+        if wait:
+            job = await room_analysis_queue.wait_for_job(job_id, wait)
+        else:
+            job = await room_analysis_queue.get_job(job_id)
+        
+        if not job or job["user_id"] != current_user["user_id"]:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return JSONResponse(content={"success": True, **job})
+    except JobQueueUnavailable:
+        raise HTTPException(status_code=503, detail="Job queue unavailable, retry later")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/api/text-query")
 async def process_text_query(
     query: str = Form(...),
@@ -248,6 +359,8 @@ async def update_user_profile(
         result = await supabase_client.update_user_preferences(current_user["user_id"], preferences)
         
         if result:
+            # Recommendations, analyses and cached preferences were built from the old preferences
+            await cache_invalidation.invalidate_user_cache(current_user["user_id"])
             return JSONResponse(content={"success": True, "profile": result})
         else:
             raise HTTPException(status_code=500, detail="Failed to update user profile")
@@ -335,7 +448,7 @@ async def update_search_context(
         logger.error(f"Error updating search context: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.get("/api/trends")
+@app.get("/api/trends", dependencies=[Depends(rate_limiter.limit("trends"))])
 async def get_trending_styles(query: str = "interior design trends 2024", max_results: int = 10):
     """Get trending interior design styles"""
     try:
@@ -643,15 +756,9 @@ async def get_recent_activities(current_user: dict = Depends(require_auth)):
 async def get_system_health(current_user: dict = Depends(require_auth)):
     """Get system health metrics"""
     try:
-        # Get Redis health
-        redis_healthy = False
-        try:
-            await redis_cache.connect()
-            if redis_cache.client:
-                await redis_cache.client.ping()
-                redis_healthy = True
-        except:
-            redis_healthy = False
+        # Get Redis health from the shared pool; never opens a new connection
+        redis_health = await redis_cache.health()
+        redis_healthy = redis_health["connected"]
         
         # Get cache stats
         cache_stats = await cache_invalidation.get_cache_stats()
@@ -664,6 +771,7 @@ async def get_system_health(current_user: dict = Depends(require_auth)):
             "api_uptime": 99.9,
             "database_uptime": 99.8,
             "redis_healthy": redis_healthy,
+            "redis_circuit_breaker": redis_health["circuit_breaker"],
             "cache_stats": cache_stats
         }
         
@@ -719,7 +827,7 @@ async def get_analytics_data(
 
 # Search API Endpoints
 
-@app.get("/api/search")
+@app.get("/api/search", dependencies=[Depends(rate_limiter.limit("search"))])
 async def search_items(
     q: str,
     top_k: int = 10,
@@ -795,28 +903,17 @@ async def search_engine_only_search(
 async def redis_health_check():
     """Check Redis connection health"""
     try:
-        await redis_cache.connect()
-        if redis_cache.client:
-            await redis_cache.client.ping()
-            return JSONResponse(content={
-                "status": "healthy",
-                "redis_url": redis_cache.REDIS_URL,
-                "connected": True,
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
-            return JSONResponse(content={
-                "status": "unhealthy",
-                "redis_url": redis_cache.REDIS_URL,
-                "connected": False,
-                "error": "Redis client not initialized",
-                "timestamp": datetime.now().isoformat()
-            })
+        # Reports the shared pool and circuit breaker; reconnecting is the background probe's job
+        redis_health = await redis_cache.health()
+        return JSONResponse(content={
+            "status": "healthy" if redis_health["connected"] else "unhealthy",
+            **redis_health,
+            "timestamp": datetime.now().isoformat()
+        })
     except Exception as e:
         logger.error(f"Redis health check failed: {e}")
         return JSONResponse(content={
             "status": "unhealthy",
-            "redis_url": redis_cache.REDIS_URL,
             "connected": False,
             "error": str(e),
             "timestamp": datetime.now().isoformat()
@@ -836,6 +933,16 @@ async def get_cache_stats(current_user: dict = Depends(require_auth)):
         logger.error(f"Error getting cache stats: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Cache metrics in Prometheus text format, aggregated across workers"""
+    return PlainTextResponse(
+        await redis_cache.namespace_metrics.render_prometheus(
+            redis_cache.client if redis_cache.is_connected else None
+        ),
+        media_type="text/plain; version=0.0.4"
+    )
+
 @app.post("/api/cache/invalidate/user/{user_id}")
 async def invalidate_user_cache(
     user_id: str,
@@ -862,6 +969,33 @@ async def invalidate_user_cache(
         logger.error(f"Error invalidating user cache: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/api/cache/invalidate/type/{cache_type}")
+async def invalidate_cache_type(
+    cache_type: str,
+    current_user: dict = Depends(require_auth)
+):
+    """Invalidate every entry of a cache type, e.g. trend_data (admin only)"""
+    try:
+        # Only allow admin users
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Forbidden")
+        
+        if cache_type not in cache_invalidation.invalidation_patterns:
+            raise HTTPException(status_code=404, detail=f"Unknown cache type: {cache_type}")
+        
+        namespaces = await cache_invalidation.invalidate_cache_type(cache_type)
+        return JSONResponse(content={
+            "success": True,
+            "cache_type": cache_type,
+            "namespaces": namespaces,
+            "timestamp": datetime.now().isoformat()
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error invalidating cache type: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/api/cache/invalidate/trends")
 async def invalidate_stale_trends(
     max_age_hours: int = 6,
@@ -886,6 +1020,47 @@ async def invalidate_stale_trends(
         logger.error(f"Error invalidating stale trends: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/api/cache/warmup")
+async def get_cache_warmup_progress(current_user: dict = Depends(require_auth)):
+    """Progress of the current or last cache warmup pass (admin only)"""
+    try:
+        # Only allow admin users
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Forbidden")
+        
+        progress = await cache_warmup.get_progress()
+        return JSONResponse(content={
+            "success": True,
+            "progress": progress,
+            "timestamp": datetime.now().isoformat()
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting cache warmup progress: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/api/cache/warmup")
+async def start_cache_warmup(current_user: dict = Depends(require_auth)):
+    """Start a cache warmup pass in the background (admin only)"""
+    try:
+        # Only allow admin users
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Forbidden")
+        
+        # Poll GET /api/cache/warmup for progress
+        start_background_task(cache_warmup.run(trigger="manual"), "manual cache warmup")
+        return JSONResponse(content={
+            "success": True,
+            "started": True,
+            "timestamp": datetime.now().isoformat()
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting cache warmup: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/api/cache/warmup/{user_id}")
 async def warm_up_user_cache(
     user_id: str,
@@ -0,0 +1,340 @@
+import hashlib
+import ipaddress
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Refill and take tokens from every bucket in KEYS, all or nothing.
+# ARGV: cost, then (tokens per second, capacity) for each bucket.
+# Returns {1, 0} when allowed, {0, milliseconds until enough tokens} otherwise.
+_TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait_ms = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate / 1000)
+    levels[i] = tokens
+    if tokens < cost then
+        wait_ms = math.max(wait_ms, math.ceil((cost - tokens) * 1000 / rate))
+    end
+end
+if wait_ms > 0 then
+    return {0, wait_ms}
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', levels[i] - cost, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 1000)
+end
+return {1, 0}
+"""
+
+# Take one slot in every holder set in KEYS, all or nothing. Holders are scored
+# by lease expiry so slots held by a crashed worker free themselves.
+# ARGV: holder token, lease milliseconds, then the slot limit for each set.
+_SEMAPHORE_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local lease = tonumber(ARGV[2])
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[i + 2]) then
+        return 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now + lease, ARGV[1])
+    redis.call('PEXPIRE', key, lease)
+end
+return 1
+"""
+
+class RateLimiter:
+    """Per-route, per-user token buckets and concurrency limits shared by all workers.
+    
+    Buckets and semaphores live in Redis and are updated by Lua scripts, so a
+    check is one atomic round trip. While Redis is unavailable the same limits
+    are enforced in-process, per worker.
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+        self.key_prefix = "ratelimit"
+        
+        # Per user: per_minute/burst token bucket and concurrent requests.
+        # Across all users: optional global bucket and concurrency (0 disables).
+        self.routes = {
+            # Vision model calls are the most expensive thing the API does
+            'analyze_room': self._route_settings(
+                'ANALYZE_ROOM', per_minute=10, burst=5, concurrency=2,
+                global_concurrency=8, lease_seconds=120
+            ),
+            # Every search spends Google Custom Search quota; keep the global
+            # rate within the project's daily quota
+            'search': self._route_settings(
+                'SEARCH', per_minute=30, burst=10, concurrency=4,
+                global_per_minute=60, lease_seconds=30
+            ),
+            # Trend lookups rank the crawled trend store in memory, so they are cheap
+            'trends': self._route_settings(
+                'TRENDS', per_minute=60, burst=20, concurrency=4,
+                global_concurrency=64, lease_seconds=30
+            ),
+        }
+        
+        # Reverse proxies (IPs or CIDRs, comma-separated) whose X-Forwarded-For is
+        # trusted; without them everyone behind a proxy shares its address limits
+        self.trusted_proxies = self._parse_networks(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', ''))
+        
+        # Retry-After sent when only the concurrency limit was hit
+        self.concurrency_retry_after = int(os.getenv('RATE_LIMIT_CONCURRENCY_RETRY_AFTER', 2))
+        
+        self._scripts = {}
+        
+        # In-process fallback state: bucket key -> (tokens, updated_at), semaphore key -> holders
+        self._local_buckets: Dict[str, Tuple[float, float]] = {}
+        self._local_holders: Dict[str, int] = {}
+        self.max_local_buckets = 10000
+    
+    @staticmethod
+    def _route_settings(name: str, per_minute: float, burst: int, concurrency: int,
+                        global_per_minute: float = 0, global_concurrency: int = 0,
+                        lease_seconds: int = 60) -> Dict:
+        """Route limits with RATE_LIMIT_<ROUTE>_* environment overrides"""
+        prefix = f"RATE_LIMIT_{name}"
+        return {
+            'per_minute': float(os.getenv(f'{prefix}_PER_MINUTE', per_minute)),
+            'burst': int(os.getenv(f'{prefix}_BURST', burst)),
+            'concurrency': int(os.getenv(f'{prefix}_CONCURRENCY', concurrency)),
+            'global_per_minute': float(os.getenv(f'{prefix}_GLOBAL_PER_MINUTE', global_per_minute)),
+            'global_concurrency': int(os.getenv(f'{prefix}_GLOBAL_CONCURRENCY', global_concurrency)),
+            'lease_seconds': int(os.getenv(f'{prefix}_LEASE_SECONDS', lease_seconds)),
+        }
+    
+    def limit(self, route: str):
+        """FastAPI dependency enforcing a route's limits; answers 429 with Retry-After when exceeded"""
+        async def dependency(request: Request):
+            lease = await self.acquire(route, self._identities(request))
+            try:
+                yield
+            finally:
+                await self.release(lease)
+        return dependency
+    
+    @staticmethod
+    def _parse_networks(value: str) -> List:
+        """Networks from a comma-separated list of IPs and CIDRs, skipping invalid entries"""
+        networks = []
+        for entry in filter(None, (part.strip() for part in value.split(","))):
+            try:
+                networks.append(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                logger.warning(f"Ignoring invalid trusted proxy {entry!r}")
+        return networks
+    
+    def _is_trusted_proxy(self, address: str) -> bool:
+        """Whether an address belongs to one of our reverse proxies"""
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+    
+    def _client_address(self, request: Request) -> str:
+        """The address a request came from, looking through trusted reverse proxies"""
+        host = request.client.host if request.client else "unknown"
+        if not self._is_trusted_proxy(host):
+            return host
+        
+        # Each proxy appends the address it saw; walk back past our own hops
+        forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+        for address in reversed(forwarded):
+            if not self._is_trusted_proxy(address):
+                return address
+        return forwarded[0] if forwarded else host
+    
+    def _identities(self, request: Request) -> List[str]:
+        """Who a request is limited as: always its client address, plus its bearer token.
+        
+        The token is hashed rather than verified so limiting never adds an
+        auth round trip; each signed-in session maps to one user. Since an
+        unverified token costs nothing to change, the address limits apply too.
+        """
+        identities = [f"ip:{self._client_address(request)}"]
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            identities.append("user:" + hashlib.sha256(auth_header[7:].encode()).hexdigest()[:24])
+        return identities
+    
+    async def acquire(self, route: str, identities: List[str]) -> Optional[Dict]:
+        """Take one token and one concurrency slot for every identity, or raise HTTPException(429)"""
+        settings = self.routes.get(route)
+        if not self.enabled or settings is None:
+            return None
+        
+        buckets = self._buckets(route, identities, settings)
+        semaphores = self._semaphores(route, identities, settings)
+        lease = {
+            "route": route,
+            "semaphores": [key for key, _ in semaphores],
+            "token": uuid.uuid4().hex,
+            "local": not redis_cache.is_connected,
+        }
+        
+        # Slots are taken first and handed back when the bucket is empty, so
+        # requests turned away for concurrency do not spend tokens
+        allowed, retry_after = False, self.concurrency_retry_after
+        if not lease["local"]:
+            acquired = False
+            try:
+                acquired = not semaphores or await self._acquire_slots(semaphores, lease["token"], settings['lease_seconds'])
+                if acquired:
+                    allowed, retry_after = await self._take_tokens(buckets)
+            except Exception as e:
+                logger.error(f"Error checking rate limit for {route}, limiting in-process: {e}")
+                redis_cache._record_failure(e)
+                lease["local"] = True
+            finally:
+                # Hand back Redis slots when the bucket was empty or could not be checked
+                if acquired and not allowed:
+                    await self.release({**lease, "local": False})
+        
+        if lease["local"]:
+            if self._acquire_local_slots(semaphores):
+                allowed, retry_after = self._take_local_tokens(buckets)
+                if not allowed:
+                    await self.release(lease)
+        
+        if not allowed:
+            logger.info(f"Rate limited {', '.join(identities)} on {route}, retry after {retry_after}s")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+        return lease
+    
+    async def release(self, lease: Optional[Dict]):
+        """Give back the concurrency slots taken by acquire"""
+        if not lease or not lease["semaphores"]:
+            return
+        
+        if lease["local"]:
+            for key in lease["semaphores"]:
+                self._local_holders[key] = max(0, self._local_holders.get(key, 0) - 1)
+            return
+        
+        try:
+            pipe = redis_cache.client.pipeline(transaction=False)
+            for key in lease["semaphores"]:
+                pipe.zrem(key, lease["token"])
+            await pipe.execute()
+        except Exception as e:
+            # The slot frees itself when its lease expires
+            logger.error(f"Error releasing rate limit slot for {lease['route']}: {e}")
+            redis_cache._record_failure(e)
+    
+    def _buckets(self, route: str, identities: List[str], settings: Dict) -> List[Tuple[str, float, int]]:
+        """(key, tokens per second, capacity) of every bucket a request draws from"""
+        buckets = [
+            (f"{self.key_prefix}:{route}:{identity}", settings['per_minute'] / 60, settings['burst'])
+            for identity in identities
+        ]
+        if settings['global_per_minute'] > 0:
+            # Allow a burst of up to a minute's worth across all users
+            capacity = max(1, int(settings['global_per_minute']))
+            buckets.append((f"{self.key_prefix}:{route}:global", settings['global_per_minute'] / 60, capacity))
+        return buckets
+    
+    def _semaphores(self, route: str, identities: List[str], settings: Dict) -> List[Tuple[str, int]]:
+        """(key, slot limit) of every concurrency limit a request holds a slot in"""
+        semaphores = []
+        if settings['concurrency'] > 0:
+            semaphores += [
+                (f"{self.key_prefix}:{route}:active:{identity}", settings['concurrency'])
+                for identity in identities
+            ]
+        if settings['global_concurrency'] > 0:
+            semaphores.append((f"{self.key_prefix}:{route}:active:global", settings['global_concurrency']))
+        return semaphores
+    
+    def _script(self, name: str, source: str):
+        """Script object that runs by EVALSHA and loads itself on a cache miss"""
+        if name not in self._scripts:
+            self._scripts[name] = redis_cache.client.register_script(source)
+        return self._scripts[name]
+    
+    async def _take_tokens(self, buckets: List[Tuple[str, float, int]]) -> Tuple[bool, int]:
+        """Token bucket check in Redis; returns (allowed, retry after seconds)"""
+        args = [1]
+        for _, rate, capacity in buckets:
+            args += [rate, capacity]
+        script = self._script("token_bucket", _TOKEN_BUCKET_SCRIPT)
+        allowed, wait_ms = await script(
+            keys=[key for key, _, _ in buckets], args=args, client=redis_cache.client
+        )
+        return bool(allowed), max(1, math.ceil(int(wait_ms) / 1000))
+    
+    async def _acquire_slots(self, semaphores: List[Tuple[str, int]], token: str, lease_seconds: int) -> bool:
+        """Concurrency slots in Redis, leased for lease_seconds"""
+        script = self._script("semaphore", _SEMAPHORE_ACQUIRE_SCRIPT)
+        acquired = await script(
+            keys=[key for key, _ in semaphores],
+            args=[token, lease_seconds * 1000] + [limit for _, limit in semaphores],
+            client=redis_cache.client
+        )
+        return bool(acquired)
+    
+    def _take_local_tokens(self, buckets: List[Tuple[str, float, int]]) -> Tuple[bool, int]:
+        """Token bucket check against this worker's own buckets"""
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, rate, capacity in buckets:
+            tokens, updated = self._local_buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            levels.append(tokens)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+        
+        if wait > 0:
+            return False, max(1, math.ceil(wait))
+        
+        if len(self._local_buckets) >= self.max_local_buckets:
+            self._prune_local_buckets(now)
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._local_buckets[key] = (tokens - 1, now)
+        return True, 0
+    
+    def _acquire_local_slots(self, semaphores: List[Tuple[str, int]]) -> bool:
+        """Concurrency slots counted in this worker only"""
+        if any(self._local_holders.get(key, 0) >= limit for key, limit in semaphores):
+            return False
+        for key, _ in semaphores:
+            self._local_holders[key] = self._local_holders.get(key, 0) + 1
+        return True
+    
+    def _prune_local_buckets(self, now: float):
+        """Forget buckets idle for over a minute, which have refilled at the default rates"""
+        self._local_buckets = {
+            key: state for key, state in self._local_buckets.items() if now - state[1] < 60
+        }
+        self._local_holders = {key: count for key, count in self._local_holders.items() if count}
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
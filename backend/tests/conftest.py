@@ -0,0 +1,27 @@
+import os
+import sys
+import fakeredis
+import pytest
+
+# Tests import the backend's flat modules the way the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import RedisCache
+
+@pytest.fixture
+def fake_redis():
+    """Factory connecting RedisCache instances to one in-memory Redis server.
+
+    Call it inside the test's event loop; each call is another worker
+    sharing the same server. Disconnect the caches before the loop ends.
+    """
+    server = fakeredis.FakeServer()
+    
+    async def connect(cache=None):
+        cache = cache or RedisCache()
+        cache.client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=False)
+        await cache.connect()
+        return cache
+    
+    connect.server = server
+    return connect
@@ -0,0 +1,49 @@
+import asyncio
+
+def test_mset_then_mget_returns_values_aligned_with_keys(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            preferences = cache.make_key("user_preferences", user_id="u1")
+            analysis = cache.make_key("room_analysis", "image", user_id="u1")
+            missing = cache.make_key("color_palette", "unknown")
+            
+            assert await cache.mset(
+                {preferences: {"style": "modern"}, analysis: {"walls": 4}},
+                ttls={analysis: 120}, owners={preferences: "u1", analysis: "u1"}
+            )
+            assert await cache.mget([missing, analysis, preferences]) == [None, {"walls": 4}, {"style": "modern"}]
+            
+            assert 120 <= await cache.store.ttl(analysis) <= 120 * (1 + cache.ttl_jitter)
+            registered = {cache._to_str(key) for key in await cache.client.smembers(cache._user_registry_key("u1"))}
+            assert registered == {preferences, analysis}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_mget_serves_l1_namespaces_without_redis(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            trends = cache.make_key("trend_data", "japandi")
+            analysis = cache.make_key("room_analysis", "image")
+            await cache.mset({trends: ["japandi"], analysis: {"walls": 4}})
+            await cache.store.flushall()
+            
+            # Only the L1-backed namespace survives Redis losing its data
+            assert await cache.mget([trends, analysis]) == [["japandi"], None]
+            assert cache.metrics["l1_hits"] == 1
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_mget_without_redis_returns_misses(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        await cache.disconnect()
+        assert await cache.mget(["room_analysis:v1:a", "room_analysis:v1:b"]) == [None, None]
+        assert not await cache.mset({"room_analysis:v1:a": 1})
+    
+    asyncio.run(scenario())
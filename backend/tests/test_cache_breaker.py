@@ -0,0 +1,77 @@
+import asyncio
+import time
+import redis.asyncio as redis
+from cache import CircuitBreaker
+
+def test_breaker_opens_after_threshold_failures_within_window(monkeypatch):
+    now = {"seconds": 1000.0}
+    monkeypatch.setattr(time, "monotonic", lambda: now["seconds"])
+    breaker = CircuitBreaker(failure_threshold=3, window_seconds=10)
+    
+    assert not breaker.record_failure()
+    now["seconds"] += 11
+    # The first failure has left the window
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.is_open and breaker.trips == 1
+    
+    # Further failures while open do not trip it again
+    assert not breaker.record_failure()
+    breaker.close()
+    assert not breaker.is_open
+    assert breaker.get_stats() == {"state": "closed", "open_for_seconds": 0, "trips": 1}
+
+def test_connection_failures_open_the_breaker_until_redis_answers(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        cache.reconnect_base_delay = 0.05
+        key = cache.make_key("room_analysis", "breaker")
+        await cache.set(key, {"walls": 4})
+        
+        attempts = []
+        working_get = cache.store.get
+        
+        async def failing_get(*args, **kwargs):
+            attempts.append(1)
+            raise redis.ConnectionError("connection refused")
+        
+        try:
+            cache.store.get = failing_get
+            for _ in range(cache.breaker.failure_threshold):
+                assert await cache.get(key) is None
+            assert cache.breaker.is_open
+            assert not cache.is_connected
+            
+            # While open, calls fall through without touching Redis
+            assert await cache.get(key) is None
+            assert not await cache.set(key, {"walls": 5})
+            assert len(attempts) == cache.breaker.failure_threshold
+            
+            # The background probe pings, succeeds and closes the breaker
+            cache.store.get = working_get
+            await asyncio.wait_for(cache._reconnect_task, 2)
+            assert not cache.breaker.is_open
+            assert cache.is_connected
+            assert await cache.get(key) == {"walls": 4}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_other_errors_do_not_open_the_breaker(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        
+        async def bad_reply(*args, **kwargs):
+            raise redis.ResponseError("WRONGTYPE")
+        
+        try:
+            cache.store.get = bad_reply
+            for _ in range(cache.breaker.failure_threshold * 2):
+                assert await cache.get(cache.make_key("room_analysis", "x")) is None
+            assert not cache.breaker.is_open
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
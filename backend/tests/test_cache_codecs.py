@@ -0,0 +1,64 @@
+import asyncio
+import json
+import pytest
+from cache_codecs import CacheCodec, HEADER_FLAG
+
+VALUE = {
+    "style": "scandinavian",
+    "palette": [{"hex": "#c8b4a0", "percentage": 35.2}],
+    "embedding": [0.125, -0.5, 1.0],
+    "tags": ["minimal", "oak"],
+    "confidence": None,
+}
+
+@pytest.mark.parametrize("serializer", ["json", "orjson", "msgpack"])
+@pytest.mark.parametrize("compression", ["none", "zlib", "lz4"])
+def test_round_trip(serializer, compression):
+    codec = CacheCodec(serializer, compression, compress_threshold=0)
+    encoded = codec.encode(VALUE)
+    assert encoded[0] & HEADER_FLAG
+    assert codec.decode(encoded) == VALUE
+
+def test_large_values_are_compressed_and_small_ones_are_not():
+    codec = CacheCodec("json", "zlib", compress_threshold=1024)
+    large = {"content": "warm terracotta tones " * 500}
+    encoded = codec.encode(large)
+    assert len(encoded) < len(json.dumps(large))
+    assert codec.decode(encoded) == large
+    
+    codec.encode({"a": 1})
+    assert codec.get_stats()["compressed_count"] == 1
+
+def test_any_codec_decodes_values_written_by_another():
+    written = CacheCodec("msgpack", "zlib", compress_threshold=0).encode(VALUE)
+    assert CacheCodec("orjson", "none").decode(written) == VALUE
+
+@pytest.mark.parametrize("legacy", [
+    json.dumps(VALUE).encode(),
+    json.dumps(VALUE),
+    b"[1, 2, 3]",
+    b'"plain string"',
+])
+def test_legacy_plain_json_is_decoded(legacy):
+    codec = CacheCodec("orjson", "zlib")
+    assert codec.decode(legacy) == json.loads(legacy)
+
+def test_unknown_serializer_is_rejected():
+    with pytest.raises(ValueError):
+        CacheCodec("pickle")
+
+def test_cache_round_trips_legacy_entries(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("room_analysis", "legacy")
+            await cache.store.set(key, json.dumps({"walls": 4}))
+            assert await cache.get(key) == {"walls": 4}
+            
+            await cache.set(key, VALUE)
+            assert (await cache.store.get(key))[0] & HEADER_FLAG
+            assert await cache.get(key) == VALUE
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
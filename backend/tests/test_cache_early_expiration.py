@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+from cache import RedisCache
+
+def _envelope(expires_in: float, delta: float = 2.0):
+    return {"__envelope__": 1, "value": ["print"], "delta": delta, "expires_at": time.time() + expires_in}
+
+def test_expires_early_only_for_namespaces_with_a_beta(monkeypatch):
+    cache = RedisCache()
+    monkeypatch.setattr(random, "random", lambda: 0.999999)
+    envelope = _envelope(expires_in=5)
+    
+    assert cache._expires_early("trend_data:v1:a", envelope, envelope["expires_at"])
+    assert not cache._expires_early("room_analysis:v1:a", envelope, envelope["expires_at"])
+    # No recorded compute time, no early recompute
+    envelope["delta"] = 0
+    assert not cache._expires_early("trend_data:v1:a", envelope, envelope["expires_at"])
+
+def test_expires_early_probability_rises_toward_the_deadline(monkeypatch):
+    cache = RedisCache()
+    # -ln(1 - 0.5) * delta 2.0 * beta 1.0 is about 1.4 seconds early
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    assert not cache._expires_early("trend_data:v1:a", _envelope(expires_in=60), time.time() + 60)
+    assert cache._expires_early("trend_data:v1:a", _envelope(expires_in=1), time.time() + 1)
+    assert cache._expires_early("trend_data:v1:a", _envelope(expires_in=-1), time.time() - 1)
+    
+    # Slower computations start refreshing earlier
+    assert cache._expires_early("trend_data:v1:a", _envelope(expires_in=10, delta=20), time.time() + 10)
+
+def test_jittered_ttl_only_lengthens_within_the_jitter():
+    cache = RedisCache()
+    cache.ttl_jitter = 0.1
+    ttls = {cache._jittered_ttl(1000) for _ in range(200)}
+    assert min(ttls) >= 1000 and max(ttls) <= 1100
+    assert len(ttls) > 1
+    
+    cache.ttl_jitter = 0
+    assert cache._jittered_ttl(1000) == 1000
+
+def test_mget_reports_an_early_recompute_as_a_miss(fake_redis, monkeypatch):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("artwork_recommendations", "modern", user_id="u1")
+            await cache.set(key, _envelope(expires_in=5), 60)
+            
+            monkeypatch.setattr(random, "random", lambda: 0.0)
+            assert await cache.mget([key]) == [["print"]]
+            
+            monkeypatch.setattr(random, "random", lambda: 0.999999)
+            assert await cache.mget([key]) == [None]
+            assert cache.metrics["early_recomputes"] == 1
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_get_or_set_envelopes_recompute_early_through_mget_and_single_flight(fake_redis, monkeypatch):
+    calls = []
+    
+    async def recommend():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["print", len(calls)]
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("artwork_recommendations", "boho", user_id="u1")
+            assert await cache.get_or_set(key, recommend, 60) == ["print", 1]
+            
+            monkeypatch.setattr(random, "random", lambda: 0.0)
+            assert await cache.mget([key]) == [["print", 1]]
+            
+            # Close to the deadline relative to the compute time: this reader refreshes
+            monkeypatch.setattr(time, "time", lambda real=time.time: real() + 59.99)
+            monkeypatch.setattr(random, "random", lambda: 0.999999)
+            cached = await cache.mget([key])
+            assert cached == [None]
+            assert await cache.single_flight(key, recommend, 60) == ["print", 2]
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import pytest
+
+def test_delete_older_than_removes_only_stale_entries(fake_redis, monkeypatch):
+    real_time = time.time
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            keys = [cache.make_key("trend_data", f"query{hours}") for hours in range(10)]
+            for hours, key in enumerate(keys):
+                # Written 10, 9, ..., 1 hours ago
+                monkeypatch.setattr(time, "time", lambda hours=hours: real_time() - (10 - hours) * 3600)
+                await cache.set(key, {"hours": hours}, 86400)
+            monkeypatch.setattr(time, "time", real_time)
+            await cache.set(cache.make_key("room_analysis", "unindexed"), {"walls": 4}, 60)
+            
+            assert await cache.store.zcard(cache._expiry_index_key("trend_data")) == 10
+            assert await cache.delete_older_than("trend_data", 6 * 3600) == 5
+            
+            assert await cache.store.zcard(cache._expiry_index_key("trend_data")) == 5
+            assert [await cache.get(key) for key in keys[:5]] == [None] * 5
+            assert await cache.get(keys[9]) == {"hours": 9}
+            assert await cache.delete_older_than("trend_data", 6 * 3600) == 0
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_entries_that_expired_through_ttl_are_only_dropped_from_the_index(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("trend_data", "expired")
+            await cache.set(key, ["old"], 3600)
+            await cache.store.delete(key)
+            assert await cache.delete_older_than("trend_data", 0) == 0
+            assert await cache.store.zcard(cache._expiry_index_key("trend_data")) == 0
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_namespaces_without_an_index_are_rejected(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            with pytest.raises(ValueError):
+                await cache.delete_older_than("room_analysis", 60)
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+def test_user_invalidation_makes_every_old_key_miss(fake_redis):
+    async def scenario():
+        writer = await fake_redis()
+        reader = await fake_redis()
+        try:
+            old_keys = [
+                writer.make_key("user_preferences", user_id="u1"),
+                writer.make_key("room_analysis", "image", user_id="u1"),
+                writer.make_key("artwork_recommendations", "modern", user_id="u1"),
+            ]
+            expired = writer.make_key("color_palette", "image", user_id="u1")
+            other_user = writer.make_key("user_preferences", user_id="u2")
+            for key in old_keys + [expired]:
+                await writer.set(key, {"key": key}, ttl=600, user_id="u1")
+            await writer.set(other_user, {"key": other_user}, ttl=600, user_id="u2")
+            await writer.store.delete(expired)
+            
+            # The registry's size is reported without reading its keys, and the registry is dropped
+            assert await writer.invalidate_user_cache("u1") == len(old_keys) + 1
+            assert not await writer.store.exists(writer._user_registry_key("u1"))
+            
+            # Give the other worker's listener a moment to hear about the bump
+            for _ in range(50):
+                if reader.generations.get("user:u1"):
+                    break
+                await asyncio.sleep(0.01)
+            for cache in (writer, reader):
+                new_keys = [
+                    cache.make_key("user_preferences", user_id="u1"),
+                    cache.make_key("room_analysis", "image", user_id="u1"),
+                    cache.make_key("artwork_recommendations", "modern", user_id="u1"),
+                ]
+                assert not set(new_keys) & set(old_keys)
+                assert [await cache.get(key) for key in new_keys] == [None, None, None]
+                assert cache.make_key("user_preferences", user_id="u2") == other_user
+                assert await cache.get(other_user) == {"key": other_user}
+        finally:
+            await writer.disconnect()
+            await reader.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_user_generations_are_pruned_once_old_entries_expire(monkeypatch, fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        worker = await fake_redis()
+        try:
+            first = await cache.bump_generation(user_id="u1")
+            await cache.bump_generation(user_id="u2")
+            await worker.refresh_generations()
+            assert await cache.prune_generations() == 0
+            
+            # Past the longest entry lifetime, u1's field goes; u2 was bumped again since
+            bumped_at = time.time()
+            monkeypatch.setattr(time, "time", lambda: bumped_at + cache.generation_retention / 2)
+            await cache.bump_generation(user_id="u2")
+            monkeypatch.setattr(time, "time", lambda: bumped_at + cache.generation_retention + 1)
+            assert await cache.prune_generations() == 1
+            
+            fields = {cache._to_str(field) for field in await cache.client.hkeys(cache.generations_key)}
+            assert fields == {"user:u2"}
+            assert "user:u1" not in cache.generations
+            for _ in range(50):
+                if "user:u1" not in worker.generations:
+                    break
+                await asyncio.sleep(0.01)
+            assert "user:u1" not in worker.generations
+            
+            # A later bump never hands u1 a generation it had before
+            assert await cache.bump_generation(user_id="u1") > first
+        finally:
+            await cache.disconnect()
+            await worker.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_user_generation_moves_past_a_legacy_counter(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            await cache.client.hset(cache.generations_key, "user:u1", 7)
+            assert await cache.bump_generation(user_id="u1") == 8
+            assert await cache.bump_generation(user_id="u2") == 9
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,159 @@
+import asyncio
+
+def test_writes_count_only_keys_they_create(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            analysis = cache.make_key("room_analysis", "image")
+            palette = cache.make_key("color_palette", "image")
+            await cache.set(analysis, {"walls": 4}, ttl=60)
+            # Overwriting an existing key leaves the count alone
+            await cache.set(analysis, {"walls": 5}, ttl=60)
+            await cache.mset({analysis: {"walls": 6}, palette: ["#fff"]})
+            assert cache.inventory._pending["room_analysis"] == 1
+            assert cache.inventory._pending["color_palette"] == 1
+            
+            await cache.delete(palette)
+            await cache.delete(palette)
+            counts = await cache.inventory.get_counts(cache.client)
+            assert counts["counts"]["room_analysis"] == 1
+            assert counts["counts"]["color_palette"] == 0
+            assert counts["total"] == 1
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_reconciliation_replaces_the_counts_with_a_scan(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            cache.inventory.scan_count = 2
+            keys = [cache.make_key("room_analysis", f"image-{i}") for i in range(5)]
+            await cache.mset({key: {"walls": 4} for key in keys})
+            await cache.inventory.flush(cache.client)
+            # Keys expiring without notifications leave the counters too high
+            await cache.store.delete(*keys[:2])
+            assert (await cache.inventory.get_counts(cache.client))["counts"]["room_analysis"] == 5
+            
+            counts = await cache.inventory.reconcile(cache.store, cache.client)
+            assert counts["room_analysis"] == 3
+            stats = await cache.inventory.get_counts(cache.client)
+            assert stats["counts"]["room_analysis"] == 3
+            assert stats["reconciled_at"] is not None
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+class SnapshotScan:
+    """Serves a SCAN walk from the keys present when it started, shared by every worker.
+
+    fakeredis cursors are offsets into the sorted keyspace, so keys written
+    mid-walk (like the walk's own state) shift them; Redis cursors do not.
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self.snapshot = []
+    
+    async def scan(self, cursor=0, count=None, **kwargs):
+        if cursor == 0:
+            self.snapshot = sorted([key async for key in self.client.scan_iter()])
+        batch = self.snapshot[cursor:cursor + count]
+        cursor += count
+        return (cursor if cursor < len(self.snapshot) else 0), batch
+
+def test_reconciliation_resumes_from_the_stored_cursor_within_its_budget(fake_redis):
+    async def scenario():
+        workers = [await fake_redis(), await fake_redis()]
+        try:
+            keys = [workers[0].make_key("room_analysis", f"image-{i}") for i in range(9)]
+            await workers[0].mset({key: {"walls": 4} for key in keys})
+            for worker in workers:
+                # One SCAN call per step
+                worker.inventory.scan_count = 2
+                worker.inventory.scan_time_budget = 0
+            
+            # Workers take turns; each step picks up where the previous one stopped
+            store = SnapshotScan(workers[0].store)
+            steps = 0
+            counts = None
+            while counts is None:
+                worker = workers[steps % 2]
+                counts = await worker.inventory.reconcile(store, worker.client)
+                steps += 1
+            assert steps > 2
+            assert counts["room_analysis"] == len(keys)
+            assert not await workers[0].client.exists(workers[0].inventory.scan_state_key)
+            stats = await workers[1].inventory.get_counts(workers[1].client)
+            assert stats["counts"]["room_analysis"] == len(keys)
+        finally:
+            for worker in workers:
+                await worker.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_one_worker_walks_the_keyspace_under_the_reconcile_lease(fake_redis):
+    async def scenario():
+        walker, other = await fake_redis(), await fake_redis()
+        try:
+            keys = [walker.make_key("room_analysis", f"image-{i}") for i in range(9)]
+            await walker.mset({key: {"walls": 4} for key in keys})
+            walker.inventory.scan_count = 2
+            walker.inventory.scan_time_budget = 0
+            
+            token = await walker.inventory._reconcile_step(walker, None)
+            assert token is not None
+            # The walk in progress keeps the lease; other workers leave it alone
+            assert await other.inventory._reconcile_step(other, None) is None
+            while token:
+                token = await walker.inventory._reconcile_step(walker, token)
+            assert (await other.inventory.get_counts(other.client))["reconciled_at"] is not None
+            # Once done, the lease is left to expire so the interval is not reconciled twice
+            assert await other.inventory._reconcile_step(other, None) is None
+        finally:
+            await walker.disconnect()
+            await other.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_counts_are_approximate_without_keyspace_notifications(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            # The in-memory server, like many managed ones, rejects CONFIG SET
+            assert not await cache.inventory.enable_keyspace_events(cache)
+            assert (await cache.inventory.get_counts(cache.client))["approximate"]
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+class ConfigurableNode:
+    """Redis node that accepts CONFIG GET/SET of notify-keyspace-events"""
+    
+    def __init__(self, flags):
+        self.flags = flags
+    
+    async def config_get(self, name):
+        return {name: self.flags}
+    
+    async def config_set(self, name, value):
+        self.flags = value
+        return True
+
+def test_keyspace_notifications_are_added_to_existing_flags(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        store = cache.store
+        try:
+            for flags, expected in [("", "Exe"), ("Kg", "KgExe"), ("KEA", "KEA"), ("Ex", "Exe")]:
+                cache.store = ConfigurableNode(flags)
+                assert await cache.inventory.enable_keyspace_events(cache)
+                assert cache.store.flags == expected
+        finally:
+            cache.store = store
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from cache import L1Cache, _MISSING
+
+def test_l1_evicts_least_recently_used():
+    l1 = L1Cache(max_entries=2, ttl_settings={"trend_data": 60})
+    l1.set("a", 1, "trend_data")
+    l1.set("b", 2, "trend_data")
+    assert l1.get("a") == 1
+    l1.set("c", 3, "trend_data")
+    assert l1.get("b") is _MISSING
+    assert l1.get("a") == 1 and l1.get("c") == 3
+
+def test_l1_ttl_is_capped_by_namespace_and_ignores_other_namespaces(monkeypatch):
+    l1 = L1Cache(ttl_settings={"trend_data": 10})
+    l1.set("a", 1, "trend_data", ttl=3600)
+    l1.set("b", 2, "room_analysis")
+    assert l1.get("b") is _MISSING
+    
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert l1.get("a") is _MISSING
+
+def test_set_on_one_worker_invalidates_l1_on_another(fake_redis):
+    async def scenario():
+        writer, reader = await fake_redis(), await fake_redis()
+        try:
+            # Let both invalidation listeners subscribe
+            await asyncio.sleep(0.05)
+            await writer.cache_user_preferences("u1", {"style": "modern"})
+            assert await reader.get_cached_user_preferences("u1") == {"style": "modern"}
+            assert await reader.get_cached_user_preferences("u1") == {"style": "modern"}
+            assert reader.metrics["l1_hits"] == 1
+            
+            await writer.cache_user_preferences("u1", {"style": "boho"})
+            await asyncio.sleep(0.05)
+            assert reader.metrics["l1_invalidations_received"] >= 1
+            assert await reader.get_cached_user_preferences("u1") == {"style": "boho"}
+        finally:
+            await writer.disconnect()
+            await reader.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import asyncio
+import random
+
+import cache_memory
+from cache_memory import CacheMemorySampler
+
+class ScanRecorder:
+    """Wraps a Redis client, recording the cursor of every SCAN"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.cursors = []
+    
+    async def scan(self, cursor=0, **kwargs):
+        self.cursors.append(cursor)
+        return await self.client.scan(cursor=cursor, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+async def populate(cache, analyses, palettes):
+    await cache.mset({cache.make_key("room_analysis", f"image-{i}"): {"walls": i} for i in range(analyses)})
+    await cache.mset({cache.make_key("color_palette", f"image-{i}"): ["#fff"] * 20 for i in range(palettes)})
+
+def test_large_keyspace_is_sampled_from_a_random_cursor_within_budget(monkeypatch, fake_redis):
+    sampler = CacheMemorySampler()
+    sampler.scan_budget = 60
+    sampler.scan_count = 10
+    sampler.sample_size = 5
+    monkeypatch.setattr(random, "getrandbits", lambda bits: 40)
+    
+    async def scenario():
+        cache = await fake_redis()
+        monkeypatch.setattr(cache_memory, "redis_cache", cache)
+        store = cache.store
+        cache.store = ScanRecorder(store)
+        try:
+            await populate(cache, analyses=150, palettes=50)
+            sample = await sampler.sample()
+            cursors = cache.store.cursors
+            
+            # The walk starts at the random cursor and stops once the budget is spent
+            assert cursors[0] == 40
+            assert len(cursors) == 6
+            assert sample["total_keys"] == 200
+            assert 60 <= sample["examined_keys"] < 60 + sampler.scan_count
+            
+            namespaces = sample["namespaces"]
+            assert set(namespaces) == {"room_analysis", "color_palette"}
+            for estimate in namespaces.values():
+                assert estimate["sampled_keys"] == 5
+                assert estimate["estimated_bytes"] == round(estimate["avg_bytes"] * estimate["estimated_keys"])
+            # The slice's namespace mix is scaled up to the whole keyspace
+            assert sum(estimate["estimated_keys"] for estimate in namespaces.values()) == 200
+            assert namespaces["color_palette"]["avg_bytes"] > namespaces["room_analysis"]["avg_bytes"]
+            
+            # Other workers read the published sample without scanning
+            assert await CacheMemorySampler().get_latest() == sample
+        finally:
+            cache.store = store
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_small_keyspace_is_walked_from_the_start_for_exact_counts(monkeypatch, fake_redis):
+    sampler = CacheMemorySampler()
+    monkeypatch.setattr(random, "getrandbits", lambda bits: 40)
+    
+    async def scenario():
+        cache = await fake_redis()
+        monkeypatch.setattr(cache_memory, "redis_cache", cache)
+        try:
+            await populate(cache, analyses=30, palettes=10)
+            return await sampler.sample()
+        finally:
+            await cache.disconnect()
+    
+    sample = asyncio.run(scenario())
+    assert sample["examined_keys"] == 40
+    assert sample["namespaces"]["room_analysis"]["estimated_keys"] == 30
+    assert sample["namespaces"]["color_palette"]["estimated_keys"] == 10
+
+def test_one_worker_samples_per_interval(monkeypatch, fake_redis):
+    samplers = [CacheMemorySampler(), CacheMemorySampler()]
+    sampled = []
+    for worker, sampler in enumerate(samplers):
+        async def sample(worker=worker):
+            sampled.append(worker)
+        sampler.sample = sample
+    
+    async def scenario():
+        cache = await fake_redis()
+        monkeypatch.setattr(cache_memory, "redis_cache", cache)
+        try:
+            # Workers wake on their own schedules; the second finds the first's lease still held
+            for sampler in samplers:
+                sampler.start()
+                await asyncio.sleep(0.05)
+            assert sampled == [0]
+        finally:
+            for sampler in samplers:
+                await sampler.stop()
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import asyncio
+
+from cache_metrics import CacheMetrics
+
+def test_flushed_metrics_add_up_across_workers(fake_redis):
+    first, second = CacheMetrics(), CacheMetrics()
+    first.count("trend_data", "get", "hit", 3)
+    first.count("trend_data", "get", "miss")
+    second.count("trend_data", "get", "hit")
+    first.observe("trend_data", "get", 0.0007)
+    second.observe("trend_data", "get", 0.02)
+    second.observe("trend_data", "get", 5.0)
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            await first.flush(cache.client)
+            await second.flush(cache.client)
+            assert not first._pending_counters and not second._pending_sums
+            # Flushing twice does not count anything twice
+            await first.flush(cache.client)
+            
+            stats = await CacheMetrics().get_stats(cache.client)
+            get = stats["namespaces"]["trend_data"]["get"]
+            assert stats["scope"] == "all_workers"
+            assert (get["hit"], get["miss"], get["hit_rate"]) == (4, 1, 80.0)
+            assert get["latency"]["count"] == 3
+            assert get["latency"]["p50_ms"] == 25.0
+            assert get["latency"]["p99_ms"] is None
+            
+            text = await CacheMetrics().render_prometheus(cache.client)
+        finally:
+            await cache.disconnect()
+        return text
+    
+    text = asyncio.run(scenario()).splitlines()
+    labels = 'namespace="trend_data",operation="get"'
+    assert "# TYPE cache_requests_total counter" in text
+    assert f'cache_requests_total{{{labels},result="hit"}} 4' in text
+    assert f'cache_requests_total{{{labels},result="miss"}} 1' in text
+    # Buckets are cumulative and end with +Inf equal to the count
+    assert f'cache_operation_duration_seconds_bucket{{{labels},le="0.0005"}} 0' in text
+    assert f'cache_operation_duration_seconds_bucket{{{labels},le="0.001"}} 1' in text
+    assert f'cache_operation_duration_seconds_bucket{{{labels},le="0.025"}} 2' in text
+    assert f'cache_operation_duration_seconds_bucket{{{labels},le="2.5"}} 2' in text
+    assert f'cache_operation_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'cache_operation_duration_seconds_count{{{labels}}} 3' in text
+    total = next(line for line in text if line.startswith(f"cache_operation_duration_seconds_sum{{{labels}}}"))
+    assert abs(float(total.split()[-1]) - 5.0207) < 1e-9
+
+def test_failed_flush_keeps_increments_for_the_next(fake_redis):
+    metrics = CacheMetrics()
+    metrics.count("room_analysis", "set", "ok", 2)
+    metrics.observe("room_analysis", "set", 0.003)
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            fake_redis.server.connected = False
+            await metrics.flush(cache.client)
+            fake_redis.server.connected = True
+            assert metrics._pending_counters["c|room_analysis|set|ok"] == 2
+            
+            await metrics.flush(cache.client)
+            return await CacheMetrics().get_stats(cache.client)
+        finally:
+            fake_redis.server.connected = True
+            await cache.disconnect()
+    
+    stats = asyncio.run(scenario())
+    assert stats["namespaces"]["room_analysis"]["set"]["ok"] == 2
+    assert stats["namespaces"]["room_analysis"]["set"]["latency"]["count"] == 1
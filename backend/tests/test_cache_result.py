@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import pytest
+import cache
+from cache import cache_result
+
+class Catalog:
+    def __init__(self):
+        self.calls = []
+    
+    @cache_result('artwork_recommendations', ttl=60)
+    def recommend(self, style, k=5):
+        self.calls.append((style, k, threading.current_thread()))
+        return [f"{style}-{i}" for i in range(k)]
+    
+    @classmethod
+    @cache_result('artwork_recommendations')
+    async def featured(cls, style):
+        return [style]
+
+@pytest.fixture
+def connected(fake_redis, monkeypatch):
+    """Run a scenario with the module-level cache the decorator uses on fakeredis"""
+    def run(scenario):
+        async def wrapped():
+            shared = await fake_redis(cache.RedisCache())
+            monkeypatch.setattr(cache, "redis_cache", shared)
+            try:
+                return await scenario(shared)
+            finally:
+                await shared.disconnect()
+        return asyncio.run(wrapped())
+    return run
+
+def test_equivalent_calls_share_one_key():
+    key = Catalog.recommend.cache_key
+    first, second = Catalog(), Catalog()
+    assert key(first, "modern") == key(first, "modern", 5) == key(first, style="modern", k=5) == key(second, "modern")
+    assert key(first, "modern") != key(first, "modern", 3)
+    assert key(first, "modern").startswith("artwork_recommendations:")
+
+def test_cls_is_not_part_of_the_key():
+    class Other(Catalog):
+        pass
+    key = Catalog.featured.cache_key
+    assert key(Catalog, "boho") == key(Other, "boho")
+
+def test_sync_functions_run_in_the_executor_and_are_cached(connected):
+    async def scenario(shared):
+        catalog = Catalog()
+        assert await catalog.recommend("modern") == [f"modern-{i}" for i in range(5)]
+        assert await catalog.recommend(style="modern", k=5) == [f"modern-{i}" for i in range(5)]
+        assert await Catalog().recommend("modern", 5) == [f"modern-{i}" for i in range(5)]
+        assert len(catalog.calls) == 1
+        assert catalog.calls[0][2] is not threading.main_thread()
+        
+        key = Catalog.recommend.cache_key(catalog, "modern")
+        assert 60 <= await shared.store.ttl(key) <= 60 * (1 + shared.ttl_jitter)
+        assert await Catalog.featured("boho") == ["boho"]
+    
+    connected(scenario)
+
+def test_arguments_without_a_stable_form_are_not_cached(connected):
+    async def scenario(shared):
+        catalog = Catalog()
+        style = object()
+        await catalog.recommend(style, 1)
+        await catalog.recommend(style, 1)
+        assert len(catalog.calls) == 2
+    
+    connected(scenario)
@@ -0,0 +1,60 @@
+import asyncio
+import fakeredis
+from cache_sharding import HashRing, ShardedRedis
+
+KEYS = [f"room_analysis:v1:{i:05d}" for i in range(20000)]
+
+def test_adding_a_node_moves_only_its_share_of_keys():
+    before = HashRing(["redis-a:6379", "redis-b:6379", "redis-c:6379"])
+    after = HashRing(["redis-a:6379", "redis-b:6379", "redis-c:6379", "redis-d:6379"])
+    
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    # Every moved key moves to the new node, and about a quarter of them move
+    assert {after.node_for(key) for key in moved} == {"redis-d:6379"}
+    assert 0.18 < len(moved) / len(KEYS) < 0.32
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(["redis-a:6379", "redis-b:6379", "redis-c:6379"])
+    after = HashRing(["redis-a:6379", "redis-c:6379"])
+    for key in KEYS[:2000]:
+        if before.node_for(key) != "redis-b:6379":
+            assert after.node_for(key) == before.node_for(key)
+
+def test_ring_is_deterministic_and_balanced():
+    nodes = ["redis-a:6379", "redis-b:6379", "redis-c:6379"]
+    ring = HashRing(nodes)
+    assert [ring.node_for(key) for key in KEYS[:100]] == [HashRing(nodes).node_for(key) for key in KEYS[:100]]
+    assert ring.node_for(KEYS[0].encode()) == ring.node_for(KEYS[0])
+    
+    ownership = ring.ownership()
+    assert abs(sum(ownership.values()) - 1) < 0.001
+    assert all(0.25 < share < 0.42 for share in ownership.values())
+
+def test_group_keeps_key_order_within_each_node():
+    ring = HashRing(["redis-a:6379", "redis-b:6379"])
+    groups = ring.group(KEYS[:200])
+    assert sorted(key for group in groups.values() for key in group) == KEYS[:200]
+    for node, group in groups.items():
+        assert group == [key for key in KEYS[:200] if ring.node_for(key) == node]
+
+def test_sharded_mget_aligns_results_across_shards():
+    async def scenario():
+        clients = {
+            node: fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+            for node in ("redis-a:6379", "redis-b:6379", "redis-c:6379")
+        }
+        sharded = ShardedRedis(clients, control=clients["redis-a:6379"])
+        keys = KEYS[:50]
+        for index, key in enumerate(keys):
+            if index % 3:
+                await sharded.set(key, str(index))
+        
+        values = await sharded.mget(keys)
+        assert values == [None if index % 3 == 0 else str(index).encode() for index in range(50)]
+        # Each value lives only on its owning shard
+        for key in keys:
+            holders = [node for node, client in clients.items() if await client.exists(key)]
+            assert holders in ([], [sharded.ring.node_for(key)])
+        assert await sharded.exists(*keys) == len([index for index in range(50) if index % 3])
+    
+    asyncio.run(scenario())
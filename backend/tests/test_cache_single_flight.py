@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+
+def test_concurrent_misses_compute_once(fake_redis):
+    calls = []
+    
+    async def compute(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return {"query": query}
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("room_analysis", "coalesce")
+            results = await asyncio.gather(*[cache.get_or_set(key, compute, 60, "q") for _ in range(20)])
+            assert results == [{"query": "q"}] * 20
+            assert await cache.get(key) == {"query": "q"}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+    assert calls == ["q"]
+
+def test_concurrent_misses_across_workers_compute_once(fake_redis):
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "value"
+    
+    async def scenario():
+        workers = [await fake_redis() for _ in range(3)]
+        for worker in workers:
+            worker.lock_poll_interval = 0.01
+        try:
+            key = workers[0].make_key("room_analysis", "shared")
+            results = await asyncio.gather(*[
+                worker.get_or_set(key, compute, 60) for worker in workers for _ in range(5)
+            ])
+            assert results == ["value"] * 15
+        finally:
+            for worker in workers:
+                await worker.disconnect()
+    
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+def test_failed_computation_reaches_every_waiter_and_is_not_cached(fake_redis):
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("model unavailable")
+    
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            key = cache.make_key("room_analysis", "failing")
+            results = await asyncio.gather(*[cache.get_or_set(key, compute, 60) for _ in range(5)], return_exceptions=True)
+            assert all(isinstance(result, RuntimeError) for result in results)
+            assert await cache.get(key) is None
+            with pytest.raises(RuntimeError):
+                await cache.get_or_set(key, compute, 60)
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+def test_lock_is_renewed_while_a_computation_outlives_its_ttl(fake_redis):
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.5)
+        return "slow value"
+    
+    async def scenario():
+        workers = [await fake_redis() for _ in range(3)]
+        for worker in workers:
+            worker.lock_ttl_ms = 150
+            worker.lock_poll_interval = 0.01
+        try:
+            key = workers[0].make_key("room_analysis", "slow")
+            leader = asyncio.create_task(workers[0].get_or_set(key, compute, 60))
+            await asyncio.sleep(0.05)
+            # Waiters outlast several lock TTLs and still never compute
+            results = await asyncio.gather(leader, *[worker.get_or_set(key, compute, 60) for worker in workers[1:]])
+            assert results == ["slow value"] * 3
+            assert not await workers[0].client.exists(f"lock:{key}")
+        finally:
+            for worker in workers:
+                await worker.disconnect()
+    
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+def test_value_written_before_the_lock_is_taken_is_not_recomputed(fake_redis):
+    calls = []
+    
+    async def compute(worker):
+        calls.append(worker)
+        return {"computed_by": worker}
+    
+    async def scenario():
+        leader, late = await fake_redis(), await fake_redis()
+        key = leader.make_key("room_analysis", "late-miss")
+        acquire = late._acquire_lock
+        
+        async def acquire_after_leader(lock_key, token):
+            # The late worker missed, then the leader wrote and released before it locked
+            await leader.get_or_set(key, compute, 60, "leader")
+            return await acquire(lock_key, token)
+        
+        late._acquire_lock = acquire_after_leader
+        try:
+            assert await late.single_flight(key, compute, 60, "late") == {"computed_by": "leader"}
+        finally:
+            await leader.disconnect()
+            await late.disconnect()
+    
+    asyncio.run(scenario())
+    assert calls == ["leader"]
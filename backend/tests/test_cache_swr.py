@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+def test_stale_entries_are_served_while_one_refresh_runs(fake_redis, monkeypatch):
+    calls = []
+    
+    async def analyze(style):
+        calls.append(style)
+        await asyncio.sleep(0.05)
+        return {"style": style, "version": len(calls)}
+    
+    real_time = time.time
+    offset = {"seconds": 0}
+    monkeypatch.setattr(time, "time", lambda: real_time() + offset["seconds"])
+    
+    async def scenario():
+        cache = await fake_redis()
+        cache.register_refresher("analyze", analyze)
+        key = cache.make_key("trend_data", "swr")
+        
+        async def read():
+            return await cache.get_or_refresh(key, "analyze", "japandi", soft_ttl=10, hard_ttl=600)
+        
+        try:
+            assert await read() == {"style": "japandi", "version": 1}
+            assert await read() == {"style": "japandi", "version": 1}
+            assert len(calls) == 1
+            
+            # Past the soft TTL: every reader gets the stale value at once, one refresh runs
+            offset["seconds"] = 11
+            assert await asyncio.gather(*[read() for _ in range(10)]) == [{"style": "japandi", "version": 1}] * 10
+            assert len(calls) == 1
+            assert cache.metrics["stale_served"] == 10
+            
+            await cache._refresh_tasks[key]
+            assert len(calls) == 2
+            assert cache.metrics["background_refreshes"] == 1
+            assert await read() == {"style": "japandi", "version": 2}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_stale_entry_is_refreshed_by_another_worker(fake_redis, monkeypatch):
+    calls = []
+    
+    def analyze(style):
+        calls.append(style)
+        return {"style": style, "version": len(calls)}
+    
+    real_time = time.time
+    offset = {"seconds": 0}
+    monkeypatch.setattr(time, "time", lambda: real_time() + offset["seconds"])
+    
+    async def scenario():
+        writer, reader = await fake_redis(), await fake_redis()
+        for worker in (writer, reader):
+            worker.register_refresher("analyze", analyze)
+        key = writer.make_key("room_analysis", "swr")
+        try:
+            await writer.get_or_refresh(key, "analyze", "boho", soft_ttl=10, hard_ttl=600)
+            offset["seconds"] = 11
+            
+            # The envelope carries the refresher name and arguments, so any worker can refresh it
+            assert await reader.get_or_refresh(key, "analyze", "boho", soft_ttl=10) == {"style": "boho", "version": 1}
+            await reader._refresh_tasks[key]
+            assert await writer.get(key) == {"style": "boho", "version": 2}
+        finally:
+            await writer.disconnect()
+            await reader.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import asyncio
+
+async def registered(cache, user_id):
+    return {cache._to_str(key) for key in await cache.store.smembers(cache._user_registry_key(user_id))}
+
+def test_writes_for_a_user_join_a_registry_that_outlives_them(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            preferences = cache.make_key("user_preferences", user_id="u1")
+            analysis = cache.make_key("room_analysis", "image", user_id="u1")
+            shared = cache.make_key("trend_data", "japandi")
+            await cache.set(preferences, {"style": "modern"}, ttl=cache.ttl_settings["user_preferences"], user_id="u1")
+            await cache.set(analysis, {"walls": 4}, ttl=60, user_id="u1")
+            await cache.set(shared, ["japandi"], ttl=60)
+            
+            assert await registered(cache, "u1") == {preferences, analysis}
+            # Every write pushes the registry's expiry past the longest entry lifetime
+            registry_ttl = await cache.store.ttl(cache._user_registry_key("u1"))
+            assert registry_ttl > cache.max_entry_ttl - 5
+            assert registry_ttl >= await cache.store.ttl(preferences)
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_filtered_invalidation_deletes_only_those_namespaces(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            preferences = cache.make_key("user_preferences", user_id="u1")
+            recommendations = cache.make_key("artwork_recommendations", "modern", user_id="u1")
+            other_user = cache.make_key("artwork_recommendations", "modern", user_id="u2")
+            await cache.set(preferences, {"style": "modern"}, ttl=600, user_id="u1")
+            await cache.set(recommendations, ["art-1"], ttl=600, user_id="u1")
+            await cache.set(other_user, ["art-2"], ttl=600, user_id="u2")
+            
+            assert await cache.invalidate_user_cache("u1", ["artwork_recommendations"]) == 1
+            assert await cache.get(recommendations) is None
+            assert await cache.get(preferences) == {"style": "modern"}
+            assert await cache.get(other_user) == ["art-2"]
+            # The deleted key leaves the registry; the generation is untouched
+            assert await registered(cache, "u1") == {preferences}
+            assert cache.make_key("user_preferences", user_id="u1") == preferences
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_reconciliation_prunes_expired_keys_from_registries(fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        try:
+            live = cache.make_key("user_preferences", user_id="u1")
+            expired = cache.make_key("room_analysis", "image", user_id="u1")
+            await cache.set(live, {"style": "modern"}, ttl=600, user_id="u1")
+            await cache.set(expired, {"walls": 4}, ttl=600, user_id="u1")
+            await cache.store.delete(expired)
+            
+            counts = await cache.inventory.reconcile(cache.store, cache.client, cache.prune_user_registry)
+            assert counts["user_preferences"] == 1 and counts["room_analysis"] == 0
+            assert await registered(cache, "u1") == {live}
+            meta = await cache.client.hgetall(cache.inventory.meta_key)
+            assert meta[b"pruned_registry_members"] == b"1"
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
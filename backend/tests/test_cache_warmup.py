@@ -0,0 +1,220 @@
+import asyncio
+
+import pytest
+
+import agents.trend_intel_agent as trend_intel
+import cache_warmup
+from cache_warmup import CacheWarmupScheduler
+
+@pytest.fixture
+def scheduler():
+    scheduler = CacheWarmupScheduler()
+    scheduler.concurrency = 1
+    scheduler.limits = {"style": 3, "location": 2}
+    scheduler.defaults = {"style": ["modern", "boho"], "location": []}
+    return scheduler
+
+async def connect(monkeypatch, fake_redis, scheduler, calls):
+    """Point the warmup at a fake Redis with a refresher recording each style it computes"""
+    cache = await fake_redis()
+    monkeypatch.setattr(cache_warmup, "redis_cache", cache)
+    
+    def analyze(style):
+        calls.append(style)
+        return {"style": style}
+    
+    cache.register_refresher("analyze", analyze)
+    scheduler.register_target("style", "analysis", lambda style: {
+        "key": cache.make_key("trend_data", style),
+        "refresher": "analyze",
+        "args": [style],
+        "soft_ttl": 7200,
+    })
+    return cache
+
+def test_most_requested_values_are_warmed_first(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        try:
+            for style in ["japandi", "industrial", "japandi", "japandi", "industrial", "coastal"]:
+                scheduler.record("style", style)
+            scheduler.record("style", None)
+            
+            progress = await scheduler.run()
+            # Only the top values are warmed, highest count first
+            assert calls == ["japandi", "industrial", "coastal"]
+            assert progress["total"] == progress["warmed"] == 3
+            assert progress["status"] == "idle"
+            assert await cache.get(cache.make_key("trend_data", "japandi")) == {"style": "japandi"}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_defaults_pad_the_plan_until_demand_is_observed(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        try:
+            scheduler.record("style", "boho")
+            await scheduler.run()
+            assert calls == ["boho", "modern"]
+            
+            # Explicit values replace the observed ones, in the order given
+            calls.clear()
+            await scheduler.run("manual", {"style": ["rustic", "coastal"]})
+            assert calls == ["rustic", "coastal"]
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_entries_still_fresh_are_skipped(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        try:
+            await scheduler.run()
+            progress = await scheduler.run()
+            assert calls == ["modern", "boho"]
+            assert progress["total"] == progress["skipped"] == 2
+            assert progress["warmed"] == progress["failed"] == 0
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_one_worker_runs_a_pass_at_a_time(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        other = await fake_redis()
+        try:
+            token = await other.acquire_lock("cache_warmup", 60000)
+            assert token is not None
+            
+            progress = await scheduler.run()
+            assert calls == []
+            assert progress["total"] == 0
+            
+            await other.release_lock("cache_warmup", token)
+            await scheduler.run()
+            assert calls == ["modern", "boho"]
+        finally:
+            await other.disconnect()
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_request_counts_decay_after_each_pass(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        key = f"{scheduler.frequency_prefix}:style"
+        try:
+            for _ in range(4):
+                scheduler.record("style", "japandi")
+            scheduler.record("style", "coastal")
+            await scheduler.run()
+            assert await cache.client.zscore(key, "japandi") == 2.0
+            assert await cache.client.zscore(key, "coastal") == 0.5
+            
+            # Counts that decay below the floor are dropped
+            await scheduler.run()
+            await scheduler.run()
+            await scheduler.run()
+            assert await cache.client.zscore(key, "japandi") == 0.25
+            assert await cache.client.zscore(key, "coastal") is None
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_progress_is_readable_from_any_worker(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        try:
+            scheduler.record("style", "japandi")
+            scheduler.record("style", "japandi")
+            await scheduler.run("startup")
+            
+            progress = await CacheWarmupScheduler().get_progress()
+            assert progress["trigger"] == "startup"
+            assert progress["completed"] == progress["warmed"] == 3
+            assert progress["in_progress"] == []
+            assert progress["priorities"]["style"][0] == {"value": "japandi", "score": 1.0}
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_full_profile_requests_read_the_warmed_style_evolution(monkeypatch, fake_redis, scheduler):
+    searches = []
+    
+    async def scenario():
+        cache = await fake_redis()
+        monkeypatch.setattr(cache_warmup, "redis_cache", cache)
+        monkeypatch.setattr(trend_intel, "redis_cache", cache)
+        agent = trend_intel.TrendIntelAgent()
+        
+        async def search(query, max_results=10):
+            searches.append(query)
+            return []
+        
+        monkeypatch.setattr(agent, "search_trending_styles", search)
+        # The target the decision router registers for styles
+        scheduler.register_target("style", "style_evolution", lambda style: {
+            "key": agent.style_evolution_cache_key({"preferences": {"aesthetic_style": style}}),
+            "refresher": "style_evolution_analysis",
+            "args": [{"preferences": {"aesthetic_style": style}}],
+            "soft_ttl": agent.style_evolution_soft_ttl,
+            "namespace": "trend_data",
+        })
+        try:
+            await scheduler.run("manual", {"style": ["japandi"]})
+            assert len(searches) == 1
+            
+            # A stored profile carries every default preference, not just the style
+            profile = {"preferences": {
+                "aesthetic_style": "japandi",
+                "preferred_colors": ["sage", "oak"],
+                "max_price": 500,
+                "room_type": "living_room",
+            }}
+            analysis = await agent.analyze_style_evolution(profile)
+            assert len(searches) == 1
+            assert "japandi" in analysis["evolution_insights"]
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_scheduled_passes_warm_and_decay_once_per_interval(monkeypatch, fake_redis, scheduler):
+    calls = []
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis, scheduler, calls)
+        other = CacheWarmupScheduler()
+        other._targets = scheduler._targets
+        key = f"{scheduler.frequency_prefix}:style"
+        try:
+            for _ in range(4):
+                scheduler.record("style", "japandi")
+            
+            # Two workers wake a moment apart; the second finds the first's lease
+            await scheduler.run("schedule")
+            await other.run("schedule")
+            assert calls == ["japandi", "modern", "boho"]
+            assert await cache.client.zscore(key, "japandi") == 2.0
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+from email.utils import formatdate
+import pytest
+import agents.trend_intel_agent as trend_intel
+from http_cache import HTTPCache
+from trend_extraction import FIXTURE_PAGES_DIR
+
+URL = "https://www.architecturaldigest.com/story/interior-design-trends"
+
+@pytest.fixture
+def cache(tmp_path):
+    return HTTPCache(cache_dir=str(tmp_path))
+
+@pytest.fixture
+def page():
+    with open(os.path.join(FIXTURE_PAGES_DIR, "design_blog", "architecturaldigest.com.html"), "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("headers,lifetime", [
+    ({"Cache-Control": "max-age=600"}, 600),
+    ({"Cache-Control": "public, max-age=600", "Age": "100"}, 500),
+    ({"Cache-Control": "max-age=600, no-cache"}, 0),
+    ({"Cache-Control": "no-store"}, 0),
+    ({"Date": formatdate(1_000_000), "Expires": formatdate(1_000_300)}, 300),
+    ({"Expires": "0"}, 0),
+    ({"Date": formatdate(1_000_000), "Last-Modified": formatdate(1_000_000 - 5000)}, 500),
+    ({"Date": formatdate(1_000_000), "Last-Modified": formatdate(0)}, 3600),
+    ({}, 0),
+])
+def test_freshness_lifetime(cache, headers, lifetime):
+    assert cache._freshness_lifetime(cache._relevant_headers(headers)) == pytest.approx(lifetime)
+
+def test_stored_entry_is_fresh_until_max_age(cache, page, monkeypatch):
+    entry = cache.store(URL, {"Cache-Control": "max-age=60", "ETag": '"v1"'}, page)
+    stored = cache.lookup(URL)
+    assert stored["headers"]["etag"] == '"v1"'
+    assert cache.read_body(stored) == page
+    assert cache.is_fresh(stored)
+    
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert not cache.is_fresh(cache.lookup(URL))
+    assert entry["fresh_until"] == stored["fresh_until"]
+
+def test_no_store_responses_are_not_written(cache, page):
+    entry = cache.store(URL, {"Cache-Control": "no-store"}, page)
+    assert cache.read_body(entry) == page
+    assert cache.lookup(URL) is None
+
+def test_conditional_headers_use_stored_validators(cache, page):
+    assert cache.conditional_headers(None) == {}
+    entry = cache.store(URL, {"ETag": '"v1"', "Last-Modified": formatdate(1_000_000, usegmt=True)}, page)
+    assert cache.conditional_headers(entry) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": formatdate(1_000_000, usegmt=True),
+    }
+
+def test_revalidation_keeps_body_and_extracted_items(cache, page):
+    entry = cache.store(URL, {"Cache-Control": "no-cache", "ETag": '"v1"'}, page)
+    cache.save_parsed(entry, "design_blog:lxml:v1", [{"title": "Earthy Terracotta"}])
+    assert not cache.is_fresh(entry)
+    
+    entry = cache.revalidated(cache.lookup(URL), {"Cache-Control": "max-age=300", "ETag": '"v1"'})
+    assert cache.is_fresh(entry)
+    stored = cache.lookup(URL)
+    assert stored["parsed"] == {"design_blog:lxml:v1": [{"title": "Earthy Terracotta"}]}
+    assert cache.read_body(stored) == page
+
+def test_prune_keeps_the_newest_entries(cache, page):
+    cache.max_entries = 2
+    for index in range(4):
+        cache.store(f"{URL}?page={index}", {}, page)
+        path = cache._path(f"{URL}?page={index}", ".json")
+        os.utime(path, (index, index))
+    cache._prune()
+    assert [cache.lookup(f"{URL}?page={index}") is not None for index in range(4)] == [False, False, True, True]
+
+def test_agent_revalidates_with_304_and_reuses_extracted_items(cache, page, monkeypatch):
+    monkeypatch.setattr(trend_intel, "http_cache", cache)
+    requests = []
+    responses = [
+        (200, {"Cache-Control": "no-cache", "ETag": '"v1"'}, page),
+        (304, {"Cache-Control": "max-age=300", "ETag": '"v1"'}, b""),
+    ]
+    
+    async def fetch_page(url, headers):
+        requests.append(headers)
+        return responses[len(requests) - 1]
+    
+    async def scenario():
+        agent = trend_intel.TrendIntelAgent()
+        agent._fetch_page = fetch_page
+        extract = agent.extractor.extract
+        extractions = []
+        agent.extractor.extract = lambda *args: extractions.append(args) or extract(*args)
+        try:
+            first = await agent._fetch_extracted(URL, "design_blog")
+            # no-cache: revalidated before use, answered 304
+            second = await agent._fetch_extracted(URL, "design_blog")
+            # Fresh for 300s after the 304: no request at all
+            third = await agent._fetch_extracted(URL, "design_blog")
+        finally:
+            await agent.close()
+        return first, second, third, extractions
+    
+    first, second, third, extractions = asyncio.run(scenario())
+    assert first and first == second == third
+    assert requests == [{}, {"If-None-Match": '"v1"'}]
+    assert len(extractions) == 1
+
+def test_agent_falls_back_to_stale_copy_when_source_is_down(cache, page, monkeypatch):
+    monkeypatch.setattr(trend_intel, "http_cache", cache)
+    cache.store(URL, {"Cache-Control": "max-age=0", "ETag": '"v1"'}, page)
+    
+    async def source_down(url, headers):
+        return None
+    
+    async def scenario():
+        agent = trend_intel.TrendIntelAgent()
+        agent._fetch_page = source_down
+        try:
+            return (
+                await agent._fetch_extracted(URL, "design_blog"),
+                await agent._fetch_extracted("https://www.artsy.net/trending", "art_source"),
+            )
+        finally:
+            await agent.close()
+    
+    stale, missing = asyncio.run(scenario())
+    assert stale
+    assert missing is None
@@ -0,0 +1,162 @@
+import asyncio
+import os
+
+import pytest
+
+import job_queue
+from job_queue import JobQueueUnavailable, RoomAnalysisQueue
+
+@pytest.fixture
+def queue():
+    queue = RoomAnalysisQueue()
+    queue.read_block_ms = 50
+    # fakeredis drops entries from a blocking XREADGROUP that finds fewer than
+    # COUNT of them, so read one job at a time
+    queue.worker_concurrency = 1
+    return queue
+
+async def connect(monkeypatch, fake_redis):
+    cache = await fake_redis()
+    monkeypatch.setattr(job_queue, "redis_cache", cache)
+    return cache
+
+class Handler:
+    """Vision handler recording what each job handed it"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    async def __call__(self, image_path, user_id, location):
+        with open(image_path, "rb") as f:
+            self.calls.append((os.path.splitext(image_path)[1], f.read(), user_id, location))
+        return {"success": True, "style": "japandi"}
+
+async def stop(worker):
+    worker.cancel()
+    try:
+        await worker
+    except asyncio.CancelledError:
+        pass
+
+def test_job_round_trip_through_a_worker(monkeypatch, fake_redis, queue):
+    handler = Handler()
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        worker = asyncio.create_task(queue.run_worker(handler, "worker-1"))
+        try:
+            job_id = await queue.enqueue(b"image-bytes", "PNG", "u1", "Paris")
+            job = await queue.wait_for_job(job_id, 5)
+            
+            assert job["status"] == "done"
+            assert job["result"] == {"success": True, "style": "japandi"}
+            assert job["attempts"] == 1
+            assert handler.calls == [(".png", b"image-bytes", "u1", "Paris")]
+            # The entry is acked and deleted, and the upload dropped
+            assert await cache.client.xlen(queue.stream_key) == 0
+            assert not await cache.client.exists(queue._image_key(job_id))
+        finally:
+            await stop(worker)
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_entry_left_by_a_dead_consumer_is_claimed(monkeypatch, fake_redis, queue):
+    queue.visibility_timeout = 1
+    handler = Handler()
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        worker = None
+        try:
+            await queue.ensure_group()
+            job_id = await queue.enqueue(b"image-bytes", "jpg", "u1")
+            # A worker reads the job and dies before running it
+            assert len(await queue._read_new("worker-dead", 1)) == 1
+            
+            worker = asyncio.create_task(queue.run_worker(handler, "worker-2"))
+            await asyncio.sleep(0.3)
+            assert handler.calls == []
+            
+            # Once the entry has idled past the visibility timeout it is taken over
+            job = await queue.wait_for_job(job_id, 5)
+            assert job["status"] == "done"
+            assert len(handler.calls) == 1
+            pending = await cache.client.xpending(queue.stream_key, queue.group)
+            assert pending["pending"] == 0
+        finally:
+            if worker:
+                await stop(worker)
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("extension, expected", [
+    ("png", "png"),
+    (" JPEG ", "jpeg"),
+    ("php", "jpg"),
+    ("png/../../etc/passwd", "jpg"),
+    ("", "jpg"),
+    (None, "jpg"),
+])
+def test_extensions_are_reduced_to_known_image_types(extension, expected):
+    assert RoomAnalysisQueue._safe_extension(extension) == expected
+
+def test_uploaded_extension_is_sanitised_before_the_worker_uses_it(monkeypatch, fake_redis, queue):
+    handler = Handler()
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        worker = asyncio.create_task(queue.run_worker(handler, "worker-1"))
+        try:
+            job_id = await queue.enqueue(b"image-bytes", "sh", "u1")
+            assert await cache.client.hget(queue._job_key(job_id), "extension") == b"jpg"
+            await queue.wait_for_job(job_id, 5)
+            assert handler.calls[0][0] == ".jpg"
+        finally:
+            await stop(worker)
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_reading_a_job_during_an_outage_is_not_a_missing_job(monkeypatch, fake_redis, queue):
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            job_id = await queue.enqueue(b"image-bytes", "jpg", "u1")
+            assert await queue.get_job("unknown") is None
+            
+            fake_redis.server.connected = False
+            with pytest.raises(JobQueueUnavailable):
+                await queue.get_job(job_id)
+            with pytest.raises(JobQueueUnavailable):
+                await queue.wait_for_job(job_id, 1)
+        finally:
+            fake_redis.server.connected = True
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_redis_error_while_starting_a_job_is_logged_and_left_pending(monkeypatch, fake_redis, queue, caplog):
+    handler = Handler()
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            await queue.ensure_group()
+            job_id = await queue.enqueue(b"image-bytes", "jpg", "u1")
+            [(entry_id, fields)] = await queue._read_new("worker-1", 1)
+            
+            fake_redis.server.connected = False
+            await queue._process(entry_id, fields, handler, "worker-1")
+            fake_redis.server.connected = True
+            
+            assert handler.calls == []
+            assert f"Error starting job {job_id}" in caplog.text
+            pending = await cache.client.xpending(queue.stream_key, queue.group)
+            assert pending["pending"] == 1
+        finally:
+            fake_redis.server.connected = True
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
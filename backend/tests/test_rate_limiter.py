@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import rate_limiter
+from rate_limiter import RateLimiter
+
+def request(token="session-token", host="10.0.0.1", forwarded_for=None):
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    if forwarded_for:
+        headers.append((b"x-forwarded-for", forwarded_for.encode()))
+    return Request({"type": "http", "headers": headers, "client": (host, 50000)})
+
+@pytest.fixture
+def limiter(monkeypatch):
+    # Trends: 6 per minute with a burst of 3 and one request at a time per user
+    monkeypatch.setenv("RATE_LIMIT_TRENDS_PER_MINUTE", "6")
+    monkeypatch.setenv("RATE_LIMIT_TRENDS_BURST", "3")
+    monkeypatch.setenv("RATE_LIMIT_TRENDS_CONCURRENCY", "1")
+    return RateLimiter()
+
+async def connect(monkeypatch, fake_redis):
+    cache = await fake_redis()
+    monkeypatch.setattr(rate_limiter, "redis_cache", cache)
+    return cache
+
+def test_burst_then_429_with_the_time_until_a_token(monkeypatch, fake_redis, limiter):
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            identities = limiter._identities(request())
+            for _ in range(3):
+                await limiter.release(await limiter.acquire("trends", identities))
+            
+            with pytest.raises(HTTPException) as raised:
+                await limiter.acquire("trends", identities)
+            # One token every 10 seconds
+            assert raised.value.status_code == 429
+            assert raised.value.headers["Retry-After"] == "10"
+            
+            # Another client is limited separately
+            await limiter.release(await limiter.acquire("trends", limiter._identities(request("other", "10.0.0.2"))))
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_bucket_refills_at_its_rate(monkeypatch, fake_redis):
+    monkeypatch.setenv("RATE_LIMIT_SEARCH_PER_MINUTE", "1200")
+    monkeypatch.setenv("RATE_LIMIT_SEARCH_BURST", "2")
+    limiter = RateLimiter()
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            identities = ["ip:10.0.0.1"]
+            for _ in range(2):
+                await limiter.release(await limiter.acquire("search", identities))
+            with pytest.raises(HTTPException):
+                await limiter.acquire("search", identities)
+            
+            # 20 tokens a second: one is back after 50ms
+            await asyncio.sleep(0.1)
+            await limiter.release(await limiter.acquire("search", identities))
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_slot_is_released_when_the_request_raises(monkeypatch, fake_redis, limiter):
+    dependency = limiter.limit("trends")
+    
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            held = dependency(request())
+            await held.__anext__()
+            active = f"{limiter.key_prefix}:trends:active:ip:10.0.0.1"
+            assert await cache.client.zcard(active) == 1
+            
+            # A second request of the same user is turned away without spending a token
+            with pytest.raises(HTTPException) as raised:
+                await dependency(request()).__anext__()
+            assert raised.value.headers["Retry-After"] == str(limiter.concurrency_retry_after)
+            
+            with pytest.raises(RuntimeError):
+                await held.athrow(RuntimeError("handler failed"))
+            assert await cache.client.zcard(active) == 0
+            
+            # Two tokens are left of the burst of 3
+            for _ in range(2):
+                await limiter.release(await limiter.acquire("trends", ["ip:10.0.0.1"]))
+            with pytest.raises(HTTPException):
+                await limiter.acquire("trends", ["ip:10.0.0.1"])
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_redis_outage_falls_back_to_in_process_limits(monkeypatch, fake_redis, limiter):
+    async def scenario():
+        cache = await connect(monkeypatch, fake_redis)
+        try:
+            fake_redis.server.connected = False
+            identities = ["ip:10.0.0.1"]
+            
+            # Requests keep being served, limited by this worker alone
+            lease = await limiter.acquire("trends", identities)
+            assert lease["local"]
+            await limiter.release(lease)
+            for _ in range(2):
+                await limiter.release(await limiter.acquire("trends", identities))
+            with pytest.raises(HTTPException) as raised:
+                await limiter.acquire("trends", identities)
+            assert raised.value.headers["Retry-After"] == "10"
+            # Once the breaker opens, checks skip Redis altogether
+            assert cache.breaker.is_open and not cache.is_connected
+            with pytest.raises(HTTPException):
+                await limiter.acquire("trends", identities)
+        finally:
+            fake_redis.server.connected = True
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_clients_behind_a_trusted_proxy_are_limited_by_their_own_address(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", "10.1.0.0/16, 10.2.0.5, not-an-ip")
+    limiter = RateLimiter()
+    
+    # The client is the nearest address our own proxies did not add
+    assert limiter._identities(request(host="10.1.2.3", forwarded_for="1.1.1.1, 203.0.113.7, 10.2.0.5"))[0] == "ip:203.0.113.7"
+    assert limiter._identities(request(host="10.1.2.3", forwarded_for="198.51.100.2"))[0] == "ip:198.51.100.2"
+    # Anyone else can forge the header, so it is ignored
+    assert limiter._identities(request(host="192.0.2.1", forwarded_for="198.51.100.2"))[0] == "ip:192.0.2.1"
+    monkeypatch.delenv("RATE_LIMIT_TRUSTED_PROXIES")
+    assert RateLimiter()._identities(request(host="10.1.2.3", forwarded_for="198.51.100.2"))[0] == "ip:10.1.2.3"
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import trend_crawler
+import trend_store
+from cache import RedisCache
+from trend_crawler import TrendCrawler
+from trend_store import TrendStore
+
+DOCUMENTS = [{"id": "doc-1", "title": "Japandi living rooms"}]
+
+class FakeAgent:
+    """Trend agent whose crawl answers from a list of results"""
+    
+    def __init__(self, *results, delay=0.0):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+    
+    async def crawl_trends(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.results.pop(0)
+
+def answered(documents=DOCUMENTS):
+    return documents, {"sources": 2, "sources_missed": 0, "sources_failed": 0}
+
+def unanswered():
+    return [], {"sources": 2, "sources_missed": 1, "sources_failed": 1}
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv("TREND_STORE_SNAPSHOT", str(tmp_path / "trend_store.json"))
+    store = TrendStore()
+    monkeypatch.setattr(trend_crawler, "trend_store", store)
+    return store
+
+def use_cache(monkeypatch, cache):
+    monkeypatch.setattr(trend_store, "redis_cache", cache)
+    monkeypatch.setattr(trend_crawler, "redis_cache", cache)
+
+def test_one_worker_crawls_while_the_lock_is_held(monkeypatch, store, fake_redis):
+    agent = FakeAgent(answered(), answered(), delay=0.1)
+    monkeypatch.setattr(trend_crawler, "trend_agent", agent)
+    
+    async def scenario():
+        cache = await fake_redis()
+        use_cache(monkeypatch, cache)
+        try:
+            await asyncio.gather(TrendCrawler()._crawl_if_due(), TrendCrawler()._crawl_if_due())
+            assert agent.calls == 1
+            # The lock is gone and the fresh crawl is not due again
+            assert await cache.client.exists("lock:trend_crawl") == 0
+            await TrendCrawler()._crawl_if_due()
+            assert agent.calls == 1
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+    assert store._documents == DOCUMENTS
+
+def test_total_failure_keeps_the_documents_and_backs_off(monkeypatch, store, fake_redis):
+    agent = FakeAgent(answered(), unanswered(), unanswered())
+    monkeypatch.setattr(trend_crawler, "trend_agent", agent)
+    monkeypatch.setenv("TREND_CRAWL_INTERVAL_SECONDS", "3600")
+    monkeypatch.setenv("TREND_CRAWL_RETRY_BASE_SECONDS", "60")
+    
+    async def scenario():
+        cache = await fake_redis()
+        use_cache(monkeypatch, cache)
+        crawler = TrendCrawler()
+        
+        async def age(field, seconds):
+            # Move a recorded time into the past, as every worker reads it
+            moment = (datetime.now() - timedelta(seconds=seconds)).isoformat()
+            await cache.client.hset(store.meta_key, field, json.dumps(moment))
+        
+        try:
+            await crawler.crawl()
+            # Make the stored crawl stale so another one is due
+            await age("crawled_at", 7200)
+            assert await crawler._is_due(reload=True)
+            
+            await crawler._crawl_if_due()
+            assert agent.calls == 2
+            assert store._documents == DOCUMENTS
+            assert (await store.get_meta(reload=True))["failed_crawls"] == 1
+            assert not await crawler._is_due(reload=True)
+            
+            await age("failed_at", 61)
+            assert await crawler._is_due(reload=True)
+            await crawler._crawl_if_due()
+            assert agent.calls == 3
+            # The second failure doubles the wait
+            await age("failed_at", 61)
+            assert not await crawler._is_due(reload=True)
+            await age("failed_at", 121)
+            assert await crawler._is_due(reload=True)
+            
+            # A successful crawl clears the failures
+            agent.results.append(answered([]))
+            await crawler._crawl_if_due()
+            meta = await store.get_meta(reload=True)
+            assert "failed_crawls" not in meta and "failed_at" not in meta
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
+
+def test_retry_delay_is_capped_at_the_interval(monkeypatch):
+    monkeypatch.setenv("TREND_CRAWL_INTERVAL_SECONDS", "600")
+    monkeypatch.setenv("TREND_CRAWL_RETRY_BASE_SECONDS", "60")
+    crawler = TrendCrawler()
+    
+    assert [crawler.retry_delay(failures) for failures in range(6)] == [0, 60, 120, 240, 480, 600]
+
+def test_store_starts_from_the_snapshot_without_redis(monkeypatch, store):
+    use_cache(monkeypatch, RedisCache())
+    
+    async def scenario():
+        await store.save(DOCUMENTS, {"sources": 2})
+        # A restarted worker with Redis down reads what the last crawl wrote to disk
+        restarted = TrendStore()
+        assert await restarted.get_documents() == DOCUMENTS
+        assert (await restarted.get_meta())["documents"] == 1
+        assert restarted.age_seconds() < 5
+    
+    asyncio.run(scenario())
+
+def test_store_reloads_a_crawl_saved_by_another_worker(monkeypatch, store, fake_redis):
+    async def scenario():
+        cache = await fake_redis()
+        use_cache(monkeypatch, cache)
+        try:
+            reader = TrendStore()
+            assert await reader.get_documents() == []
+            
+            await store.save(DOCUMENTS, {"sources": 2})
+            # Within the reload interval the reader keeps what it has
+            reader._meta = {"crawled_at": "earlier"}
+            assert await reader.get_documents() == []
+            assert (await reader.get_meta(reload=True))["documents"] == 1
+            assert await reader.get_documents() == DOCUMENTS
+        finally:
+            await cache.disconnect()
+    
+    asyncio.run(scenario())
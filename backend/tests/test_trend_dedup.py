@@ -0,0 +1,52 @@
+from trend_dedup import TrendDeduplicator
+
+def _trend(title, content, **extra):
+    return {"title": title, "content": content, **extra}
+
+TERRACOTTA = (
+    "Warm terracotta, rust and clay tones are replacing the cool greys of the last decade "
+    "in living rooms and kitchens, paired with limewash walls and natural linen."
+)
+
+def test_near_duplicates_merge_into_the_most_complete_copy():
+    trends = [
+        _trend("Earthy terracotta tones", TERRACOTTA[:120], url="a"),
+        _trend("Japandi calm", "Low furniture, pale oak and plenty of empty space define the Japandi look.", url="b"),
+        _trend("Earthy terracotta tones", TERRACOTTA, url="c"),
+        _trend("Earthy Terracotta Tones!", TERRACOTTA.replace("decade", "decade,"), url="d"),
+    ]
+    deduplicated = TrendDeduplicator().deduplicate(trends)
+    # The longest copy represents the cluster; survivors keep their original order
+    assert [trend["url"] for trend in deduplicated] == ["b", "c"]
+
+def test_distinct_trends_are_kept():
+    trends = [
+        _trend("Japandi calm", "Low furniture, pale oak and plenty of empty space."),
+        _trend("Dark moody libraries", "Deep green and oxblood walls wrap reading nooks in colour."),
+        _trend("Checkerboard floors", "Bold two-tone tiles return to kitchens and hallways."),
+    ]
+    assert TrendDeduplicator().deduplicate(trends) == trends
+
+def test_results_are_deterministic_across_instances():
+    trends = [_trend(f"Trend {i % 7}", f"{TERRACOTTA} variant {i % 7}") for i in range(30)]
+    assert TrendDeduplicator().deduplicate(trends) == TrendDeduplicator().deduplicate(trends)
+
+def test_threshold_controls_merging(monkeypatch):
+    trends = [
+        _trend("Quiet luxury", "Understated boucle, travertine and brushed brass signal quality without logos."),
+        _trend("Quiet luxury", "Understated boucle, travertine and brushed brass signal quality without labels on show."),
+    ]
+    monkeypatch.setenv("TREND_DEDUP_THRESHOLD", "0.99")
+    assert len(TrendDeduplicator().deduplicate(trends)) == 2
+    monkeypatch.setenv("TREND_DEDUP_THRESHOLD", "0.4")
+    assert len(TrendDeduplicator().deduplicate(trends)) == 1
+
+def test_band_layout_matches_the_threshold():
+    bands, rows = TrendDeduplicator._band_layout(0.6, 128)
+    assert bands * rows <= 128
+    assert abs((1 / bands) ** (1 / rows) - 0.6) < 0.1
+
+def test_tiny_inputs_pass_through():
+    assert TrendDeduplicator().deduplicate([]) == []
+    single = [_trend("Only", "")]
+    assert TrendDeduplicator().deduplicate(single) == single
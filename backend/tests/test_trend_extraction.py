@@ -0,0 +1,33 @@
+import os
+import pytest
+from trend_extraction import (
+    FIXTURE_PAGES_DIR, LxmlExtractor, SoupExtractor, SOURCE_SELECTORS, benchmark, load_pages
+)
+
+SOURCE_TYPES = sorted(os.listdir(FIXTURE_PAGES_DIR))
+
+def _fixture_pages():
+    return [
+        pytest.param(source_type, name, body, id=f"{source_type}/{name}")
+        for source_type in SOURCE_TYPES
+        for name, body in load_pages(os.path.join(FIXTURE_PAGES_DIR, source_type)).items()
+    ]
+
+@pytest.mark.parametrize("source_type,name,body", _fixture_pages())
+def test_lxml_matches_soup(source_type, name, body):
+    url = f"https://www.{name[:-len('.html')]}/"
+    lxml_items = LxmlExtractor(SOURCE_SELECTORS).extract(source_type, url, body)
+    soup_items = SoupExtractor().extract(source_type, url, body)
+    assert lxml_items
+    assert lxml_items == soup_items
+
+@pytest.mark.parametrize("source_type", SOURCE_TYPES)
+def test_benchmark_over_recorded_pages(source_type):
+    pages = load_pages(os.path.join(FIXTURE_PAGES_DIR, source_type))
+    results = benchmark(pages, source_type, rounds=3)
+    assert results["pages"] == len(pages) > 0
+    assert results["mismatches"] == 0
+    assert results["lxml_ms_per_page"] > 0 and results["bs4_ms_per_page"] > 0
+
+def test_unparseable_page_has_no_items():
+    assert LxmlExtractor(SOURCE_SELECTORS).extract("design_blog", "https://example.com/", b"") == []
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import agents.trend_intel_agent as trend_intel
+from http_cache import HTTPCache
+from trend_extraction import FIXTURE_PAGES_DIR
+
+@pytest.fixture
+def page():
+    with open(os.path.join(FIXTURE_PAGES_DIR, "design_blog", "architecturaldigest.com.html"), "rb") as f:
+        return f.read()
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(trend_intel, "http_cache", HTTPCache(cache_dir=str(tmp_path)))
+
+class Sources:
+    """Local trend sources recording how many requests are in flight at once"""
+    
+    def __init__(self, page):
+        self.page = page
+        self.active = 0
+        self.max_active = 0
+        # Held open until the test ends, for sources that never answer in time
+        self.release = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/page/{n}", self.serve_page)
+        app.router.add_get("/error", self.serve_error)
+        app.router.add_get("/hang", self.serve_hang)
+        self.server = TestServer(app)
+    
+    async def serve_page(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.05)
+            return web.Response(body=self.page, content_type="text/html", headers={"Cache-Control": "no-store"})
+        finally:
+            self.active -= 1
+    
+    async def serve_error(self, request):
+        return web.Response(status=500)
+    
+    async def serve_hang(self, request):
+        await asyncio.wait_for(self.release.wait(), 10)
+        return web.Response(body=self.page, content_type="text/html")
+    
+    def urls(self, *paths):
+        return [str(self.server.make_url(path)) for path in paths]
+
+async def crawl(sources, design_blogs, art_sources, **settings):
+    """Fetch the given source paths with a fresh agent; returns (stats, seconds taken)"""
+    agent = trend_intel.TrendIntelAgent()
+    agent.trend_sources["design_blogs"] = sources.urls(*design_blogs)
+    agent.trend_sources["art_sources"] = sources.urls(*art_sources)
+    for name, value in settings.items():
+        setattr(agent, name, value)
+    started = time.monotonic()
+    try:
+        _, stats = await agent._fetch_trends_from_sources()
+        return stats, time.monotonic() - started
+    finally:
+        await agent.close()
+
+def run(page, scenario):
+    async def main():
+        sources = Sources(page)
+        await sources.server.start_server()
+        try:
+            return sources, await scenario(sources)
+        finally:
+            sources.release.set()
+            await sources.server.close()
+    return asyncio.run(main())
+
+def test_requests_to_one_host_are_bounded_by_the_connection_pool(page):
+    async def scenario(sources):
+        paths = [f"/page/{n}" for n in range(6)]
+        return await crawl(sources, paths[:3], paths[3:], max_connections_per_host=2)
+    
+    sources, (stats, _) = run(page, scenario)
+    assert stats == {"sources": 6, "sources_missed": 0, "sources_failed": 0}
+    assert sources.max_active == 2
+
+def test_slow_source_times_out_on_its_own(page):
+    async def scenario(sources):
+        return await crawl(
+            sources, ["/page/0", "/hang", "/error"], [],
+            fetch_timeout=aiohttp.ClientTimeout(total=0.3), fetch_deadline=5
+        )
+    
+    _, (stats, elapsed) = run(page, scenario)
+    # The hung source and the 500 both count as failed; the others were kept
+    assert stats == {"sources": 3, "sources_missed": 0, "sources_failed": 2}
+    assert elapsed < 2
+
+def test_sources_still_running_at_the_deadline_are_dropped(page):
+    async def scenario(sources):
+        return await crawl(
+            sources, ["/page/0", "/hang"], ["/page/1"],
+            fetch_timeout=aiohttp.ClientTimeout(total=30), fetch_deadline=0.3
+        )
+    
+    _, (stats, elapsed) = run(page, scenario)
+    assert stats == {"sources": 3, "sources_missed": 1, "sources_failed": 0}
+    assert elapsed < 2
@@ -0,0 +1,65 @@
+import math
+import numpy as np
+import pytest
+from trend_index import TrendIndex, tokenize
+
+DOCUMENTS = [
+    {"title": "Japandi calm", "content": "Low furniture and pale oak in a calm japandi bedroom."},
+    {"title": "Terracotta tones", "content": "Warm terracotta walls and clay pots."},
+    {"title": "Japandi kitchens", "content": "Japandi kitchens pair oak fronts with stone."},
+    {"title": "Checkerboard floors", "content": "Two-tone tiles return to hallways."},
+]
+
+def test_tokenize_folds_plurals_but_not_double_s():
+    assert tokenize("Trends in Glass Kitchens, 2024") == ["trend", "in", "glass", "kitchen", "2024"]
+
+def test_bm25_scores_match_the_formula():
+    index = TrendIndex(DOCUMENTS, k1=1.2, b=0.75)
+    lengths = [len(tokenize(d["title"] + " " + d["content"])) for d in DOCUMENTS]
+    average = sum(lengths) / len(lengths)
+    # "japandi" appears in documents 0 and 2
+    idf = math.log(1 + (4 - 2 + 0.5) / (2 + 0.5))
+    
+    def bm25(count, length):
+        return idf * count * 2.2 / (count + 1.2 * (1 - 0.75 + 0.75 * length / average))
+    
+    expected = np.array([bm25(2, lengths[0]), 0, bm25(2, lengths[2]), 0]) / idf
+    assert index.score("japandi") == pytest.approx(np.minimum(expected, 1.0))
+
+def test_rarer_terms_and_more_matches_score_higher():
+    index = TrendIndex(DOCUMENTS)
+    scores = index.score("terracotta clay")
+    assert scores.argmax() == 1
+    assert scores[[0, 2, 3]].tolist() == [0, 0, 0]
+    assert np.all(index.score("japandi oak") <= 1.0)
+
+def test_unknown_terms_lower_the_score_instead_of_being_ignored():
+    index = TrendIndex(DOCUMENTS)
+    assert index.score("terracotta velvet")[1] < index.score("terracotta")[1]
+    assert index.score("").tolist() == [0, 0, 0, 0]
+    assert TrendIndex([]).score("japandi").tolist() == []
+
+def test_matches_counts_terms_present():
+    index = TrendIndex(DOCUMENTS)
+    assert index.matches(["japandi", "oak", "kitchens"]).tolist() == [2, 0, 3, 0]
+
+def test_top_k_breaks_boundary_ties_by_tiebreak():
+    scores = np.array([.1, .5, .5, .9])
+    assert TrendIndex.top_k(scores, 2, np.arange(4), np.array([0, 1, 2, 0])).tolist() == [3, 2]
+    assert TrendIndex.top_k(scores, 2, np.arange(4), np.array([0, 2, 1, 0])).tolist() == [3, 1]
+
+def test_top_k_falls_back_to_document_order_and_respects_candidates():
+    scores = np.array([.5, .5, .5, .5, .2])
+    tiebreak = np.zeros(5)
+    assert TrendIndex.top_k(scores, 2, np.arange(5), tiebreak).tolist() == [0, 1]
+    assert TrendIndex.top_k(scores, 3, np.array([4, 3, 1]), tiebreak).tolist() == [1, 3, 4]
+    assert TrendIndex.top_k(scores, 10, np.array([4, 2]), tiebreak).tolist() == [2, 4]
+    assert TrendIndex.top_k(scores, 0, np.arange(5), tiebreak).tolist() == []
+
+def test_top_k_matches_a_full_sort():
+    generator = np.random.default_rng(7)
+    scores = generator.integers(0, 5, 500) / 4
+    tiebreak = generator.integers(0, 3, 500)
+    candidates = np.arange(500)
+    expected = sorted(candidates, key=lambda i: (-scores[i], -tiebreak[i], i))[:25]
+    assert TrendIndex.top_k(scores, 25, candidates, tiebreak).tolist() == expected
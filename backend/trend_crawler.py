@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict
+from cache import redis_cache
+from agents.trend_intel_agent import trend_agent
+from trend_store import trend_store
+
+logger = logging.getLogger(__name__)
+
+class TrendCrawler:
+    """Periodically crawls every trend source into the trend store.
+    
+    Runs as a background task in the API (one worker crawls at a time) or as
+    its own process with `python trend_crawler.py`; searches only read the
+    store, so their latency never depends on the sources.
+    """
+    
+    def __init__(self):
+        self.interval = int(os.getenv('TREND_CRAWL_INTERVAL_SECONDS', 21600))
+        # Set to false when a standalone crawler process does the crawling
+        self.run_in_api = os.getenv('TREND_CRAWL_IN_API', 'true').lower() == 'true'
+        # How often to check whether a crawl is due, and how long one may hold the lock
+        self.check_interval = min(self.interval, 60)
+        self.lock_ttl_ms = 300000
+        # After a crawl that reached no source, wait this long before retrying,
+        # doubling with each further failure up to the crawl interval
+        self.retry_base_delay = int(os.getenv('TREND_CRAWL_RETRY_BASE_SECONDS', 60))
+        self._task = None
+    
+    def start(self):
+        """Start crawling whenever the stored trends are older than the interval"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+    
+    async def stop(self):
+        """Stop the crawling task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run_periodically(self):
+        """Crawl when due, on one worker at a time"""
+        while True:
+            try:
+                await self._crawl_if_due()
+            except Exception as e:
+                logger.error(f"Error crawling trend sources: {e}")
+            await asyncio.sleep(self.check_interval)
+    
+    async def _is_due(self, reload: bool = False) -> bool:
+        meta = await trend_store.get_meta(reload=reload)
+        age = trend_store.age_seconds()
+        if age is not None and age < self.interval:
+            return False
+        
+        failure_age = trend_store.failure_age_seconds()
+        return failure_age is None or failure_age >= self.retry_delay(meta.get("failed_crawls", 0))
+    
+    def retry_delay(self, failures: int) -> float:
+        """Seconds to wait after the given number of consecutive failed crawls"""
+        if failures <= 0:
+            return 0
+        return min(self.interval, self.retry_base_delay * 2 ** (failures - 1))
+    
+    async def _crawl_if_due(self):
+        if not await self._is_due():
+            return
+        
+        # Without Redis every worker crawls for itself
+        token = await redis_cache.acquire_lock("trend_crawl", self.lock_ttl_ms)
+        if not token and redis_cache.is_connected:
+            return
+        try:
+            # Another worker may have just finished a crawl
+            if await self._is_due(reload=True):
+                await self.crawl()
+        finally:
+            if token:
+                await redis_cache.release_lock("trend_crawl", token)
+    
+    async def crawl(self) -> Dict:
+        """Fetch and process every source once and replace the stored documents"""
+        started = time.monotonic()
+        documents, stats = await trend_agent.crawl_trends()
+        stats["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        
+        # Keep the stored trends when no source answered and back off before retrying
+        unavailable = stats.get("sources_missed", 0) + stats.get("sources_failed", 0)
+        if unavailable >= stats.get("sources", 0):
+            failures = await trend_store.record_failed_crawl()
+            logger.warning(
+                f"Skipped saving trend crawl: {unavailable} of {stats.get('sources', 0)} sources unavailable; "
+                f"retrying in {self.retry_delay(failures):.0f}s"
+            )
+            return stats
+        
+        await trend_store.save(documents, stats)
+        logger.info(f"Crawled {len(documents)} trend documents in {stats['duration_ms']}ms")
+        return stats
+
+# Global trend crawler instance
+trend_crawler = TrendCrawler()
+
+async def main():
+    """Crawl trend sources every interval until stopped"""
+    await redis_cache.connect()
+    try:
+        await trend_crawler._run_periodically()
+    finally:
+        await trend_agent.close()
+        await redis_cache.disconnect()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Trend crawler stopped")
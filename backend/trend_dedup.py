@@ -0,0 +1,101 @@
+import logging
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+class TrendDeduplicator:
+    """Near-duplicate trend detection with MinHash signatures and LSH banding.
+    
+    Each trend's title and content are shingled into word n-grams and reduced
+    to a MinHash signature. Signatures are cut into bands; trends sharing a
+    band bucket become candidate pairs, and pairs whose estimated Jaccard
+    similarity reaches the threshold are clustered. Work grows with the number
+    of trends plus candidate pairs instead of with every pair.
+    """
+    
+    def __init__(self):
+        self.threshold = float(os.getenv('TREND_DEDUP_THRESHOLD', 0.6))
+        self.num_perm = int(os.getenv('TREND_DEDUP_NUM_PERM', 128))
+        self.shingle_size = int(os.getenv('TREND_DEDUP_SHINGLE_WORDS', 2))
+        self.bands, self.rows = self._band_layout(self.threshold, self.num_perm)
+        
+        # Fixed seed so signatures, and so clusters, are the same on every run
+        generator = np.random.default_rng(1)
+        self._a = generator.integers(1, 1 << 32, self.num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, 1 << 32, self.num_perm, dtype=np.uint64)
+    
+    @staticmethod
+    def _band_layout(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """Bands and rows per band whose S-curve threshold (1/b)^(1/r) is closest to the target"""
+        layouts = [(b, num_perm // b) for b in range(1, num_perm + 1)]
+        return min(layouts, key=lambda layout: abs((1 / layout[0]) ** (1 / layout[1]) - threshold))
+    
+    def deduplicate(self, trends: List[Dict]) -> List[Dict]:
+        """One representative per cluster of near-duplicate trends, in the trends' original order"""
+        if len(trends) < 2:
+            return list(trends)
+        
+        shingles = [self._shingles(trend.get("title", "") + " " + trend.get("content", "")) for trend in trends]
+        signatures = np.stack([self._signature(item) for item in shingles])
+        
+        parent = list(range(len(trends)))
+        
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        checked = set()
+        for band in range(self.bands):
+            buckets = defaultdict(list)
+            columns = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for index, row in enumerate(columns):
+                buckets[row.tobytes()].append(index)
+            for members in buckets.values():
+                for other in members[1:]:
+                    pair = (members[0], other)
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    if np.mean(signatures[pair[0]] == signatures[other]) >= self.threshold:
+                        parent[find(other)] = find(members[0])
+        
+        clusters = defaultdict(list)
+        for index in range(len(trends)):
+            clusters[find(index)].append(index)
+        
+        # The member with the most text represents its cluster; ties go to the earliest
+        representatives = sorted(
+            min(members, key=lambda i: (-len(shingles[i]), i)) for members in clusters.values()
+        )
+        logger.info(f"Deduplicated {len(trends)} trends into {len(representatives)}")
+        return [trends[i] for i in representatives]
+    
+    def _shingles(self, text: str) -> set:
+        """Hashed word n-grams of a text; short texts fall back to their words"""
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < self.shingle_size:
+            grams = words
+        else:
+            grams = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        return {zlib.crc32(gram.encode()) for gram in grams}
+    
+    def _signature(self, shingles: set) -> np.ndarray:
+        """MinHash signature: the minimum of each permutation's hash over the shingles"""
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+# Global trend deduplicator instance
+trend_deduplicator = TrendDeduplicator()
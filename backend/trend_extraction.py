@@ -0,0 +1,175 @@
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+from lxml import etree, html
+
+logger = logging.getLogger(__name__)
+
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_HEADINGS = "self::h1 or self::h2 or self::h3 or self::h4"
+
+def _class_contains(*words: str) -> str:
+    """XPath predicate: the class attribute contains any of the words, ignoring case"""
+    lowered = f"translate(@class, '{_UPPER}', '{_UPPER.lower()}')"
+    return " or ".join(f"contains({lowered}, '{word}')" for word in words)
+
+# How to find trend items on each kind of source page. A site needing its own
+# selectors gets an entry keyed by its host name, which takes precedence.
+SOURCE_SELECTORS = {
+    "design_blog": {
+        "items": f"//*[(self::article or self::div) and ({_class_contains('article', 'post', 'trend')})]",
+        "limit": 5,
+        "title": f"(.//*[{_HEADINGS}])[1]",
+        "content": f"(.//*[(self::p or self::div) and ({_class_contains('content', 'excerpt', 'summary')})])[1]",
+        "content_required": True,
+        "content_chars": 200,
+    },
+    "art_source": {
+        "items": f"//*[(self::div or self::article) and ({_class_contains('trend', 'style', 'artwork')})]",
+        "limit": 3,
+        "title": f"(.//*[{_HEADINGS}])[1]",
+        "content": "(.//*[self::p or self::span])[1]",
+        "content_required": False,
+        "content_chars": None,
+    },
+}
+
+class LxmlExtractor:
+    """Extracts trend items with lxml and XPath selectors compiled once per source"""
+    
+    name = "lxml"
+    
+    def __init__(self, selectors: Dict[str, Dict]):
+        self.selectors = {
+            source: {
+                **spec,
+                "items": etree.XPath(spec["items"]),
+                "title": etree.XPath(spec["title"]),
+                "content": etree.XPath(spec["content"]),
+            }
+            for source, spec in selectors.items()
+        }
+    
+    def extract(self, source_type: str, url: str, content: bytes) -> List[Dict]:
+        """Title/content items found on a source page"""
+        spec = self.selectors.get(urlparse(url).hostname) or self.selectors[source_type]
+        try:
+            root = html.fromstring(content)
+        except (etree.ParserError, ValueError):
+            return []
+        
+        items = []
+        for element in spec["items"](root)[:spec["limit"]]:
+            title_elem = spec["title"](element)
+            content_elem = spec["content"](element)
+            if not title_elem or (spec["content_required"] and not content_elem):
+                continue
+            
+            text = self._text(content_elem[0]) if content_elem else ""
+            if spec["content_chars"]:
+                text = text[:spec["content_chars"]] + "..."
+            items.append({"title": self._text(title_elem[0]), "content": text})
+        return items
+    
+    @staticmethod
+    def _text(element) -> str:
+        # Same as BeautifulSoup's get_text(strip=True)
+        return "".join(part.strip() for part in element.itertext())
+
+class SoupExtractor:
+    """The original BeautifulSoup extraction, kept as a reference for the lxml path"""
+    
+    name = "bs4"
+    
+    def extract(self, source_type: str, url: str, content: bytes) -> List[Dict]:
+        """Title/content items found on a source page"""
+        if source_type == "design_blog":
+            return self._extract_design_blog(content)
+        return self._extract_art_source(content)
+    
+    def _extract_design_blog(self, content: bytes) -> List[Dict]:
+        """Extract trend articles from a design blog page"""
+        items = []
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Extract trend information
+        articles = soup.find_all(['article', 'div'], class_=re.compile(r'(article|post|trend)', re.I))
+        
+        for article in articles[:5]:  # Limit to 5 articles per blog
+            title_elem = article.find(['h1', 'h2', 'h3', 'h4'])
+            content_elem = article.find(['p', 'div'], class_=re.compile(r'(content|excerpt|summary)', re.I))
+            
+            if title_elem and content_elem:
+                items.append({
+                    "title": title_elem.get_text(strip=True),
+                    "content": content_elem.get_text(strip=True)[:200] + "..."
+                })
+        
+        return items
+    
+    def _extract_art_source(self, content: bytes) -> List[Dict]:
+        """Extract trending art from an art source page"""
+        items = []
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Look for art trend information
+        trend_elements = soup.find_all(['div', 'article'], class_=re.compile(r'(trend|style|artwork)', re.I))
+        
+        for element in trend_elements[:3]:  # Limit to 3 per source
+            title_elem = element.find(['h1', 'h2', 'h3', 'h4'])
+            content_elem = element.find(['p', 'span'])
+            
+            if title_elem:
+                items.append({
+                    "title": title_elem.get_text(strip=True),
+                    "content": content_elem.get_text(strip=True) if content_elem else ""
+                })
+        
+        return items
+
+def get_extractor(name: Optional[str] = None):
+    """Extractor selected by TREND_EXTRACTOR ("lxml" or "bs4")"""
+    name = name or os.getenv('TREND_EXTRACTOR', 'lxml')
+    if name == "bs4":
+        return SoupExtractor()
+    return LxmlExtractor(SOURCE_SELECTORS)
+
+def benchmark(pages: Dict[str, bytes], source_type: str, rounds: int = 20) -> Dict:
+    """Time both extractors over the same pages and count pages where their items differ"""
+    extractors = [LxmlExtractor(SOURCE_SELECTORS), SoupExtractor()]
+    results = {"pages": len(pages), "mismatches": 0}
+    outputs = {}
+    for extractor in extractors:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            outputs[extractor.name] = [extractor.extract(source_type, url, body) for url, body in pages.items()]
+        elapsed = time.perf_counter() - started
+        results[f"{extractor.name}_ms_per_page"] = round(elapsed * 1000 / (rounds * max(1, len(pages))), 3)
+    results["mismatches"] = sum(1 for a, b in zip(outputs["lxml"], outputs["bs4"]) if a != b)
+    return results
+
+def load_pages(directory: str) -> Dict[str, bytes]:
+    """Recorded pages in a directory (.html fixtures or HTTP cache .body files) keyed by file name"""
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".html", ".body")):
+            with open(os.path.join(directory, name), "rb") as f:
+                pages[name] = f.read()
+    return pages
+
+# Recorded source pages, one directory per source type
+FIXTURE_PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "trend_pages")
+
+if __name__ == "__main__":
+    # Benchmark on the recorded fixture pages, or on another directory of pages such
+    # as the HTTP cache: python trend_extraction.py [<pages dir> <source type>]
+    if len(sys.argv) > 2:
+        print(benchmark(load_pages(sys.argv[1]), sys.argv[2]))
+    else:
+        for source_type in sorted(os.listdir(FIXTURE_PAGES_DIR)):
+            print(source_type, benchmark(load_pages(os.path.join(FIXTURE_PAGES_DIR, source_type)), source_type))
@@ -0,0 +1,87 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with simple plurals folded, so "trends" matches "trend" """
+    tokens = []
+    for token in re.findall(r"\w+", text.lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class TrendIndex:
+    """BM25 index over trend documents.
+    
+    Documents are tokenized once into a vocabulary and a sparse matrix of
+    BM25 term weights, so scoring every document against a query is one
+    sparse matrix-vector product.
+    """
+    
+    def __init__(self, documents: List[Dict], k1: float = 1.2, b: float = 0.75):
+        self.documents = documents
+        self.vocabulary: Dict[str, int] = {}
+        
+        rows, columns, counts = [], [], []
+        lengths = np.zeros(len(documents))
+        for row, document in enumerate(documents):
+            tokens = tokenize(document.get("title", "") + " " + document.get("content", ""))
+            lengths[row] = len(tokens)
+            for token, count in Counter(tokens).items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                counts.append(count)
+        
+        rows, columns, counts = np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64), np.array(counts, dtype=float)
+        shape = (len(documents), len(self.vocabulary))
+        
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary))
+        self.idf = np.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        self.unseen_idf = math.log(1 + (len(documents) + 0.5) / 0.5)
+        
+        average_length = lengths.mean() if len(documents) and lengths.mean() > 0 else 1.0
+        saturation = counts + k1 * (1 - b + b * lengths[rows] / average_length)
+        weights = self.idf[columns] * counts * (k1 + 1) / saturation
+        self.weights = sparse.csr_matrix((weights, (rows, columns)), shape=shape)
+        self.presence = sparse.csr_matrix((np.ones_like(weights), (rows, columns)), shape=shape)
+    
+    def _query_vector(self, terms: Iterable[str]) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        for term in terms:
+            column = self.vocabulary.get(term)
+            if column is not None:
+                vector[column] = 1.0
+        return vector
+    
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every document, scaled so matching each query term once in a
+        document of average length scores 1.0; capped at 1.0"""
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return np.zeros(len(self.documents))
+        best = sum(self.idf[self.vocabulary[term]] if term in self.vocabulary else self.unseen_idf for term in terms)
+        scores = self.weights @ self._query_vector(terms)
+        return np.minimum(scores / best, 1.0)
+    
+    def matches(self, terms: Iterable[str]) -> np.ndarray:
+        """How many of the terms each document contains"""
+        return self.presence @ self._query_vector({token for term in terms for token in tokenize(term)})
+    
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int, candidates: np.ndarray, tiebreak: np.ndarray) -> np.ndarray:
+        """Positions of the k best candidates, best first; ties go to the higher tiebreak, then the earlier document"""
+        if k <= 0 or not len(candidates):
+            return candidates[:0]
+        if len(candidates) > k:
+            # Keep every candidate tied with the k-th score so the tiebreak, not
+            # the partition, decides which of them make the cut
+            kth_score = scores[candidates[np.argpartition(-scores[candidates], k - 1)[k - 1]]]
+            candidates = candidates[scores[candidates] >= kth_score]
+        return candidates[np.lexsort((candidates, -tiebreak[candidates], -scores[candidates]))][:k]
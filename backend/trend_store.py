@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+class TrendStore:
+    """Trend documents written by the crawler and read by trend searches.
+    
+    The current document set lives in Redis so every API worker and the
+    crawler process share it, with a snapshot on disk for starting without
+    Redis. Readers keep the set in memory and only check for a newer crawl
+    every reload interval, so a search never waits on more than one small
+    Redis read.
+    """
+    
+    def __init__(self):
+        self.documents_key = "trend_store:documents"
+        self.meta_key = "trend_store:meta"
+        self.reload_interval = float(os.getenv('TREND_STORE_RELOAD_SECONDS', 60))
+        self.snapshot_path = os.getenv(
+            'TREND_STORE_SNAPSHOT',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'trend_store.json')
+        )
+        
+        self._documents: List[Dict] = []
+        self._meta: Dict = {}
+        self._checked_at = 0.0
+    
+    async def save(self, documents: List[Dict], meta: Dict):
+        """Replace the document set with the result of a crawl"""
+        meta = {**meta, "crawled_at": datetime.now().isoformat(), "documents": len(documents)}
+        self._documents, self._meta = documents, meta
+        self._checked_at = time.monotonic()
+        
+        if redis_cache.is_connected:
+            try:
+                async with redis_cache.client.pipeline(transaction=True) as pipe:
+                    pipe.set(self.documents_key, json.dumps(documents))
+                    pipe.delete(self.meta_key)
+                    pipe.hset(self.meta_key, mapping={key: json.dumps(value) for key, value in meta.items()})
+                    await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error saving trend documents to Redis: {e}")
+                redis_cache._record_failure(e)
+        
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"meta": meta, "documents": documents}, f)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Error writing trend store snapshot: {e}")
+    
+    async def record_failed_crawl(self) -> int:
+        """Note a crawl that reached no source, keeping the documents; returns consecutive failures"""
+        failures = self._meta.get("failed_crawls", 0) + 1
+        failure = {"failed_crawls": failures, "failed_at": datetime.now().isoformat()}
+        self._meta = {**self._meta, **failure}
+        
+        if redis_cache.is_connected:
+            try:
+                await redis_cache.client.hset(
+                    self.meta_key, mapping={key: json.dumps(value) for key, value in failure.items()}
+                )
+            except Exception as e:
+                logger.error(f"Error recording failed trend crawl in Redis: {e}")
+                redis_cache._record_failure(e)
+        return failures
+    
+    async def get_documents(self) -> List[Dict]:
+        """Current trend documents, picking up a newer crawl at most once per reload interval"""
+        await self._refresh()
+        return self._documents
+    
+    async def get_meta(self, reload: bool = False) -> Dict:
+        """When the current documents were crawled and how the crawl went"""
+        await self._refresh(reload)
+        return self._meta
+    
+    async def _refresh(self, reload: bool = False):
+        if not reload and self._meta and time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = time.monotonic()
+        
+        if redis_cache.is_connected:
+            try:
+                raw_meta = await redis_cache.client.hgetall(self.meta_key)
+                meta = {
+                    redis_cache._to_str(key): json.loads(value) for key, value in raw_meta.items()
+                }
+                if meta and meta.get("crawled_at") != self._meta.get("crawled_at"):
+                    raw_documents = await redis_cache.client.get(self.documents_key)
+                    if raw_documents is not None:
+                        self._documents, self._meta = json.loads(raw_documents), meta
+                        logger.info(f"Loaded {len(self._documents)} trend documents crawled at {meta['crawled_at']}")
+                elif meta:
+                    # Same crawl; pick up failed attempts other workers recorded since
+                    self._meta = meta
+                if self._meta:
+                    return
+            except Exception as e:
+                logger.error(f"Error loading trend documents from Redis: {e}")
+                redis_cache._record_failure(e)
+        
+        if not self._documents:
+            self._load_snapshot()
+    
+    def _load_snapshot(self):
+        """Documents from the last crawl this host saved, for when Redis has none"""
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self._documents, self._meta = snapshot["documents"], snapshot["meta"]
+            logger.info(f"Loaded {len(self._documents)} trend documents from snapshot")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error reading trend store snapshot: {e}")
+    
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the current documents were crawled, None before the first crawl"""
+        return self._seconds_since(self._meta.get("crawled_at"))
+    
+    def failure_age_seconds(self) -> Optional[float]:
+        """Seconds since the last crawl that reached no source, None if the last crawl succeeded"""
+        return self._seconds_since(self._meta.get("failed_at"))
+    
+    @staticmethod
+    def _seconds_since(timestamp: Optional[str]) -> Optional[float]:
+        if not timestamp:
+            return None
+        return (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds()
+
+# Global trend store instance
+trend_store = TrendStore()
@@ -0,0 +1,27 @@
+import asyncio
+import logging
+import os
+import socket
+from cache import redis_cache
+from decision_router import decision_router
+from job_queue import room_analysis_queue
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Run queued room analyses until stopped; start as many of these processes as needed"""
+    consumer = os.getenv('VISION_WORKER_NAME') or f"{socket.gethostname()}-{os.getpid()}"
+    await redis_cache.connect()
+    try:
+        await room_analysis_queue.run_worker(decision_router.process_room_analysis, consumer)
+    finally:
+        await decision_router.trend_agent.close()
+        await redis_cache.disconnect()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Vision worker stopped")